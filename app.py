@@ -1,34 +1,79 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext, messagebox
 import sys
-import threading
 import os
-import glob
+import queue
 import random
 import time
+from logging.handlers import RotatingFileHandler
+import logging
 
 # Import core logic from jj.py
 # We need to add the current directory to sys.path if not present
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from jj import Config, make_clip_wrapper, build_voice_and_timings, render_ass, mux_with_voice_bgm_and_subtitles, ensure_dir, split_sentences
+from jj import Config, render_job, ensure_dir, list_scripts
+from utils.job_queue import JobQueue
+from utils.procman import Cancelled
 
 class RedirectText(object):
-    def __init__(self, text_ctrl):
+    """
+    stdout/stderr -> 日志框。
+    任何线程的 write() 只往 SimpleQueue 里放字符串 (不碰 Tk)；主线程用 after() 定时批量取出，
+    一次 insert，超过 max_lines 的旧行删掉 (滚动缓冲有上限，长时间批量跑内存不涨)。
+    完整日志同时写入滚动文件 log_path (max_bytes x backups)。
+    """
+
+    def __init__(self, text_ctrl, log_path="output/logs/app.log", max_lines=5000,
+                 interval_ms=100, max_bytes=5 << 20, backups=3):
         self.output = text_ctrl
+        self.max_lines = max_lines
+        self.interval_ms = interval_ms
+        self._queue = queue.SimpleQueue()
+
+        os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+        self._file = logging.getLogger("jj.gui")
+        self._file.propagate = False
+        self._file.setLevel(logging.INFO)
+        handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        handler.terminator = ""  # 写入的是原始输出块，本身带换行
+        self._file.addHandler(handler)
+
+        self.output.after(self.interval_ms, self.drain)
 
     def write(self, string):
-        self.output.insert(tk.END, string)
-        self.output.see(tk.END)
+        if string:
+            self._queue.put(string)
 
     def flush(self):
         pass
 
+    def drain(self, budget=2000):
+        chunks = []
+        try:
+            while len(chunks) < budget:
+                chunks.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        if chunks:
+            text = "".join(chunks)
+            self._file.info(text)
+            # 用户往上翻看时不强制滚到底部
+            at_bottom = self.output.yview()[1] >= 0.999
+            self.output.insert(tk.END, text)
+            lines = int(self.output.index("end-1c").split(".")[0])
+            if lines > self.max_lines:
+                self.output.delete("1.0", f"{lines - self.max_lines + 1}.0")
+            if at_bottom:
+                self.output.see(tk.END)
+        # 没取完 (输出特别多) 就尽快再来一轮，否则按固定间隔
+        self.output.after(1 if len(chunks) >= budget else self.interval_ms, self.drain)
+
 class App:
     def __init__(self, root):
         self.root = root
         self.root.title("全自动视频生成工具 (Video Generator)")
-        self.root.geometry("700x800")
+        self.root.geometry("760x900")
         
         self.style = ttk.Style()
         self.style.configure("TButton", padding=6)
@@ -36,8 +81,15 @@ class App:
         
         # Default Config
         self.cfg = Config()
+
+        # 最新的 ffmpeg 进度事件 (工作线程写入，主线程定时读取刷新进度条)
+        self._progress = None
+        # 任务队列：每次“加入队列”记下当时的设置，由 workers 个工作线程按优先级依次生成
+        self.jobs = JobQueue(self.run_job, workers=1)
         
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.exit_app)
+        self.root.after(200, self.poll_progress)
         
         # Redirect stdout/stderr
         self.redir = RedirectText(self.log_area)
@@ -94,14 +146,54 @@ class App:
         self.zoompan_var = tk.BooleanVar(value=True)
         ttk.Checkbutton(adv_frame, text="启用画面动态缩放 (Zoompan)", variable=self.zoompan_var).grid(row=0, column=0, sticky=tk.W)
 
-        # --- Section 4: Actions ---
-        btn_frame = ttk.Frame(main_frame, padding="10")
-        btn_frame.pack(fill=tk.X, pady=10)
-        
-        self.run_btn = ttk.Button(btn_frame, text="开始生成 (Start Generation)", command=self.start_thread, width=30)
-        self.run_btn.pack(side=tk.LEFT, padx=5)
-        
-        ttk.Button(btn_frame, text="退出 (Exit)", command=self.root.quit).pack(side=tk.RIGHT, padx=5)
+        self.fused_var = tk.BooleanVar(value=self.cfg.fused_render)
+        ttk.Checkbutton(adv_frame, text="融合渲染 (单次编码，关闭则走两步调试流程)", variable=self.fused_var).grid(row=1, column=0, sticky=tk.W)
+
+        # --- Section 4: Job Queue ---
+        queue_frame = ttk.LabelFrame(main_frame, text="任务队列 (Job Queue)", padding="10")
+        queue_frame.pack(fill=tk.X, pady=5)
+
+        btn_frame = ttk.Frame(queue_frame)
+        btn_frame.pack(fill=tk.X)
+
+        ttk.Button(btn_frame, text="加入队列 (Enqueue)", command=self.enqueue).pack(side=tk.LEFT, padx=2)
+        ttk.Button(btn_frame, text="全部文案入队", command=self.enqueue_all_scripts).pack(side=tk.LEFT, padx=2)
+
+        ttk.Label(btn_frame, text="并发 (Workers):").pack(side=tk.LEFT, padx=(10, 0))
+        self.workers_var = tk.IntVar(value=1)
+        workers_spin = ttk.Spinbox(btn_frame, from_=1, to=max(1, os.cpu_count() or 1), textvariable=self.workers_var,
+                                   width=3, command=self.apply_workers)
+        workers_spin.pack(side=tk.LEFT)
+        workers_spin.bind("<Return>", lambda e: self.apply_workers())
+        workers_spin.bind("<FocusOut>", lambda e: self.apply_workers())
+
+        ttk.Button(btn_frame, text="退出 (Exit)", command=self.exit_app).pack(side=tk.RIGHT, padx=2)
+
+        columns = ("name", "status", "priority", "progress", "elapsed", "info")
+        self.job_tree = ttk.Treeview(queue_frame, columns=columns, show="headings", height=8)
+        for col, title, width in (("name", "任务", 200), ("status", "状态", 70), ("priority", "优先级", 50),
+                                  ("progress", "进度", 60), ("elapsed", "耗时", 60), ("info", "输出 / 错误", 220)):
+            self.job_tree.heading(col, text=title)
+            self.job_tree.column(col, width=width, anchor=tk.W, stretch=(col == "info"))
+        self.job_tree.pack(fill=tk.X, pady=5)
+
+        ctl_frame = ttk.Frame(queue_frame)
+        ctl_frame.pack(fill=tk.X)
+        ttk.Button(ctl_frame, text="取消所选 (Cancel)", command=self.cancel_selected).pack(side=tk.LEFT, padx=2)
+        ttk.Button(ctl_frame, text="提高优先级 ↑", command=lambda: self.bump_selected(1)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(ctl_frame, text="降低优先级 ↓", command=lambda: self.bump_selected(-1)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(ctl_frame, text="清除已结束", command=self.clear_finished).pack(side=tk.LEFT, padx=2)
+        self.queue_text = tk.StringVar(value="")
+        ttk.Label(ctl_frame, textvariable=self.queue_text).pack(side=tk.RIGHT)
+
+        # --- Progress ---
+        prog_frame = ttk.Frame(main_frame, padding=(10, 0))
+        prog_frame.pack(fill=tk.X)
+
+        self.progress_var = tk.DoubleVar(value=0)
+        ttk.Progressbar(prog_frame, variable=self.progress_var, maximum=100).pack(fill=tk.X)
+        self.progress_text = tk.StringVar(value="")
+        ttk.Label(prog_frame, textvariable=self.progress_text).pack(anchor=tk.W)
         
         # --- Section 5: Logs ---
         log_frame = ttk.LabelFrame(main_frame, text="运行日志 (Logs)", padding="5")
@@ -122,125 +214,161 @@ class App:
         f = filedialog.askopenfilename(filetypes=[("Audio Files", "*.mp3 *.wav")])
         if f: self.bgm_path_var.set(f)
 
-    def start_thread(self):
-        self.run_btn.config(state='disabled')
-        t = threading.Thread(target=self.worker)
-        t.daemon = True
-        t.start()
+    def on_progress(self, job, event):
+        """ffmpeg 进度回调 (在工作线程里调用)，只记下最新事件，界面由 poll_progress 在主线程刷新"""
+        job.progress = event
+        self._progress = event
+
+    def poll_progress(self):
+        ev, self._progress = self._progress, None
+        if ev is not None:
+            parts = [ev.get("job") or "", ev.get("label") or "ffmpeg"]
+            if ev.get("percent") is not None:
+                self.progress_var.set(ev["percent"])
+                parts.append(f"{ev['percent']:.0f}%")
+            if ev.get("frame") is not None:
+                parts.append(f"frame {ev['frame']}")
+            if ev.get("fps"):
+                parts.append(f"{ev['fps']:.0f} fps")
+            if ev.get("speed"):
+                parts.append(f"{ev['speed']:.2f}x")
+            if ev.get("eta_sec") is not None:
+                parts.append(f"ETA {ev['eta_sec']:.0f}s")
+            self.progress_text.set("  ".join(p for p in parts if p))
+        self.refresh_jobs()
+        self.root.after(200, self.poll_progress)
 
-    def worker(self):
+    # ---- 任务队列 ----
+    def snapshot_settings(self, script_path=None):
+        """当前界面设置 -> 任务参数 (入队时就固定下来，之后改界面不影响已排队的任务)"""
+        if script_path is None:
+            script_dir = self.script_dir_var.get()
+            if os.path.isfile(script_dir):
+                script_path = script_dir
+            else:
+                scripts = list_scripts(script_dir)
+                script_path = random.choice(scripts) if scripts else None
+        return {
+            "orientation": self.orientation_var.get(),
+            "audio_speed": self.speed_var.get(),
+            "in_video_dir": self.video_dir_var.get(),
+            "script_path": script_path,
+            "bgm_path": self.bgm_path_var.get(),
+            "enable_zoompan": self.zoompan_var.get(),
+            "fused_render": self.fused_var.get(),
+        }
+
+    def submit(self, payload):
+        stem = os.path.splitext(os.path.basename(payload["script_path"]))[0] if payload["script_path"] else "default"
+        job = self.jobs.submit(f"{stem}_{payload['orientation']}", payload)
+        print(f"[Queue] #{job.id} {job.name} queued")
+
+    def enqueue(self):
+        self.submit(self.snapshot_settings())
+
+    def enqueue_all_scripts(self):
+        scripts = list_scripts(self.script_dir_var.get())
+        if not scripts:
+            messagebox.showwarning("Queue", f"No .txt scripts found in {self.script_dir_var.get()}")
+            return
+        for path in scripts:
+            self.submit(self.snapshot_settings(path))
+
+    def apply_workers(self):
         try:
-            print("\n=== Initializing Generation Task ===")
-            
-            # 1. Update Config from GUI
-            cfg = Config()
-            
-            # Orientation
-            if self.orientation_var.get() == "horizontal":
-                cfg.out_w = 1280
-                cfg.out_h = 720
-                print("Mode: Horizontal (16:9)")
+            n = int(self.workers_var.get())
+        except (tk.TclError, ValueError):
+            return
+        self.jobs.set_workers(n)
+        print(f"[Queue] workers = {self.jobs.workers}")
+
+    def selected_ids(self):
+        return [int(iid) for iid in self.job_tree.selection()]
+
+    def cancel_selected(self):
+        for job_id in self.selected_ids():
+            if self.jobs.cancel(job_id):
+                print(f"\n=== Cancelling job #{job_id}... ===")
+
+    def bump_selected(self, delta):
+        for job_id in self.selected_ids():
+            job = self.jobs.get(job_id)
+            if job is not None:
+                self.jobs.set_priority(job_id, job.priority + delta)
+
+    def clear_finished(self):
+        self.jobs.clear_finished()
+
+    def refresh_jobs(self):
+        jobs = self.jobs.jobs()
+        keep = {str(j.id) for j in jobs}
+        for iid in self.job_tree.get_children():
+            if iid not in keep:
+                self.job_tree.delete(iid)
+        for job in jobs:
+            ev = job.progress or {}
+            if job.status == "done":
+                progress = "100%"
+            elif job.status == "running" and ev.get("percent") is not None:
+                progress = f"{ev.get('label', '')} {ev['percent']:.0f}%"
             else:
-                cfg.out_w = 720
-                cfg.out_h = 1280
-                print("Mode: Vertical (9:16)")
-            
-            cfg.audio_speed = self.speed_var.get()
-            cfg.in_video_dir = self.video_dir_var.get()
-            cfg.script_dir = self.script_dir_var.get()
-            cfg.bgm_path = self.bgm_path_var.get()
-            cfg.enable_zoompan = self.zoompan_var.get()
-            
-            # 2. Validation
-            if not os.path.exists(cfg.in_video_dir):
-                print(f"Error: Video dir not found: {cfg.in_video_dir}")
-                return
-            
-            # 3. Execution Logic (similar to main in jj.py)
-            ensure_dir("output")
-            ensure_dir(cfg.work_dir)
-
-            out_clip = os.path.join(cfg.work_dir, "clip.mp4")
-            out_ass = os.path.join(cfg.work_dir, "sub.ass")
-            out_final = "output/final.mp4"
-
-            # Find video files
-            video_exts = ("*.mp4", "*.mov", "*.mkv")
-            all_videos = []
-            for ext in video_exts:
-                all_videos.extend(glob.glob(os.path.join(cfg.in_video_dir, ext)))
-            
-            if not all_videos:
-                print(f"Error: No video files found in {cfg.in_video_dir}")
-                return
-
-            # Randomize
-            random.shuffle(all_videos)
-            selected_videos = all_videos 
-            print(f"Selected {len(selected_videos)} videos.")
-
-            # Load Script
-            script_path = None
-            if os.path.isdir(cfg.script_dir):
-                txt_files = glob.glob(os.path.join(cfg.script_dir, "*.txt"))
-                if txt_files:
-                    script_path = random.choice(txt_files)
-                    print(f"Selected script file: {script_path}")
-                    filename = os.path.splitext(os.path.basename(script_path))[0]
-                    cfg.hook_text = filename
-                    print(f"Set Hook Text: {cfg.hook_text}")
-            elif os.path.isfile(cfg.script_dir): # If user selected a specific file
-                script_path = cfg.script_dir
-                print(f"Selected script file: {script_path}")
-                filename = os.path.splitext(os.path.basename(script_path))[0]
-                cfg.hook_text = filename
-            
-            sentences = []
-            if script_path and os.path.exists(script_path):
-                try:
-                    with open(script_path, "r", encoding="utf-8") as f:
-                        lines = [line.strip() for line in f if line.strip()]
-                    sentences = lines
-                    print(f"Loaded {len(sentences)} lines of text.")
-                except Exception as e:
-                    print(f"Error reading script: {e}")
-            
-            # Fallback
-            if not sentences:
-                print("Warning: No script found. Using default text.")
-                script = "演示文案：这里是默认文案，请选择有效的文案目录！"
-                sentences = split_sentences(script)
-                cfg.hook_text = "默认演示"
-                keywords = ["默认"]
+                progress = ""
+            info = job.error or (job.result or {}).get("output", "")
+            values = (f"#{job.id} {job.name}", job.status, job.priority, progress, f"{job.elapsed():.0f}s", info)
+            iid = str(job.id)
+            if self.job_tree.exists(iid):
+                self.job_tree.item(iid, values=values)
             else:
-                keywords = ["押金", "跑刀", "老板", "风险", "速通"] # Generic keywords
+                self.job_tree.insert("", tk.END, iid=iid, values=values)
+        stats = self.jobs.stats()
+        self.queue_text.set(f"排队 {stats['queued']}  运行 {stats['running']}  完成 {stats['done']}  "
+                            f"失败 {stats['failed']}  取消 {stats['cancelled']}")
 
-            # --- Step 1: Video ---
-            print("\n--- Step 1: Video Processing ---")
-            make_clip_wrapper(selected_videos, out_clip, cfg)
+    def exit_app(self):
+        self.jobs.shutdown()
+        self.root.quit()
 
-            # --- Step 2: TTS ---
-            print("\n--- Step 2: TTS Generation ---")
-            voice_wav, timings = build_voice_and_timings(sentences, keywords, cfg.work_dir, cfg)
+    def run_job(self, job):
+        """队列工作线程：按入队时的设置生成一个视频，输出到 output/queue/<id>_<name>.mp4"""
+        p = job.payload
+        print(f"\n=== Job #{job.id}: {job.name} ===")
+        try:
+            # 1. Config from the queued settings
+            cfg = Config()
+            if p["orientation"] == "horizontal":
+                cfg.out_w, cfg.out_h = 1280, 720
+            else:
+                cfg.out_w, cfg.out_h = 720, 1280
+            cfg.audio_speed = p["audio_speed"]
+            cfg.in_video_dir = p["in_video_dir"]
+            cfg.bgm_path = p["bgm_path"]
+            cfg.enable_zoompan = p["enable_zoompan"]
+            cfg.fused_render = p["fused_render"]
+            cfg.on_progress = lambda ev: self.on_progress(job, ev)
+            cfg.cancel = job.cancel
 
-            # --- Step 3: Subtitles ---
-            print("\n--- Step 3: Subtitle Rendering ---")
-            render_ass(timings, cfg.ass_tpl_path, out_ass, cfg)
+            # 2. Validation
+            if not os.path.exists(cfg.in_video_dir):
+                raise FileNotFoundError(f"Video dir not found: {cfg.in_video_dir}")
 
-            # --- Step 4: Mix ---
-            print("\n--- Step 4: Final Mixing ---")
-            mux_with_voice_bgm_and_subtitles(out_clip, voice_wav, out_ass, out_final, cfg)
+            # 3. Render (script chosen at enqueue time); 每个任务单独的输出文件和工作目录，并发任务互不覆盖
+            out_dir = os.path.join("output", "queue")
+            ensure_dir(out_dir)
+            name = f"{job.id:03d}_{job.name}"
+            out_final = os.path.join(out_dir, name + ".mp4")
+            report = render_job(cfg, out_final, script_path=p["script_path"], job=f"q{name}")
 
-            print(f"\nSUCCESS! Video saved to: {os.path.abspath(out_final)}")
-            messagebox.showinfo("Success", f"Video generated successfully!\n{out_final}")
+            print(f"\nSUCCESS! Job #{job.id} saved to: {os.path.abspath(out_final)}")
+            return {"output": out_final, "critical_path": report["critical_path"]}
 
+        except Cancelled as e:
+            print(f"\nJob #{job.id} cancelled: {e}")
+            raise
         except Exception as e:
-            print(f"\nCRITICAL ERROR: {e}")
+            print(f"\nJob #{job.id} FAILED: {e}")
             import traceback
             traceback.print_exc()
-            messagebox.showerror("Error", f"An error occurred:\n{e}")
-        finally:
-            self.run_btn.config(state='normal')
+            raise
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,74 @@
+"""
+推镜头 (Ken Burns) 实现对比：zoompan vs scale_crop，分别在 720x1280 和 1280x720 下测处理帧率。
+
+    python -m bench.motion --ffmpeg ffmpeg --seconds 20
+
+源画面用 lavfi testsrc2 现场生成，输出到 null，只测滤镜本身：
+- proxy: 源已是目标尺寸/帧率 (开启 proxy 缓存时的情况)
+- raw:   1920x1080@30 的原始素材，zoompan 要先归一化再推镜头，scale_crop 一次 scale 完成
+baseline 为生成源画面 + 不加推镜头时的开销，net_ms 为扣除 baseline 后每帧的滤镜耗时。
+"""
+import argparse
+import json
+import subprocess
+import time
+
+from jj import Config, motion_filter, normalize_filter, source_dims, source_ops, zoom_input_filter
+
+SIZES = [(720, 1280), (1280, 720)]
+SOURCES = {"proxy": None, "raw": (1920, 1080, 30)}
+
+
+def graph(config: Config, engine: str, src_info: dict) -> str:
+    ops = source_ops(src_info, config)
+    if engine == "baseline":
+        return normalize_filter(config, ops) if ops else "setsar=1"
+    if engine == "zoompan":
+        norm = normalize_filter(config, ops) + "," if ops else ""
+        return norm + motion_filter(config)
+    return zoom_input_filter(ops, source_dims(src_info), 0, None, "z0", config)
+
+
+def bench_one(config: Config, source: str, engine: str, seconds: float) -> dict:
+    w, h, fps = SOURCES[source] or (config.out_w, config.out_h, config.fps)
+    info = {"width": w, "height": h, "fps": fps, "rotation": 0}
+    frames = int(seconds * config.fps)
+    cmd = [config.ffmpeg, "-v", "error", "-nostdin",
+           "-f", "lavfi", "-i", f"testsrc2=s={w}x{h}:r={fps}:d={seconds}",
+           "-vf", graph(config, engine, info), "-frames:v", str(frames), "-f", "null", "-"]
+    t0 = time.perf_counter()
+    subprocess.run(cmd, check=True)
+    wall = time.perf_counter() - t0
+    return {"size": f"{config.out_w}x{config.out_h}", "source": source, "engine": engine,
+            "frames": frames, "wall_sec": round(wall, 3), "fps": round(frames / wall, 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark motion engines (zoompan vs scale_crop)")
+    parser.add_argument("--ffmpeg", default="ffmpeg")
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for w, h in SIZES:
+        cfg = Config(ffmpeg=args.ffmpeg, out_w=w, out_h=h, fps=args.fps)
+        for source in SOURCES:
+            base = None
+            for engine in ("baseline", "zoompan", "scale_crop"):
+                r = bench_one(cfg, source, engine, args.seconds)
+                if engine == "baseline":
+                    base = r["wall_sec"]
+                r["net_ms"] = round((r["wall_sec"] - base) * 1000 / r["frames"], 3)
+                results.append(r)
+                print(f"{r['size']:>10} {source:<6} {engine:<10} {r['fps']:8.1f} fps  "
+                      f"net {r['net_ms']:.3f} ms/frame")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
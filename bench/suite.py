@@ -0,0 +1,353 @@
+"""
+离线端到端基准：合成素材 + 本地 TTS 桩，逐阶段计时，结果写 JSON，并能和基线对比找回退。
+
+    python -m bench.suite run --ffmpeg ffmpeg --ffprobe ffprobe --out output/_bench/result.json
+    python -m bench.suite compare baseline.json output/_bench/result.json --threshold 0.15
+
+- 素材: lavfi testsrc2 生成几种分辨率/帧率/时长的片段 (参数固定，生成过的直接复用)，BGM 为正弦波
+- 配音: utils/tts_stub (确定性正弦波，无网络)，固定文案
+- 阶段: probe / proxy / voice / subs / clip / mux / fused，最后跑一次完整任务 (job)；
+  每个阶段都从冷缓存开始，素材顺序由 --seed 决定
+- 指标: wall_sec、cpu_sec (本进程 + 子进程)、child_peak_rss_mb (该阶段 ffmpeg 的峰值内存)、
+  self_peak_rss_mb (本进程内存高水位)、output_bytes
+compare 按 (scenario, stage) 对比 wall/cpu/内存，超过阈值 (且绝对差值不是噪声) 的记为回退，退出码 1。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import replace
+
+try:
+    import resource  # POSIX only
+except ImportError:
+    resource = None
+
+import jj
+from jj import Config
+from utils.tts_stub import start_stub, stub_url
+
+# (名字, 宽, 高, 帧率, 秒)：横/竖/方形，不同帧率，覆盖 scale / crop / fps 各条归一化路径
+SOURCES = [
+    ("h1920x1080_30", 1920, 1080, 30, 6.0),
+    ("h1280x720_25", 1280, 720, 25, 5.0),
+    ("v720x1280_60", 720, 1280, 60, 4.0),
+    ("v1080x1920_30", 1080, 1920, 30, 3.0),
+    ("s640x640_24", 640, 640, 24, 4.0),
+]
+
+SCENARIOS = {
+    "vertical": {"out_w": 720, "out_h": 1280},
+    "horizontal": {"out_w": 1280, "out_h": 720},
+}
+
+SENTENCES = [
+    "再也不怕出货带不出来了",
+    "三乘三老板首选",
+    "跑刀押金全额保障",
+    "新手也能轻松速通",
+    "现在特价九九八",
+    "名额有限先到先得",
+]
+KEYWORDS = ["出货", "老板", "押金", "速通", "九九八"]
+
+STAGES = ("probe", "proxy", "voice", "subs", "clip", "mux", "fused", "job")
+# 各阶段用到的前置产物 (只测某几个阶段时，前置阶段照跑但不计入结果)
+REQUIRES = {"proxy": ["probe"], "subs": ["voice"], "clip": ["proxy", "voice"], "mux": ["clip", "subs"],
+            "fused": ["proxy", "voice", "subs"], "job": ["probe"]}
+# 比较时忽略绝对差值低于这些值的变化 (计时噪声)
+NOISE = {"wall_sec": 0.05, "cpu_sec": 0.05, "child_peak_rss_mb": 8.0}
+
+
+def generate_media(media_dir: str, ffmpeg: str) -> tuple:
+    """生成合成素材和 BGM (已存在就跳过)，返回 (素材目录, bgm 路径)"""
+    src_dir = os.path.join(media_dir, "sources")
+    os.makedirs(src_dir, exist_ok=True)
+    for name, w, h, fps, sec in SOURCES:
+        out = os.path.join(src_dir, f"{name}.mp4")
+        if os.path.exists(out):
+            continue
+        print(f"[Bench] generating {name}")
+        subprocess.run([
+            ffmpeg, "-v", "error", "-y",
+            "-f", "lavfi", "-i", f"testsrc2=s={w}x{h}:r={fps}:d={sec}",
+            "-c:v", "libx264", "-pix_fmt", "yuv420p", "-preset", "veryfast", "-g", str(fps * 2),
+            out + ".tmp.mp4"
+        ], check=True)
+        os.replace(out + ".tmp.mp4", out)
+    bgm = os.path.join(media_dir, "bgm.m4a")
+    if not os.path.exists(bgm):
+        subprocess.run([
+            ffmpeg, "-v", "error", "-y",
+            "-f", "lavfi", "-i", "sine=frequency=330:sample_rate=48000:duration=60",
+            "-c:a", "aac", "-b:a", "128k", bgm + ".tmp.m4a"
+        ], check=True)
+        os.replace(bgm + ".tmp.m4a", bgm)
+    return src_dir, bgm
+
+
+class Collector:
+    """作为 Config.metrics 挂上去，收集阶段内每次 ffmpeg 调用的 rusage 汇总"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, event: dict) -> None:
+        pass
+
+    def summary(self, summary: dict) -> None:
+        self.calls.append(summary)
+
+
+def _usage():
+    if resource is None:
+        return None
+    s, c = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return s.ru_utime + s.ru_stime + c.ru_utime + c.ru_stime, s.ru_maxrss
+
+
+def _size(paths) -> int:
+    total = 0
+    for p in paths:
+        if p and os.path.isfile(p):
+            total += os.path.getsize(p)
+    return total
+
+
+def measure(stage: str, fn) -> dict:
+    """跑一个阶段，fn(collector) 返回产物路径列表"""
+    col = Collector()
+    u0 = _usage()
+    t0 = time.perf_counter()
+    outputs = fn(col) or []
+    wall = time.perf_counter() - t0
+    u1 = _usage()
+    rss = [c["max_rss_mb"] for c in col.calls if c.get("max_rss_mb") is not None]
+    rss_div = 1 << 20 if platform.system() == "Darwin" else 1 << 10
+    return {
+        "stage": stage,
+        "wall_sec": round(wall, 3),
+        "cpu_sec": round(u1[0] - u0[0], 3) if u0 else None,
+        "child_peak_rss_mb": round(max(rss), 1) if rss else None,
+        "self_peak_rss_mb": round(u1[1] / rss_div, 1) if u1 else None,
+        "ffmpeg_calls": len(col.calls),
+        "output_bytes": _size(outputs),
+    }
+
+
+def reset_state() -> None:
+    """
+    丢掉 jj 的进程级单例 (素材索引、proxy / TTS 缓存、工作目录管理)，下一个场景从冷状态开始。
+    索引要先 close：它的 SQLite 文件就在场景目录里，随后会被整个删掉。
+    """
+    with jj.media_index_lock:
+        if jj.media_index is not None:
+            jj.media_index.close()
+            jj.media_index = None
+    with jj.workspaces_lock:
+        if jj.workspaces is not None:
+            jj.workspaces.stop_sweeper()
+            jj.workspaces = None
+    jj.proxy_cache = jj.tts_cache = None
+
+
+def run_scenario(name: str, base: Config, src_dir: str, root: str, seed: int, stages) -> list:
+    work = os.path.join(root, "work", name)
+    reset_state()  # 每个场景从冷缓存开始
+    shutil.rmtree(work, ignore_errors=True)
+    os.makedirs(work)
+    cfg = replace(
+        base, **SCENARIOS[name], work_dir=work,
+        media_index_path=os.path.join(work, "index.sqlite"),
+        proxy_cache_dir=os.path.join(work, "proxy"),
+        tts_cache_dir=os.path.join(work, "tts"),
+        metrics_dir=os.path.join(work, "metrics"),
+        work_tmpfs_dir=os.path.join(work, "jobs"),
+        incremental=False,
+    )
+
+    videos = []
+    state = {}
+    out_ass = os.path.join(work, "sub.ass")
+    out_clip = os.path.join(work, "clip.mp4")
+    out_mux = os.path.join(work, "mux.mp4")
+    out_fused = os.path.join(work, "fused.mp4")
+
+    def probe(col):
+        videos[:] = jj.list_videos(src_dir, cfg)
+        random.Random(seed).shuffle(videos)
+        return []
+
+    def proxy(col):
+        return jj.resolve_proxies(videos, replace(cfg, metrics=col))
+
+    def voice(col):
+        wav, timings, _ = jj.build_voice_and_timings(SENTENCES, work, replace(cfg, metrics=col))
+        state["voice"], state["timings"] = wav, timings
+        return [wav]
+
+    def subs(col):
+        timings = [(st, ed, jj.highlight_keywords(t, KEYWORDS)) for st, ed, t in state["timings"]]
+        jj.render_ass(timings, cfg.ass_tpl_path, out_ass, cfg)
+        return [out_ass]
+
+    def clip(col):
+        jj.make_clip_wrapper(videos, out_clip, replace(cfg, metrics=col), target_sec=jj.wav_duration(state["voice"]))
+        return [out_clip]
+
+    def mux(col):
+        jj.mux_with_voice_bgm_and_subtitles(out_clip, state["voice"], out_ass, out_mux, replace(cfg, metrics=col))
+        return [out_mux]
+
+    def fused(col):
+        jj.render_fused(videos, state["voice"], out_ass, out_fused, replace(cfg, metrics=col),
+                        target_sec=jj.wav_duration(state["voice"]))
+        return [out_fused]
+
+    def job(col):
+        # 冷缓存的完整任务 (调度器并发 TTS 与 proxy 预热)
+        jj.proxy_cache = jj.tts_cache = None
+        job_cfg = replace(cfg, proxy_cache_dir=os.path.join(work, "proxy_job"),
+                          tts_cache_dir=os.path.join(work, "tts_job"))
+        out = os.path.join(work, "job.mp4")
+        jj.produce_job(videos, SENTENCES, KEYWORDS, out, job_cfg, job=f"bench_{name}")
+        # produce_job 自己记指标文件，从里面取每次 ffmpeg 调用的汇总
+        with open(os.path.join(cfg.metrics_dir, f"bench_{name}.jsonl"), encoding="utf-8") as f:
+            col.calls.extend(r for r in map(json.loads, f) if r.get("type") == "summary")
+        return [out]
+
+    steps = {"probe": probe, "proxy": proxy, "voice": voice, "subs": subs,
+             "clip": clip, "mux": mux, "fused": fused, "job": job}
+    needed = set()
+    pending = list(stages)
+    while pending:
+        s = pending.pop()
+        if s not in needed:
+            needed.add(s)
+            pending.extend(REQUIRES.get(s, []))
+
+    results = []
+    try:
+        for stage in STAGES:
+            if stage not in needed:
+                continue
+            r = measure(stage, steps[stage])
+            if stage in stages:
+                r["scenario"] = name
+                results.append(r)
+                print(f"[Bench] {name:<10} {stage:<6} {r['wall_sec']:8.3f}s  cpu {r['cpu_sec']}s  "
+                      f"rss {r['child_peak_rss_mb']}MB  out {r['output_bytes']}B")
+    finally:
+        reset_state()
+    return results
+
+
+def cmd_run(args) -> int:
+    root = os.path.abspath(args.root)
+    src_dir, bgm = generate_media(os.path.join(root, "media"), args.ffmpeg)
+    server = start_stub(latency=0.0)
+    base = Config(ffmpeg=args.ffmpeg, ffprobe=args.ffprobe, fps=args.fps, bgm_path=bgm,
+                  hook_text=args.hook, manbo_api_url=stub_url(server), tts_rps=1000.0)
+    stages = args.stage or list(STAGES)
+    runs = []
+    try:
+        for _ in range(args.repeat):
+            for name in args.scenario or list(SCENARIOS):
+                runs.extend(run_scenario(name, base, src_dir, root, args.seed, stages))
+    finally:
+        server.shutdown()
+
+    # 重复多次时每个指标取中位数
+    merged = {}
+    for r in runs:
+        merged.setdefault((r["scenario"], r["stage"]), []).append(r)
+    results = []
+    for (scenario, stage), rs in merged.items():
+        out = {"scenario": scenario, "stage": stage, "repeat": len(rs)}
+        for k in ("wall_sec", "cpu_sec", "child_peak_rss_mb", "self_peak_rss_mb", "ffmpeg_calls", "output_bytes"):
+            vals = [r[k] for r in rs if r[k] is not None]
+            out[k] = statistics.median(vals) if vals else None
+        results.append(out)
+
+    report = {
+        "meta": {
+            "host": platform.node(), "cpus": os.cpu_count(), "python": platform.python_version(),
+            "ffmpeg": jj.tool_version(args.ffmpeg), "seed": args.seed, "fps": args.fps,
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[Bench] wrote {args.out}")
+    return 0
+
+
+def compare(base: dict, new: dict, threshold: float) -> list:
+    """返回 [(scenario, stage, metric, base, new, ratio, regressed), ...]"""
+    index = {(r["scenario"], r["stage"]): r for r in base["results"]}
+    rows = []
+    for r in new["results"]:
+        b = index.get((r["scenario"], r["stage"]))
+        if b is None:
+            continue
+        for metric, noise in NOISE.items():
+            old, cur = b.get(metric), r.get(metric)
+            if not old or cur is None:
+                continue
+            ratio = cur / old
+            regressed = ratio > 1 + threshold and cur - old > noise
+            rows.append((r["scenario"], r["stage"], metric, old, cur, ratio, regressed))
+    return rows
+
+
+def cmd_compare(args) -> int:
+    with open(args.baseline, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.result, encoding="utf-8") as f:
+        new = json.load(f)
+    if base["meta"].get("host") != new["meta"].get("host"):
+        print(f"[Bench] warning: comparing different hosts ({base['meta'].get('host')} vs {new['meta'].get('host')})")
+    rows = compare(base, new, args.threshold)
+    for scenario, stage, metric, old, cur, ratio, regressed in rows:
+        flag = "REGRESSION" if regressed else ("improved" if ratio < 1 - args.threshold else "")
+        print(f"{scenario:<10} {stage:<6} {metric:<18} {old:10.3f} -> {cur:10.3f}  {ratio:6.2f}x  {flag}")
+    n = sum(1 for row in rows if row[-1])
+    print(f"[Bench] {n} regression(s) over {args.threshold:.0%}")
+    return 1 if n else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark (synthetic media + TTS stub)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("run", help="run the benchmark and write JSON")
+    p.add_argument("--ffmpeg", default="ffmpeg")
+    p.add_argument("--ffprobe", default="ffprobe")
+    p.add_argument("--root", default="output/_bench", help="synthetic media + scratch space")
+    p.add_argument("--out", default="output/_bench/result.json")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--fps", type=int, default=30)
+    p.add_argument("--repeat", type=int, default=1, help="runs per scenario, metrics are medians")
+    p.add_argument("--scenario", action="append", choices=list(SCENARIOS))
+    p.add_argument("--stage", action="append", choices=list(STAGES))
+    p.add_argument("--hook", default="", help="hook text (needs an ffmpeg built with drawtext)")
+
+    p = sub.add_parser("compare", help="compare a result against a stored baseline")
+    p.add_argument("baseline")
+    p.add_argument("result")
+    p.add_argument("--threshold", type=float, default=0.15, help="relative slowdown that counts as a regression")
+
+    args = parser.parse_args(argv)
+    return cmd_run(args) if args.cmd == "run" else cmd_compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,39 @@
+import argparse
+import io
+import json
 import os
 import re
-import subprocess
 import sys
-from dataclasses import dataclass
+import tempfile
+import threading
+import time
+import wave
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Tuple
 
 # Load environment variables from .env file
 from dotenv import load_dotenv
 load_dotenv()
 
-# pip install pydub
-from pydub import AudioSegment
-from utils.manbo_tts import ManboTTS
+# pip install pydub numpy
+# numpy / pydub / requests (ManboTTS) 只在合成配音时才用到，在用到的函数里再导入，GUI 和命令行启动不用等它们
+if TYPE_CHECKING:
+    import numpy as np
+    from pydub import AudioSegment
+    from utils.manbo_tts import ManboTTS
+from utils.proxy_cache import ProxyCache
+from utils.media_index import MediaIndex
+from utils.rate_limit import TokenBucket
+from utils.tts_cache import TTSCache
+from utils.scheduler import StageScheduler
+from utils.stage_cache import StageCache
+from utils.workspace import WorkspaceManager
+from utils.ffmpeg_progress import MetricsLog, run_with_progress
+from utils.procman import Cancelled, CancelToken, ProcessManager
+from utils.tool_caps import ToolCaps
+from utils.keywords import compile_keywords, is_keywords_file, keyword_files, read_keywords_file
 
 import random
 import glob
@@ -46,6 +67,8 @@ class Config:
     zhipu_ref_audio: str = None 
 
     enable_zoompan: bool = True
+    # 推镜头实现: "scale_crop" = 逐帧 scale + 固定尺寸 crop (快)，"zoompan" = 原 zoompan 滤镜
+    motion_engine: str = "scale_crop"
     hook_text: str = "3秒学会跑刀！"
     
     audio_speed: float = 1.2
@@ -54,31 +77,239 @@ class Config:
     in_video_dir: str = "E:\\jj\\input"
     script_dir: str = "E:\\jj\\文案"
 
+    # Proxy cache: sources pre-normalized to out_w x out_h @ fps, reused across runs
+    use_proxy_cache: bool = True
+    proxy_cache_dir: str = "output/_cache/proxy"
+    proxy_cache_max_gb: float = 20.0
+
+    # Segmented render: >1 splits Step 1 into N chunks encoded in parallel, joined with -c copy
+    render_segments: int = 0
+    render_workers: int = os.cpu_count() or 1
+
+    # Clip assembly: "graph" = one filter graph over every input (all decoders open at once),
+    # "demuxer" = each source encoded on its own and joined with the concat demuxer (memory stays flat,
+    # no clip cap), "auto" = graph up to graph_max_inputs inputs, demuxer beyond that
+    clip_mode: str = "auto"
+    graph_max_inputs: int = 20
+
+    # Progress telemetry: every ffmpeg call runs with -progress; events go to on_progress(event)
+    # (GUI progress bar) and, per job, to metrics_dir/<job>.jsonl together with per-call summaries
+    metrics_dir: str = "output/_metrics"
+    on_progress: object = None
+    metrics: object = None  # MetricsLog of the running job, set by produce_job
+
+    # Process management (utils/procman.py): every external command runs in its own process group,
+    # killed on cancel / timeout; nice / affinity / thread caps let several jobs share one host
+    proc_nice: int = 0           # >0 lowers ffmpeg/ffprobe priority
+    proc_affinity: tuple = ()    # CPU ids children may run on, () = all
+    proc_threads: int = 0        # ffmpeg -threads / -filter_threads cap, 0 = ffmpeg default
+    probe_timeout_sec: float = 60.0
+    stage_timeouts: tuple = (("voice", 900.0), ("proxies", 3600.0), ("subs", 120.0),
+                             ("clip", 3600.0), ("render", 3600.0), ("mux", 1800.0))
+    cancel: object = None  # CancelToken of the running job (GUI cancel button); per stage inside produce_video
+
+    # Incremental rebuild: stages whose input digest is unchanged reuse their artifacts in work_dir
+    incremental: bool = True
+    force_stages: tuple = ()  # e.g. ("voice",), "mix" = render/mux, "all" = everything
+
+    # Per-job workspaces under work_dir (or on an existing tmpfs mount when it has room); on success only
+    # scratch files are removed (stage cache + artifacts stay for incremental reruns),
+    # a background sweeper enforces the quota / age limit on the workspaces it created
+    work_tmpfs_dir: str = "/dev/shm/jj_work"
+    work_tmpfs_min_free_mb: int = 2048
+    work_quota_gb: float = 10.0
+    work_max_age_hours: float = 24.0
+    work_sweep_interval_sec: float = 300.0
+    keep_work_on_success: bool = False
+
+    # Batch mode (--batch): one output per script (x variants) in batch_out_dir; 0 jobs = sized to CPU cores
+    batch_out_dir: str = "output/batch"
+    batch_jobs: int = 0
+
+    # Fused render: one ffmpeg pass for video + subtitles + audio mix (False = legacy clip.mp4 + mux, for debugging)
+    fused_render: bool = True
+
+    # Duration budget: pick/trim just enough footage to cover the voice track (duration_sec stays the hard cap)
+    budget_by_voice: bool = True
+
+    # ffmpeg / ffprobe version + filters / encoders, probed once per binary (keyed by path + size + mtime)
+    tool_caps_path: str = "output/_cache/tools.json"
+
+    # Media library index (SQLite): probed metadata for footage + BGM, refreshed incrementally by mtime
+    media_index_path: str = "output/_cache/media.sqlite"
+    probe_workers: int = 8
+
+    # Concurrent TTS: max requests in flight + token-bucket requests/s (replaces the fixed 0.5s sleep)
+    manbo_api_url: str = os.getenv("MANBO_TTS_URL", "https://api.milorapart.top/apis/mbAIsc")
+    tts_max_in_flight: int = 4
+    tts_rps: float = 2.0
+    tts_max_retries: int = 3
+    tts_backoff_sec: float = 0.5
+
+    # TTS cache: normalized PCM per (provider, voice, text, speed, sr), LRU-bounded
+    use_tts_cache: bool = True
+    tts_cache_dir: str = "output/_cache/tts"
+    tts_cache_max_mb: int = 1024
+
+
+VIDEO_EXTS = (".mp4", ".mov", ".mkv")
+
+# 可被 --force-stage 强制重跑的阶段 ("mix" 在 render/mux 里完成，"all" 表示全部)
+STAGES = ("voice", "subs", "clip", "render", "mux")
+STAGE_STATE_FILE = "stages.json"  # 工作目录里的增量缓存状态 (StageCache)
+FORCE_STAGE_CHOICES = STAGES + ("mix", "all")
+
 
 # -------------------------
 # Utils
 # -------------------------
-def run(cmd: List[str]) -> None:
+procs = None
+procs_lock = threading.Lock()
+
+def get_procs(config: Config) -> ProcessManager:
+    global procs
+    with procs_lock:
+        if procs is None or (procs.nice, procs.affinity) != (config.proc_nice, sorted(set(config.proc_affinity)) or None):
+            procs = ProcessManager(config.proc_nice, config.proc_affinity)
+        return procs
+
+
+def check_cancel(config: Config) -> None:
+    """Python 侧的长循环 (TTS 等) 里调用：任务已取消 / 阶段已超时就抛 Cancelled"""
+    if config.cancel is not None:
+        config.cancel.check()
+
+
+def run_capture(cmd: List[str], config: Config, input: bytes = None, timeout: float = None, check: bool = True):
+    """ffprobe / 管道解码等短命令：收集输出，走同一个进程管理 (可取消，有超时)"""
+    return get_procs(config).run(cmd, token=config.cancel, timeout=timeout or config.probe_timeout_sec,
+                                 input=input, capture=True, check=check)
+
+
+def cap_threads(cmd: List[str], config: Config) -> List[str]:
+    """proc_threads > 0 时给 ffmpeg 加线程上限；每一项单独判断，调用方已经指定的那一项不覆盖"""
+    if not config.proc_threads:
+        return cmd
+    n = str(config.proc_threads)
+    head = []
+    for flag in ("-filter_threads", "-filter_complex_threads"):
+        if flag not in cmd:
+            head.extend([flag, n])
+    tail = [] if "-threads" in cmd else ["-threads", n]
+    return [cmd[0]] + head + cmd[1:-1] + tail + [cmd[-1]]
+
+
+def run(cmd: List[str], config: Config = None, label: str = "ffmpeg", total_sec: float = None) -> None:
+    """
+    跑一条 ffmpeg 命令，-progress 事件交给 config.metrics / config.on_progress。
+    total_sec: 预计输出时长，用于算百分比和 ETA (不知道就传 None)。
+    进程经 ProcessManager 启动：config.cancel 取消或到期时整组杀掉。
+    """
+    config = config or Config()
+    cmd = cap_threads(cmd, config)
     print("RUN:", " ".join(cmd))
-    subprocess.run(cmd, check=True)
+    metrics = config.metrics
+    on_event = metrics if metrics is not None else config.on_progress
+    summary = run_with_progress(cmd, on_event, label, total_sec, get_procs(config), config.cancel)
+    if metrics is not None:
+        metrics.summary(summary)
+    speed = f", {summary['speed']:.2f}x" if summary["speed"] else ""
+    usage = ""
+    if summary["cpu_user_sec"] is not None:
+        usage = (f", cpu {summary['cpu_user_sec'] + summary['cpu_sys_sec']:.2f}s"
+                 f", rss {summary['max_rss_mb']:.0f}MB")
+    print(f"[ffmpeg] {label}: {summary['frames']} frames in {summary['wall_sec']:.2f}s "
+          f"({summary['avg_fps'] or 0:.1f} fps{speed}{usage})")
 
 
 def ensure_dir(p: str) -> None:
     Path(p).mkdir(parents=True, exist_ok=True)
 
 
+tool_caps = None
+tool_caps_lock = threading.Lock()
+
+def get_tool_caps(config: Config = None) -> ToolCaps:
+    global tool_caps
+    config = config or Config()
+    with tool_caps_lock:
+        if tool_caps is None or tool_caps.cache_path != config.tool_caps_path:
+            tool_caps = ToolCaps(config.tool_caps_path,
+                                 runner=lambda cmd: ProcessManager().run(cmd, timeout=30, capture=True).stdout)
+        return tool_caps
+
+
+def tool_version(binary: str, config: Config = None) -> str:
+    """`ffmpeg -version` 第一行 (见 ToolCaps，磁盘缓存)，作为各阶段输入摘要的一部分"""
+    return get_tool_caps(config).get(binary)["version"]
+
+
+def ffmpeg_major(binary: str, config: Config = None) -> int:
+    """ffmpeg 主版本号；git 构建等解析不出时为 0"""
+    return get_tool_caps(config).get(binary)["major"]
+
+
+def missing_capabilities(config: Config) -> List[str]:
+    """这次渲染要用到、但 config.ffmpeg 没有编译进去的编码器 / 滤镜"""
+    caps = get_tool_caps(config).get(config.ffmpeg)
+    if caps["version"] == "unknown":
+        return [f"ffmpeg ({config.ffmpeg})"]
+    if not caps["encoders"] or not caps["filters"]:
+        return []  # 列表没探测出来时不拦，交给 ffmpeg 自己报错
+    encoders = ["libx264", "aac"]
+    filters = ["concat", "scale", "crop", "setsar", "ass", "atempo", "sidechaincompress", "amix", "loudnorm"]
+    if config.hook_text:
+        filters.append("drawtext")
+    if config.enable_zoompan and config.motion_engine == "zoompan":
+        filters.append("zoompan")
+    missing = [f"encoder {e}" for e in encoders if e not in caps["encoders"]]
+    missing += [f"filter {f}" for f in filters if f not in caps["filters"]]
+    return missing
+
+
+def file_fingerprint(path: str):
+    """(路径, 大小, mtime_ns)，文件不存在时为 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+
+media_index = None
+media_index_lock = threading.Lock()
+
+def get_media_index(config: Config) -> MediaIndex:
+    global media_index
+    with media_index_lock:
+        if media_index is None or media_index.db_path != config.media_index_path:
+            # 探测走进程管理 (有超时)；索引是全局共享的，不挂在某个任务的取消 token 上
+            probe_cfg = replace(config, cancel=None)
+            media_index = MediaIndex(config.media_index_path, config.ffprobe, config.probe_workers,
+                                     runner=lambda cmd: run_capture(cmd, probe_cfg).stdout)
+        return media_index
+
+
+def list_videos(video_dir: str, config: Config) -> List[str]:
+    """素材目录下的视频 (经索引增量刷新，不再每次 glob + ffprobe)"""
+    return get_media_index(config).refresh(video_dir, VIDEO_EXTS)
+
+
 def ffprobe_duration(video_path: str, config: Config) -> float:
-    cmd = [
-        config.ffprobe, "-v", "error",
-        "-show_entries", "format=duration",
-        "-of", "default=noprint_wrappers=1:nokey=1",
-        video_path
-    ]
+    info = get_media_index(config).get(video_path)
+    if not info or not info["duration"]:
+        print(f"Warning: Could not get duration for {video_path}")
+        return 0.0
+    return info["duration"]
+
+
+def wav_duration(wav_path: str) -> float:
+    """直接读 WAV 头拿时长，不需要起 ffprobe"""
     try:
-        out = subprocess.check_output(cmd).decode().strip()
-        return float(out)
+        with wave.open(wav_path, "rb") as w:
+            return w.getnframes() / float(w.getframerate())
     except Exception as e:
-        print(f"Warning: Could not get duration for {video_path}: {e}")
+        print(f"Warning: Could not read wav duration for {wav_path}: {e}")
         return 0.0
 
 
@@ -114,11 +345,9 @@ def split_sentences(text: str) -> List[str]:
     return out
 
 
-def highlight_keywords(line: str, keywords: List[str]) -> str:
-    for kw in keywords:
-        if kw and kw in line:
-            line = line.replace(kw, r"{\rEmph}" + kw + r"{\rDefault}")
-    return line
+def highlight_keywords(line: str, keywords) -> str:
+    """关键词加 Emph 样式：keywords 为词表或 compile_keywords() 编译好的匹配器；最左最长、不重叠，不会嵌套标签"""
+    return compile_keywords(keywords).highlight(line, r"{\rEmph}", r"{\rDefault}")
 
 
 # -------------------------
@@ -127,15 +356,30 @@ def highlight_keywords(line: str, keywords: List[str]) -> str:
 def check_audio_streams(video_path: str, config: Config):
     """【自检1】检查文件是否包含音频流"""
     print(f"\n[Check] Inspecting streams in {video_path}...")
-    cmd = [config.ffprobe, "-v", "error", "-show_streams", video_path]
-    try:
-        res = subprocess.check_output(cmd).decode()
-        if "codec_type=audio" in res:
-            print("  -> PASS: Audio stream detected.")
-        else:
-            print("  -> FAIL: No audio stream found!")
-    except Exception as e:
-        print(f"  -> FAIL: ffprobe error: {e}")
+    # 输出文件是一次性的，不写入索引
+    info = get_media_index(config).get(video_path, store=False)
+    if info is None:
+        print("  -> FAIL: file missing.")
+    elif info["error"]:
+        print(f"  -> FAIL: ffprobe error: {info['error']}")
+    elif info["has_audio"]:
+        print("  -> PASS: Audio stream detected.")
+    else:
+        print("  -> FAIL: No audio stream found!")
+
+
+def preflight_check(config: Config) -> None:
+    """【预检】开始渲染前确认 ffmpeg 编码器 / 滤镜齐全 (读能力缓存)、BGM 可用 (读索引，不单独起 ffprobe)"""
+    missing = missing_capabilities(config)
+    if missing:
+        raise RuntimeError(f"{config.ffmpeg} lacks required capabilities: {', '.join(missing)}")
+    info = get_media_index(config).get(config.bgm_path)
+    if info is None:
+        raise FileNotFoundError(f"BGM not found: {config.bgm_path}")
+    if info["error"]:
+        raise RuntimeError(f"Could not probe BGM {config.bgm_path}: {info['error']}")
+    if not info["has_audio"]:
+        raise RuntimeError(f"BGM has no audio stream: {config.bgm_path}")
 
 
 def check_wav_volume(wav_path: str, config: Config):
@@ -148,8 +392,8 @@ def check_wav_volume(wav_path: str, config: Config):
         "-f", "null", "/dev/null"
     ]
     # ffmpeg prints filter stats to stderr
-    res = subprocess.run(cmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-    log = res.stderr.decode()
+    res = run_capture(cmd, config, check=False)
+    log = res.stderr.decode("utf-8", "replace")
     
     # Extract mean_volume and max_volume
     mean_vol = re.search(r"mean_volume:\s*([-.\d]+)\s*dB", log)
@@ -167,88 +411,164 @@ def check_wav_volume(wav_path: str, config: Config):
         print("  -> WARNING: Could not parse volumedetect output.")
 
 
-def process_audio_speed(in_file: str, out_file: str, speed: float, config: Config) -> bool:
+# -------------------------
+# TTS Logic
+# -------------------------
+tts_client = None
+tts_client_key = None
+tts_client_lock = threading.Lock()
+
+def get_tts_client(config: Config) -> "ManboTTS":
     """
-    Use ffmpeg atempo filter to change speed without pitch shift.
-    Supports speed from 0.5 to 2.0 (single pass).
+    进程内共用的 TTS 客户端：限流器 (tts_rps) 和在途请求上限 (tts_max_in_flight) 都挂在它上面，
+    批量 / 队列里同时跑的多个任务合计也不会超过这两个限制。
+    按 URL + 限流 / 重试参数缓存，改了这些设置 (GUI、服务的任务) 会换一个新客户端。
+    """
+    global tts_client, tts_client_key
+    key = (config.manbo_api_url, config.tts_rps, config.tts_max_in_flight,
+           config.tts_max_retries, config.tts_backoff_sec)
+    with tts_client_lock:
+        if tts_client is None or tts_client_key != key:
+            from utils.manbo_tts import ManboTTS
+            if tts_client is not None:
+                print(f"[ManboTTS] Settings changed, new client: url/rps/in_flight/retries/backoff = {key}")
+            tts_client_key = key
+            limiter = TokenBucket(config.tts_rps, burst=config.tts_max_in_flight)
+            tts_client = ManboTTS(
+                config.manbo_api_url, rate_limiter=limiter,
+                max_retries=config.tts_max_retries, backoff=config.tts_backoff_sec,
+                pool_size=config.tts_max_in_flight, max_in_flight=config.tts_max_in_flight
+            )
+        return tts_client
+
+
+tts_cache = None
+tts_cache_lock = threading.Lock()
+
+def get_tts_cache(config: Config) -> TTSCache:
+    global tts_cache
+    with tts_cache_lock:
+        if tts_cache is None or tts_cache.cache_dir != config.tts_cache_dir:
+            tts_cache = TTSCache(config.tts_cache_dir, config.tts_cache_max_mb * (1 << 20))
+        return tts_cache
+
+
+def decode_audio_bytes(data: bytes, config: Config) -> "AudioSegment":
+    """
+    TTS 返回的音频在内存里直接解码为 config.sr / 单声道 / 16bit PCM：
+    - WAV: 进程内解析 + 重采样，不起子进程
+    - 其他 (Manbo 是 mp3): 一个 ffmpeg 进程，stdin 进 stdout 出，不落盘
+    """
+    from pydub import AudioSegment
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        with wave.open(io.BytesIO(data), "rb") as w:
+            seg = AudioSegment(
+                data=w.readframes(w.getnframes()),
+                sample_width=w.getsampwidth(),
+                frame_rate=w.getframerate(),
+                channels=w.getnchannels(),
+            )
+        return seg.set_sample_width(2).set_channels(1).set_frame_rate(config.sr)
+
+    cmd = [
+        config.ffmpeg, "-v", "error",
+        "-i", "pipe:0",
+        "-f", "s16le", "-acodec", "pcm_s16le",
+        "-ac", "1", "-ar", str(config.sr),
+        "pipe:1"
+    ]
+    res = run_capture(cmd, config, input=data)
+    return AudioSegment(data=res.stdout, sample_width=2, frame_rate=config.sr, channels=1)
+
+
+def apply_tempo(pcm: "np.ndarray", sr: int, speed: float, config: Config, out_wav: str, channels: int = 2) -> None:
+    """
+    整条配音 (mono int16) 只做一次变速 (atempo 不变调) 并写成 WAV。
+    PCM 直接以 buffer 的形式写进 ffmpeg 的 stdin，变速和双声道都由 ffmpeg 写进 out_wav，
+    结果不再回到 Python，内存里始终只有这一份整条配音。
+    atempo 单级只支持 0.5~2.0，超出范围时串联多级。
     """
     if abs(speed - 1.0) < 0.01:
-        return False
-        
-    print(f"  -> Applying audio speed {speed}x...")
+        write_wav(out_wav, pcm, sr, channels)
+        return
+    print(f"  -> Applying audio speed {speed}x to assembled voice...")
+    stages = []
+    s = speed
+    while s > 2.0:
+        stages.append("atempo=2.0")
+        s /= 2.0
+    while s < 0.5:
+        stages.append("atempo=0.5")
+        s /= 0.5
+    stages.append(f"atempo={s}")
     cmd = [
-        config.ffmpeg, "-y",
-        "-i", in_file,
-        "-filter:a", f"atempo={speed}",
-        "-vn", 
-        out_file
+        config.ffmpeg, "-y", "-v", "error",
+        "-f", "s16le", "-ar", str(sr), "-ac", "1", "-i", "pipe:0",
+        "-filter:a", ",".join(stages),
+        "-c:a", "pcm_s16le", "-ar", str(sr), "-ac", str(channels),
+        out_wav
     ]
-    try:
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        return True
-    except Exception as e:
-        print(f"  -> Speed change failed: {e}")
-        return False
+    run_capture(cmd, config, input=memoryview(pcm.astype("<i2", copy=False)).cast("B"))
 
-# -------------------------
-# TTS Logic
-# -------------------------
-tts_client = None
 
-def tts_generate_wav(text: str, out_wav: str, config: Config) -> None:
+def write_wav(path: str, pcm: "np.ndarray", sr: int, channels: int = 1, block: int = 1 << 16) -> None:
+    """
+    mono int16 -> WAV。channels=2 时逐块复制成双声道 (交错存储)：
+    只预分配一块 (block, channels) 的小 buffer，不整段复制。
+    """
+    import numpy as np
+    pcm = pcm.astype("<i2", copy=False)
+    with wave.open(path, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        if channels == 1:
+            w.writeframes(memoryview(pcm).cast("B"))
+            return
+        buf = np.empty((min(block, len(pcm)), channels), dtype="<i2")
+        for i in range(0, len(pcm), block):
+            chunk = pcm[i:i + block]
+            out = buf[:len(chunk)]
+            out[:] = chunk[:, None]
+            w.writeframes(memoryview(out).cast("B"))
+
+
+def tts_generate_pcm(text: str, config: Config) -> Tuple["AudioSegment", str]:
     """
     【修复】
     1. 接收 TTS API 返回的二进制数据
-    2. 存为临时文件
-    3. 用 pydub 转码为标准 PCM wav (48k, 16bit)
+    2. 内存中解码为标准 PCM (config.sr, 16bit, mono)，不写临时文件
+    3. 变速不在这里做，由 build_voice_and_timings 对整条配音统一处理
+    返回 (音频, 来源)，来源: "cache" / "manbo" / "fallback" (用于每个任务的命中统计)
     """
-    global tts_client
-    
+    check_cancel(config)
+    from pydub import AudioSegment
     # 尝试使用 Manbo TTS
     if config.use_manbo_tts:
+        cache_key = None
+        if config.use_tts_cache:
+            # 缓存的是变速前的 PCM，所以 speed 固定记 1.0，改语速也能命中
+            cache_key = TTSCache.key("manbo", "default", text, 1.0, config.sr)
+            cached = get_tts_cache(config).get_bytes(cache_key)
+            if cached is not None:
+                return AudioSegment(data=cached, sample_width=2, frame_rate=config.sr, channels=1), "cache"
         try:
-            if tts_client is None:
-                tts_client = ManboTTS()
+            tts_client = get_tts_client(config)
                 
             print(f"TTS Generating (Manbo): {text[:10]}...")
             audio_data = tts_client.generate_speech(text)
             
             if audio_data:
                 print(f"  -> Received {len(audio_data)} bytes from Manbo.")
+                seg = decode_audio_bytes(audio_data, config)
+
+                # 只缓存真实合成的结果，fallback 的 beep 不进缓存
+                if cache_key:
+                    get_tts_cache(config).put_bytes(cache_key, seg.raw_data)
+                return seg, "manbo"
                 
-                # Manbo returns mp3
-                tmp_audio = out_wav + ".tmp.mp3" # Save as mp3 explicitly
-                with open(tmp_audio, "wb") as f:
-                    f.write(audio_data)
-                
-                # Apply speed change if needed
-                processed_audio = tmp_audio
-                if config.audio_speed != 1.0:
-                    speed_out = out_wav + ".speed.wav"
-                    if process_audio_speed(tmp_audio, speed_out, config.audio_speed, config):
-                        processed_audio = speed_out
-                
-                # Try to read with pydub (auto detect)
-                try:
-                    # print("  -> Attempting to read audio with pydub (autodetect)...")
-                    seg = AudioSegment.from_file(processed_audio)
-                except Exception as e_auto:
-                    print(f"  -> Autodetect failed: {e_auto}. Trying format='mp3'...")
-                    try:
-                        seg = AudioSegment.from_file(processed_audio, format="mp3")
-                    except Exception as e_mp3:
-                        print(f"  -> MP3 read failed: {e_mp3}. Fallback...")
-                        raise
-                
-                seg = seg.set_frame_rate(config.sr).set_channels(1) 
-                seg.export(out_wav, format="wav")
-                
-                # Cleanup
-                for f in [tmp_audio, out_wav + ".speed.wav"]:
-                    try: os.remove(f) 
-                    except: pass
-                return
-                
+        except Cancelled:
+            raise
         except Exception as e:
             print(f"ERROR: Manbo TTS failed ({e}). Fallback to silent.")
 
@@ -259,55 +579,69 @@ def tts_generate_wav(text: str, out_wav: str, config: Config) -> None:
 
     # Fallback
     print("TTS Fallback: Generating loud tone for debugging.")
-    est_ms = int((len(text) * 0.25 + 0.5) * 1000)
+    # 整条配音之后还会统一变速，这里预先乘上语速，保证 beep 的最终时长不变
+    est_ms = int((len(text) * 0.25 + 0.5) * 1000 * config.audio_speed)
     # 生成一个 440Hz 的正弦波 (beep) 替代静音，确保能听到
     from pydub.generators import Sine
-    audio = Sine(440).to_audio_segment(duration=est_ms).apply_gain(-10)
-    audio = audio.set_frame_rate(config.sr).set_channels(1)
-    audio.export(out_wav, format="wav")
+    audio = Sine(440, sample_rate=config.sr).to_audio_segment(duration=est_ms).apply_gain(-10)
+    audio = audio.set_sample_width(2).set_frame_rate(config.sr).set_channels(1)
+    return audio, "fallback"
 
 
-def build_voice_and_timings(sentences: List[str], keywords: List[str], work: str, config: Config) -> Tuple[str, List[Tuple[float, float, str]]]:
+def build_voice_and_timings(sentences: List[str], work: str, config: Config) -> Tuple[str, List[Tuple[float, float, str]], int]:
+    """
+    合成整条配音，返回 (voice.wav, 每句的 (开始, 结束, 原文), fallback 句数)。
+    关键词高亮在字幕阶段做，改关键词不需要重新合成。
+    """
     ensure_dir(work)
-    segments = []
     timings = []
-    t = 0.0
-    
-    for i, s in enumerate(sentences):
-        tmp = os.path.join(work, f"tts_{i:03d}.wav")
-        tts_generate_wav(s, tmp, config)
-        
-        # 验证生成的wav是否有效
-        try:
-            seg = AudioSegment.from_file(tmp)
-        except:
-            # 再次fallback防止崩
-            seg = AudioSegment.silent(duration=1000, frame_rate=config.sr)
-            
-        dur = seg.duration_seconds
-        sub = highlight_keywords(s, keywords)
-        timings.append((t, t + dur, sub))
-        t += dur
-        
-        # 句间停顿 0.15s
-        pause = AudioSegment.silent(duration=150, frame_rate=config.sr)
-        segments.append(seg + pause)
-        t += 0.15
+    speed = config.audio_speed if abs(config.audio_speed - 1.0) >= 0.01 else 1.0
 
-    if not segments:
-        voice = AudioSegment.silent(duration=1000, frame_rate=config.sr)
+    # 并发合成 (受 tts_max_in_flight / tts_rps 约束)，结果按句子顺序拼接，时间轴与串行一致
+    mark = get_tts_client(config).mark() if config.use_manbo_tts else None
+    with ThreadPoolExecutor(max_workers=max(1, config.tts_max_in_flight)) as pool:
+        results = list(pool.map(lambda s: tts_generate_pcm(s, config), sentences))
+    sources = [src for _, src in results]
+    print(
+        f"[TTSCache] hits={sources.count('cache')} misses={sources.count('manbo')} "
+        f"fallback={sources.count('fallback')} (of {len(sources)} sentences)"
+    )
+    if mark is not None:
+        print(get_tts_client(config).format_stats(since=mark))
+    
+    # 预先算好每句的采样偏移，时间轴直接由采样数得出；整条配音写进一块预分配的 int16 buffer
+    # (pydub 的 sum(segments) 每次相加都会复制整段 buffer，句子多时是 O(n^2))
+    # 每句写进 buffer 后立即释放，变速和双声道由 apply_tempo 直接写文件，整个过程只有这一份整条配音
+    import numpy as np
+    pause_n = int(round(0.15 * speed * config.sr))  # 句间停顿 0.15s (变速后)
+    if results:
+        total_n = sum(len(seg.raw_data) // 2 for seg, _ in results) + pause_n * len(results)
     else:
-        voice = sum(segments)
+        total_n = config.sr  # 无文案时 1s 静音
+    voice = np.zeros(total_n, dtype=np.int16)
+
+    pos = 0
+    for i, s in enumerate(sentences):
+        seg, _ = results[i]
+        results[i] = None
+        clip = np.frombuffer(seg.raw_data, dtype=np.int16)
+        voice[pos:pos + len(clip)] = clip
+        # 时间轴按变速后的时长计算 (变速在整条配音上统一做一次)
+        st = pos / config.sr / speed
+        pos += len(clip)
+        timings.append((st, pos / config.sr / speed, s))
+        pos += pause_n
+        del seg, clip
 
     # 统一输出格式：48k, Stereo
     voice_wav = os.path.join(work, "voice.wav")
-    voice = voice.set_frame_rate(config.sr).set_channels(2)
-    voice.export(voice_wav, format="wav")
+    apply_tempo(voice, config.sr, speed, config, voice_wav, channels=2)
+    del voice
     
     # 【自检】
     check_wav_volume(voice_wav, config)
     
-    return voice_wav, timings
+    return voice_wav, timings, sources.count("fallback")
 
 
 def render_ass(timings: List[Tuple[float, float, str]], ass_tpl_path: str, out_ass: str, config: Config) -> None:
@@ -362,66 +696,319 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 # -------------------------
 # FFmpeg pipeline
 # -------------------------
-def make_clip(in_videos: List[str], out_video: str, config: Config) -> None:
+# proxy 缓存键里的归一化版本：normalize_filter / input_filter / x264_args 的输出变了就 +1，旧 proxy 自动失效
+# 2: 统一 setsar=1，只需裁切的素材不再缩放
+NORMALIZE_VERSION = 2
+
+
+def normalize_filter(config: Config, ops: List[str] = None) -> str:
     """
-    【画面优化】
-    1. 随机拼接多个视频
-    2. 缩放+裁切到 config.out_w x config.out_h
-    3. FPS=config.fps
-    4. Zoompan 动态效果
-    5. Drawtext 钩子文案
+    缩放+裁切到 config.out_w x config.out_h 并统一帧率 (cover 模式)。
+    Scale logic: cover the target aspect ratio
+    if (iw/ih > out_w/out_h) -> scale height to out_h, width auto (-2)
+    else -> scale width to out_w, height auto (-2)
+    Then crop to out_w:out_h
+    ops: source_ops() 的结果，只生成真正需要的步骤；None 表示全部都做。
+    """
+    target_ar = config.out_w / config.out_h
+    parts = []
+    if ops is None or "scale" in ops:
+        parts.append(
+            f"scale=if(gte(iw/ih\\,{target_ar})\\,-2\\,{config.out_w}):"
+            f"if(gte(iw/ih\\,{target_ar})\\,{config.out_h}\\,-2)"
+        )
+    if ops is None or "crop" in ops:
+        parts.append(f"crop={config.out_w}:{config.out_h}")
+    parts.append("setsar=1")
+    if ops is None or "fps" in ops:
+        parts.append(f"fps={config.fps}")
+    return ",".join(parts)
+
+
+def source_ops(info: dict, config: Config) -> List[str]:
+    """
+    按探测到的元数据判断归一化真正要做哪些步骤：
+    scale (尺寸不是 cover 后的结果) / crop (比目标大) / fps (帧率不同) / rotate (带旋转元数据，解码时自动转正)。
+    拿不到元数据时按最坏情况全做。
+    """
+    if not info or not info.get("width") or not info.get("height"):
+        return ["scale", "crop", "fps"]
+    w, h = info["width"], info["height"]
+    ops = []
+    if info.get("rotation"):
+        ops.append("rotate")
+        if info["rotation"] in (90, 270):
+            w, h = h, w
+
+    if w / h >= config.out_w / config.out_h:
+        # 按高度缩放，宽度 -2 (取偶数)
+        if h != config.out_h or w % 2:
+            ops.append("scale")
+            w, h = int(round(w * config.out_h / h / 2)) * 2, config.out_h
+    else:
+        if w != config.out_w or h % 2:
+            ops.append("scale")
+            w, h = config.out_w, int(round(h * config.out_w / w / 2)) * 2
+    if (w, h) != (config.out_w, config.out_h):
+        ops.append("crop")
+
+    if not info.get("fps") or abs(info["fps"] - config.fps) >= 0.01:
+        ops.append("fps")
+    return ops
+
+
+def x264_args(config: Config) -> List[str]:
+    """proxy / 分段 / clip 共用的视频编码参数；这些片段之间要能 -c copy 拼接，参数必须完全一致"""
+    return ["-r", str(config.fps), "-c:v", "libx264", "-pix_fmt", "yuv420p", "-preset", "veryfast", "-crf", "18"]
+
+
+# concat demuxer + -c copy 要求每段的这些参数完全相同，否则拼出来的文件在部分播放器上花屏 / 卡住
+STREAM_SIGNATURE = ("codec", "pix_fmt", "profile", "level", "time_base", "sar", "extradata")
+
+encoder_signatures = {}
+encoder_signatures_lock = threading.Lock()
+
+def encoder_signature(config: Config) -> dict:
+    """
+    用 x264_args 编码几帧参考片段再 probe，得到我们自己输出的 STREAM_SIGNATURE
+    (按 ffmpeg + 输出尺寸/帧率缓存)。探测不完整时为 None，此时一律重编码。
+    """
+    key = (config.ffmpeg, config.out_w, config.out_h, config.fps)
+    with encoder_signatures_lock:
+        if key in encoder_signatures:
+            return encoder_signatures[key]
+        fd, ref = tempfile.mkstemp(prefix="jj_ref_", suffix=".mp4")
+        os.close(fd)
+        sig = None
+        try:
+            probe_cfg = replace(config, cancel=None)
+            run_capture([config.ffmpeg, "-y", "-v", "error",
+                         "-f", "lavfi", "-i", f"color=c=black:s={config.out_w}x{config.out_h}:r={config.fps}",
+                         "-frames:v", "2", "-vf", "setsar=1"] + x264_args(config) + [ref], probe_cfg)
+            info = get_media_index(config).get(ref, store=False) or {}
+            if all(info.get(k) is not None for k in STREAM_SIGNATURE):
+                sig = {k: info[k] for k in STREAM_SIGNATURE}
+            else:
+                print(f"[Plan] Could not read encoder parameters from ffprobe, stream copy disabled: {info}")
+        except Exception as e:
+            print(f"[Plan] Reference encode failed, stream copy disabled: {e}")
+        finally:
+            try: os.remove(ref)
+            except OSError: pass
+        encoder_signatures[key] = sig
+        return sig
+
+
+def stream_copy_ok(info: dict, ops: List[str], config: Config) -> bool:
+    """无需任何归一化，且编码参数 (STREAM_SIGNATURE) 与我们的 x264 输出完全一致，可以直接 -c copy 拼接"""
+    if ops or not info:
+        return False
+    sig = encoder_signature(config)
+    return sig is not None and all(info.get(k) == v for k, v in sig.items())
+
+
+def input_filter(ops: List[str], config: Config) -> str:
+    """单个输入的归一化 filter；什么都不用做时也统一 SAR，concat 要求所有输入一致"""
+    if not ops or ops == ["rotate"]:
+        return "setsar=1"
+    return normalize_filter(config, ops)
+
+
+proxy_cache = None
+proxy_cache_lock = threading.Lock()
+
+def get_proxy_cache(config: Config) -> ProxyCache:
+    global proxy_cache
+    with proxy_cache_lock:
+        if proxy_cache is None or proxy_cache.cache_dir != config.proxy_cache_dir:
+            proxy_cache = ProxyCache(config.proxy_cache_dir, int(config.proxy_cache_max_gb * (1 << 30)))
+        return proxy_cache
+
+
+def build_proxy(src: str, out_video: str, config: Config) -> None:
+    """把单个素材归一化为 proxy (只做一次，之后复用)；已经符合目标参数的素材直接 remux"""
+    info = get_media_index(config).get(src)
+    ops = source_ops(info, config)
+    if stream_copy_ok(info, ops, config):
+        print(f"[Plan] proxy {os.path.basename(src)}: stream copy (already {config.out_w}x{config.out_h}@{config.fps})")
+        run([config.ffmpeg, "-y", "-i", src, "-map", "0:v:0", "-an", "-c:v", "copy", out_video],
+            config, "proxy", ffprobe_duration(src, config))
+        return
+    print(f"[Plan] proxy {os.path.basename(src)}: {'+'.join(ops) or 'reencode'}")
+    run([
+        config.ffmpeg, "-y",
+        "-i", src,
+        "-vf", input_filter(ops, config),
+        "-an",
+        *x264_args(config),
+        out_video
+    ], config, "proxy", ffprobe_duration(src, config))
+
+
+def resolve_proxies(in_videos: List[str], config: Config) -> List[str]:
+    """Map each raw source to its cached proxy, building missing ones (once per unique source)."""
+    cache = get_proxy_cache(config)
+    resolved = {}
+    for v in in_videos:
+        if v not in resolved:
+            resolved[v] = cache.get_or_build(
+                v, config.out_w, config.out_h, config.fps,
+                lambda src, out: build_proxy(src, out, config), NORMALIZE_VERSION,
+            )
+    return [resolved[v] for v in in_videos]
+
+
+def ass_filter(ass_path: str) -> str:
+    # 转义路径供 filter 使用
+    ass_path_esc = ass_path.replace("\\", "/").replace(":", "\\:")
+    return f"ass='{ass_path_esc}'"
+
+
+def motion_filter(config: Config, frame_offset: int = 0) -> str:
+    """
+    zoompan 推镜头 (motion_engine="zoompan")：接在 concat 之后，逐帧裁窗口再缩放。
+    zoom 每帧 +0.0005，上限 1.1，写成输出帧号的闭式，分段渲染时从任意帧继续。
+    y 表达式在整个 zoom 区间都会被夹到 0，实际效果是水平居中、顶边对齐。
+    """
+    # d=1 时 zoom 每帧 +0.0005，写成输出帧号的闭式，分段渲染时可从任意帧继续
+    z_expr = f"min(1+0.0005*(on+{frame_offset + 1}),1.1)"
+    y_expr = "ih/2-(ih/zoom/2) - (ih*0.05)"
+    x_expr = "iw/2-(iw/zoom/2)"
+    return (
+        f"zoompan=z='{z_expr}':d=1:"
+        f"x='{x_expr}':y='{y_expr}':s={config.out_w}x{config.out_h}:fps={config.fps}"
+    )
+
+
+def source_dims(info: dict):
+    """解码 (自动转正) 后的 (宽, 高)；拿不到时为 None"""
+    if not info or not info.get("width") or not info.get("height"):
+        return None
+    if info.get("rotation") in (90, 270):
+        return info["height"], info["width"]
+    return info["width"], info["height"]
+
+
+ZOOM_RATE = 0.0005  # 每帧 zoom 增量
+ZOOM_MAX = 1.1
+ZOOM_RAMP_FRAMES = int(round((ZOOM_MAX - 1) / ZOOM_RATE)) - 1  # 时间线第几帧起 zoom 封顶
+
+
+def zoom_input_filter(ops: List[str], dims, start_frame: int, n_frames: int, tag: str, config: Config) -> str:
+    """
+    scale_crop 推镜头 (motion_engine="scale_crop")：在每个输入上完成，取代 concat 后的 zoompan。
+    - 先在源分辨率上裁出 cover 区域 (固定窗口，居中)，不再把整帧放大后再丢掉两边
+    - zoom 爬升段 (时间线前 ZOOM_RAMP_FRAMES 帧)：一次 scale (eval=frame) 缩放到 out*zoom，
+      只有尺寸变化时才重建 swscale，再按 zoompan 的几何 (水平居中、顶边对齐) 裁出目标尺寸。
+      crop 的 iw/ih 只在初始化时求值，帧尺寸逐帧变化时会过时，所以裁切位置用同一个 zoom 表达式直接算。
+    - 封顶段 (zoom=1.1 不变)：固定窗口 crop + 固定尺寸 scale，与普通归一化一样便宜
+    一个输入跨越两段时用 split/trim 拆开再 concat。
+    dims: 源尺寸 (source_dims)，未知时先完整归一化再放大。
+    start_frame / n_frames: 该输入在整条时间线上的起始帧和使用帧数，zoom 跨素材/分段连续。
+    tag: 该输入内部 filter 标签的前缀 (同一个 graph 里要唯一)。
+    """
+    ow, oh = config.out_w, config.out_h
+    head = []
+    if dims is None:
+        head.append(normalize_filter(config))
+        dims = (ow, oh)
+    elif "fps" in ops:
+        # 先统一帧率，scale 里的 n 才是输出帧号
+        head.append(f"fps={config.fps}")
+
+    sw, sh = dims
+    if sw / sh >= ow / oh:
+        cw, ch = int(round(sh * ow / oh / 2)) * 2, sh
+    else:
+        cw, ch = sw, int(round(sw * oh / ow / 2)) * 2
+    x0, y0 = (sw - cw) // 2, (sh - ch) // 2
+
+    # 爬升段：cover 裁切 + 逐帧 scale + 按 zoom 裁切
+    z = f"min(1+{ZOOM_RATE}*(n+{start_frame + 1}),{ZOOM_MAX})"
+    w = f"2*trunc({ow}*{z}/2)"
+    ramp = [f"crop={cw}:{ch}:{x0}:{y0}"] if (cw, ch) != (sw, sh) else []
+    ramp.append(f"scale=w='{w}':h='2*trunc({oh}*{z}/2)':eval=frame")
+    ramp.append(f"crop={ow}:{oh}:x='({w}-{ow})/2':y=0,setsar=1")
+
+    # 封顶段：一次固定 crop (cover 区域内的 1/zoom 窗口，水平居中、顶边对齐) + 固定 scale
+    zw, zh = int(round(cw / ZOOM_MAX / 2)) * 2, int(round(ch / ZOOM_MAX / 2)) * 2
+    steady = [f"crop={zw}:{zh}:{x0 + (cw - zw) // 2}:{y0}", f"scale={ow}:{oh}", "setsar=1"]
+
+    ramp_n = max(0, ZOOM_RAMP_FRAMES - start_frame)
+    if ramp_n == 0:
+        body = ",".join(steady)
+    elif n_frames is not None and ramp_n >= n_frames:
+        body = ",".join(ramp)
+    else:
+        body = (
+            f"split[{tag}a][{tag}b];"
+            f"[{tag}a]trim=end_frame={ramp_n},setpts=PTS-STARTPTS,{','.join(ramp)}[{tag}c];"
+            f"[{tag}b]trim=start_frame={ramp_n},setpts=PTS-STARTPTS,{','.join(steady)}[{tag}d];"
+            f"[{tag}c][{tag}d]concat=n=2:v=1:a=0"
+        )
+    # 两段各自 setsar=1 (crop 到非整比例后 SAR 会变)，concat 要求两路一致
+    return ",".join(head + [body])
+
+
+def graph_input_filters(videos: List[str], starts: List[int], frames: List[int], config: Config) -> List[str]:
+    """
+    build_video_graph 的每输入 filter：scale_crop 推镜头时在这里完成放大，否则只做需要的归一化。
+    starts / frames: 每个输入在时间线上的起始帧和使用帧数 (plan_starts)。
+    """
+    zoom = config.enable_zoompan and config.motion_engine == "scale_crop"
+    infos = {}
+    filters = []
+    for i, (v, start) in enumerate(zip(videos, starts)):
+        if v not in infos:
+            infos[v] = get_media_index(config).get(v)
+        ops = source_ops(infos[v], config)
+        if zoom:
+            n = frames[i] if frames else None
+            filters.append(zoom_input_filter(ops, source_dims(infos[v]), start, n, f"z{i}", config))
+        else:
+            filters.append(input_filter(ops, config))
+    return filters
+
+
+def plan_starts(plan: List[dict], n_inputs: int) -> Tuple[List[int], List[int]]:
+    """每个输入在时间线上的 (起始帧, 使用帧数)；被 -t 截掉的输入取时间线末尾、0 帧"""
+    end = plan[-1]["start"] + plan[-1]["frames"] if plan else 0
+    starts, frames = [end] * n_inputs, [0] * n_inputs
+    for p in plan:
+        starts[p["index"]] = p["start"]
+        frames[p["index"]] = p["frames"]
+    return starts, frames
+
+
+def build_video_graph(n_inputs: int, config: Config, input_filters: List[str], t_offset: float = 0.0, frame_offset: int = 0, ass_path: str = None) -> Tuple[str, str]:
+    """
+    构造视频 filter_complex，返回 (filter_complex, final_label)。
+    input_filters: 每个输入的 filter (graph_input_filters 的结果；scale_crop 推镜头已包含在内)。
+    t_offset / frame_offset: 分段渲染时本段在整条时间线上的起点，
+    保证 zoompan 与钩子文案在段与段之间连续。
+    ass_path: 不为空时直接在同一个 graph 里烧录字幕 (融合渲染)。
     """
-    
-    # 1. 构造 Filter Complex 链
-    # 对每个输入进行 scale+crop 归一化
-    # 然后 concat
-    
-    inputs = []
     filter_parts = []
     
-    for i, v in enumerate(in_videos):
-        inputs.extend(["-i", v])
-        # scale+crop logic for each input
+    for i in range(n_inputs):
         # 注意：[0:v] 引用第0个输入
-        # filter: [0:v]scale=...[v0]
-        
-        # Scale logic: cover the target aspect ratio
-        # if (iw/ih > out_w/out_h) -> scale height to out_h, width auto (-2)
-        # else -> scale width to out_w, height auto (-2)
-        # Then crop to out_w:out_h
-        
-        target_ar = config.out_w / config.out_h
-        
-        filter_scale_crop = (
-            f"[{i}:v]"
-            f"scale=if(gte(iw/ih\,{target_ar})\,-2\,{config.out_w}):"
-            f"if(gte(iw/ih\,{target_ar})\,{config.out_h}\,-2),"
-            f"crop={config.out_w}:{config.out_h}[v{i}];"
-        )
-        filter_parts.append(filter_scale_crop)
+        filter_parts.append(f"[{i}:v]{input_filters[i]}[v{i}];")
     
     # Concat part: [v0][v1]...concat=n=N:v=1:a=0[v_concat]
-    concat_inputs = "".join([f"[v{i}]" for i in range(len(in_videos))])
-    filter_parts.append(f"{concat_inputs}concat=n={len(in_videos)}:v=1:a=0[v_concat];")
+    concat_inputs = "".join([f"[v{i}]" for i in range(n_inputs)])
+    filter_parts.append(f"{concat_inputs}concat=n={n_inputs}:v=1:a=0[v_concat];")
     
     # 2. 动态效果 (Zoompan) on [v_concat]
     zoompan_in = "[v_concat]"
     
-    if config.enable_zoompan:
-        z_expr = "min(zoom+0.0005,1.1)" 
-        y_expr = "ih/2-(ih/zoom/2) - (ih*0.05)"
-        x_expr = "iw/2-(iw/zoom/2)"
-        
-        filter_parts.append(
-            f"{zoompan_in}zoompan=z='{z_expr}':d=1:"
-            f"x='{x_expr}':y='{y_expr}':s={config.out_w}x{config.out_h}:fps={config.fps}[v_zoom];"
-        )
+    if config.enable_zoompan and config.motion_engine == "zoompan":
+        filter_parts.append(f"{zoompan_in}{motion_filter(config, frame_offset)}[v_zoom];")
         final_v = "[v_zoom]"
     else:
         final_v = zoompan_in
 
     # 3. 钩子文案 (Drawtext)
-    if config.hook_text:
+    if config.hook_text and t_offset < 2.5:
         txt = config.hook_text
         # Adjust Y position for horizontal? 
         # For vertical (1280h), y=150 is good (top area).
@@ -430,68 +1017,458 @@ def make_clip(in_videos: List[str], out_video: str, config: Config) -> None:
             f"{final_v}drawtext=font='Microsoft YaHei':text='{txt}':"
             "fontcolor=yellow:fontsize=60:borderw=3:bordercolor=black:"
             "x=(w-text_w)/2:y=150:"
-            "enable='between(t,0,2.5)'[v_final]"
+            f"enable='between(t+{t_offset},0,2.5)'[v_final]"
         )
-        filter_parts.append(dt)
+        filter_parts.append(dt + ";")
         final_v = "[v_final]"
+
+    # 4. 烧录字幕 (ASS)，分段时先把时间戳平移到整条时间线上再渲染
+    if ass_path:
+        if t_offset > 0:
+            sub = f"setpts=PTS-STARTPTS+{t_offset}/TB,{ass_filter(ass_path)},setpts=PTS-STARTPTS"
+        else:
+            sub = ass_filter(ass_path)
+        filter_parts.append(f"{final_v}{sub}[v_sub];")
+        final_v = "[v_sub]"
     
     # 组合整个 complex filter
-    filter_complex = "".join(filter_parts)
-    
-    vf_chain = filter_complex
+    return "".join(filter_parts).rstrip(";"), final_v
+
+
+def ffprobe_frames(video_path: str, config: Config) -> int:
+    """输出帧率下的帧数 (proxy 的 mp4 头里有 nb_frames，无需解码)；帧率不同或拿不到时按时长估算"""
+    info = get_media_index(config).get(video_path)
+    if info and info["nb_frames"] and info["fps"] and abs(info["fps"] - config.fps) < 0.01:
+        return info["nb_frames"]
+    return int(round(ffprobe_duration(video_path, config) * config.fps))
+
+
+def trim_timeline(frames: List[int], total_frames: int) -> List[Tuple[int, int]]:
+    """
+    [(输入序号, 使用帧数), ...]：超出 total_frames 的素材被丢弃，
+    最后一个素材按剩余帧数截断 (等价于单次渲染的 -t)。
+    """
+    used = []
+    remaining = total_frames
+    for i, f in enumerate(frames):
+        if remaining <= 0:
+            break
+        take = min(f, remaining)
+        if take > 0:
+            used.append((i, take))
+            remaining -= take
+    return used
+
+
+def plan_segments(frames: List[int], total_frames: int, n_segments: int) -> List[List[Tuple[int, int]]]:
+    """
+    按素材边界把时间线切成 n_segments 段，每段帧数尽量均衡。
+    返回每段的 [(输入序号, 使用帧数), ...] (见 trim_timeline)。
+    """
+    used = trim_timeline(frames, total_frames)
+
+    n_segments = max(1, min(n_segments, len(used)))
+    budget = sum(f for _, f in used)
+    segments = []
+    cur = []
+    acc = 0
+    for idx, (i, f) in enumerate(used):
+        cur.append((i, f))
+        acc += f
+        left_items = len(used) - idx - 1
+        left_segs = n_segments - len(segments) - 1
+        # 累计到下一个等分点就切一刀 (还要保证剩下的素材够分给剩下的段)
+        if left_segs > 0 and (acc >= budget * (len(segments) + 1) / n_segments or left_items == left_segs):
+            segments.append(cur)
+            cur = []
+    if cur:
+        segments.append(cur)
+    return segments
+
+
+def input_args(videos: List[str], durations: List[float] = None) -> List[str]:
+    """-i 参数；durations 不为空时每个输入只解码需要的那一段 (-t 作用在输入上)"""
+    args = []
+    for i, v in enumerate(videos):
+        if durations:
+            args.extend(["-t", f"{durations[i]:.6f}"])
+        args.extend(["-i", v])
+    return args
+
+
+# 超过这个长度的 filter graph 写进脚本文件，不再放在命令行上
+FILTER_SCRIPT_MIN_CHARS = 2000
+
+
+def filter_complex_args(graph: str, script_path: str, config: Config) -> List[str]:
+    """
+    -filter_complex 参数。graph 很长时 (几十上百个输入) 写进 script_path，
+    用 -/filter_complex (ffmpeg 7+) 或 -filter_complex_script 读取，避免命令行超长 (Windows 上限 32K 字符)。
+    调用方负责在 ffmpeg 结束后删除 script_path。
+    """
+    if len(graph) < FILTER_SCRIPT_MIN_CHARS:
+        return ["-filter_complex", graph]
+    with open(script_path, "w", encoding="utf-8") as f:
+        f.write(graph)
+    flag = "-/filter_complex" if ffmpeg_major(config.ffmpeg, config) >= 7 else "-filter_complex_script"
+    return [flag, script_path]
 
+
+def run_with_script(cmd: List[str], script_path: str, config: Config, label: str, total_sec: float = None) -> None:
+    try:
+        run(cmd, config, label, total_sec)
+    finally:
+        if os.path.exists(script_path):
+            os.remove(script_path)
+
+
+def encode_video(inputs: List[str], filter_complex: str, final_v: str, out_video: str, config: Config, limit: List[str], threads: int = 0, durations: List[float] = None) -> None:
+    script = out_video + ".graph.txt"
     cmd = [config.ffmpeg, "-y"]
-    
-    cmd.extend(inputs)
+    cmd.extend(input_args(inputs, durations))
+    cmd.extend(limit)
+    cmd.extend(filter_complex_args(filter_complex, script, config))
     cmd.extend([
-        "-t", str(config.duration_sec),
-        "-filter_complex", vf_chain,
         "-map", final_v, # Map the final output pad
-        "-an", 
-        "-c:v", "libx264",
-        "-pix_fmt", "yuv420p",
-        "-preset", "veryfast",
-        "-crf", "18", 
-        out_video
+        "-an",
+        *x264_args(config),  # 含 -r：setpts 之后帧率信息会丢失，显式指定 CFR
     ])
+    if threads:
+        cmd.extend(["-threads", str(threads)])
+    cmd.append(out_video)
+    if limit[:1] == ["-frames:v"]:
+        total = int(limit[1]) / config.fps
+    else:
+        total = float(limit[1]) if limit[:1] == ["-t"] else None
+    run_with_script(cmd, script, config, os.path.splitext(os.path.basename(out_video))[0], total)
+
+
+def conform_parts(parts: List[str], out_video: str, config: Config) -> Tuple[List[str], List[str]]:
+    """
+    concat 之前逐段核对 STREAM_SIGNATURE：和我们的编码参数不完全一致的段先按 x264_args 重编码。
+    返回 (拼接用的段列表, 需要删掉的临时文件)。
+    """
+    index = get_media_index(config)
+    with ThreadPoolExecutor(max_workers=max(1, config.probe_workers)) as pool:
+        infos = list(pool.map(lambda p: index.get(p, store=False), parts))
+    out, temps = [], []
+    for k, (p, info) in enumerate(zip(parts, infos)):
+        if stream_copy_ok(info, [], config):
+            out.append(p)
+            continue
+        fixed = f"{out_video}.conform_{k:04d}.mp4"
+        print(f"[Plan] concat part {os.path.basename(p)}: encoder parameters differ, re-encoding")
+        run([config.ffmpeg, "-y", "-i", p, "-map", "0:v:0", "-an", "-vf", "setsar=1"] + x264_args(config) + [fixed],
+            config, "conform", (info or {}).get("duration") or None)
+        out.append(fixed)
+        temps.append(fixed)
+    return out, temps
+
+
+def concat_copy(parts: List[str], out_video: str, config: Config) -> None:
+    """concat demuxer + -c copy 无损拼接 (参数不一致的段先重编码，见 conform_parts)"""
+    parts, temps = conform_parts(parts, out_video, config)
+    list_path = out_video + ".concat.txt"
+    try:
+        with open(list_path, "w", encoding="utf-8") as f:
+            for p in parts:
+                f.write("file '{}'\n".format(os.path.abspath(p).replace("'", "'\\''")))
+        run([
+            config.ffmpeg, "-y",
+            "-f", "concat", "-safe", "0",
+            "-i", list_path,
+            "-map", "0:v:0",
+            "-an",
+            "-c", "copy",
+            out_video
+        ], config, "concat")
+    finally:
+        for p in temps + [list_path]:
+            try: os.remove(p)
+            except OSError: pass
+
+
+def plan_clip(in_videos: List[str], config: Config, durations: List[float] = None, ass_path: str = None) -> List[dict]:
+    """
+    【按素材选最便宜的路径】时间线上的每一段：
+    - copy:   不需要 zoompan/钩子文案/字幕，整段使用，素材已是目标尺寸/帧率，且编码参数与 x264_args 的输出完全一致 -> 直接 -c copy
+    - encode: 其余情况；ops 只包含真正需要的 scale / crop / fps
+    why 记录必须重编码的原因，用于打印计划。
+    """
+    if durations:
+        frames = [int(round(d * config.fps)) for d in durations]
+    else:
+        frames = [ffprobe_frames(v, config) for v in in_videos]
+    timeline = trim_timeline(frames, int(round(config.duration_sec * config.fps)))
+
+    plan = []
+    start = 0
+    for i, take in timeline:
+        v = in_videos[i]
+        info = get_media_index(config).get(v)
+        ops = source_ops(info, config)
+        why = []
+        if config.enable_zoompan:
+            why.append("zoompan")
+        if config.hook_text and start < 2.5 * config.fps:
+            why.append("hook")
+        if ass_path:
+            why.append("subs")
+        if take < ffprobe_frames(v, config):
+            why.append("trim")
+        if ops:
+            why.append("normalize")
+        elif not stream_copy_ok(info, ops, config):
+            why.append("codec")
+        plan.append({"index": i, "src": v, "start": start, "frames": take, "ops": ops,
+                     "mode": "encode" if why else "copy", "why": why})
+        start += take
+    return plan
+
+
+def format_plan(plan: List[dict], config: Config, labels: List[str] = None) -> str:
+    """labels: 原始素材路径 (输入已换成 proxy 时用来显示素材名)"""
+    lines = [f"[Plan] {len(plan)} segments ({sum(p['mode'] == 'copy' for p in plan)} stream copy):"]
+    for p in plan:
+        name = os.path.basename(labels[p["index"]] if labels else p["src"])
+        lines.append(
+            f"  #{p['index']:<3} {name[:32]:<32} "
+            f"{p['start'] / config.fps:7.2f}s +{p['frames'] / config.fps:6.2f}s  {p['mode']:<6} "
+            f"ops={'+'.join(p['ops']) or '-'}  why={','.join(p['why']) or '-'}"
+        )
+    return "\n".join(lines)
+
+
+def use_demuxer(config: Config, n_inputs: int) -> bool:
+    """clip_mode="auto" 时输入超过 graph_max_inputs 个就改走 concat demuxer"""
+    if config.clip_mode == "auto":
+        return n_inputs > config.graph_max_inputs
+    return config.clip_mode == "demuxer"
+
+
+def make_clip_hybrid(plan: List[dict], out_video: str, config: Config, ass_path: str = None, per_input: bool = False) -> None:
+    """
+    可以 copy 的段直接拿素材文件，连续的 encode 段合并成一次编码 (zoompan/钩子/字幕按时间线偏移保持连续)，
+    最后 concat demuxer + -c copy 拼接。
+    per_input=True (clip_mode="demuxer")：每个 encode 段单独一次编码，按顺序执行
+    (render_segments > 1 时 render_workers 个并行)，同时打开的解码器数量与素材数量无关。
+    """
+    runs = []
+    for p in plan:
+        if runs and runs[-1][0]["mode"] == p["mode"] and not (per_input and p["mode"] == "encode"):
+            runs[-1].append(p)
+        else:
+            runs.append([p])
+
+    seg_dir = os.path.join(os.path.dirname(out_video) or ".", "segments")
+    ensure_dir(seg_dir)
+    parts, jobs = [], []
+    for k, seg in enumerate(runs):
+        if seg[0]["mode"] == "copy":
+            parts.extend(p["src"] for p in seg)
+            continue
+        start = seg[0]["start"]
+        n_frames = sum(p["frames"] for p in seg)
+        filter_complex, final_v = build_video_graph(
+            len(seg), config, graph_input_filters([p["src"] for p in seg], [p["start"] for p in seg], [p["frames"] for p in seg], config),
+            t_offset=start / config.fps, frame_offset=start, ass_path=ass_path
+        )
+        part = os.path.join(seg_dir, f"part_{k:04d}.mp4")
+        jobs.append(([p["src"] for p in seg], filter_complex, final_v, part,
+                     ["-frames:v", str(n_frames)], [p["frames"] / config.fps for p in seg]))
+        parts.append(part)
+
+    workers = max(1, min(config.render_workers, len(jobs))) if config.render_segments > 1 else 1
+    threads = max(1, (os.cpu_count() or 1) // workers) if workers > 1 else 0
+    if per_input:
+        print(f"Demuxer render: {len(jobs)} encoded parts, {len(parts) - len(jobs)} copied, {workers} workers.")
+    try:
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(encode_video, i, fc, fv, o, config, lim, threads, d) for (i, fc, fv, o, lim, d) in jobs]
+                for fut in futures:
+                    fut.result()
+        else:
+            for (i, fc, fv, o, lim, d) in jobs:
+                encode_video(i, fc, fv, o, config, lim, durations=d)
+        concat_copy(parts, out_video, config)
+    finally:
+        for j in jobs:
+            try: os.remove(j[3])
+            except OSError: pass
+
+
+def make_clip(in_videos: List[str], out_video: str, config: Config, ass_path: str = None, durations: List[float] = None) -> None:
+    """
+    【画面优化】
+    1. 随机拼接多个视频
+    2. 缩放+裁切到 config.out_w x config.out_h (启用 proxy 缓存时直接复用已归一化的素材)
+    3. FPS=config.fps
+    4. Zoompan 动态效果
+    5. Drawtext 钩子文案
+    render_segments > 1 时按素材边界分段并行编码，再 concat 拼接。
+    输入很多 (见 use_demuxer) 时每段素材单独编码再用 concat demuxer 拼接，不再把所有输入放进一个 graph。
+    每段按 plan_clip 的计划走最便宜的路径：能 stream copy 的段不重编码 (make_clip_hybrid)，
+    其余段只做需要的 scale/crop/fps。
+    ass_path 不为空时同时烧录字幕。
+    durations 不为空时每个输入只用前 durations[i] 秒 (按配音时长选片的结果)。
+    """
     
-    run(cmd)
+    labels = in_videos
+    if config.use_proxy_cache:
+        in_videos = resolve_proxies(in_videos, config)
 
-def make_clip_wrapper(videos: List[str], out_video: str, config: Config):
+    plan = plan_clip(in_videos, config, durations, ass_path)
+    print(format_plan(plan, config, labels))
+
+    if use_demuxer(config, len(in_videos)):
+        make_clip_hybrid(plan, out_video, config, ass_path=ass_path, per_input=True)
+        return
+
+    input_filters = graph_input_filters(in_videos, *plan_starts(plan, len(in_videos)), config)
+
+    if config.render_segments > 1:
+        make_clip_segmented(in_videos, out_video, config, input_filters, ass_path=ass_path, durations=durations)
+        return
+
+    if any(p["mode"] == "copy" for p in plan):
+        make_clip_hybrid(plan, out_video, config)
+        return
+
+    # 1. 构造 Filter Complex 链
+    # 对每个输入按计划做归一化 (只做需要的步骤)
+    # 然后 concat
+    filter_complex, final_v = build_video_graph(len(in_videos), config, input_filters, ass_path=ass_path)
+    encode_video(in_videos, filter_complex, final_v, out_video, config, ["-t", output_limit(config, durations)], durations=durations)
+
+
+def make_clip_segmented(in_videos: List[str], out_video: str, config: Config, input_filters: List[str], ass_path: str = None, durations: List[float] = None) -> None:
+    """
+    分段并行渲染：
+    1. 按素材边界切成 N 段 (帧数精确，总长与单次渲染的 -t 一致)
+    2. 每段一个 ffmpeg 进程，并行编码
+    3. concat demuxer + -c copy 拼接
+    """
+    if durations:
+        frames = [int(round(d * config.fps)) for d in durations]
+    else:
+        frames = [ffprobe_frames(v, config) for v in in_videos]
+    total_frames = int(round(config.duration_sec * config.fps))
+    segments = plan_segments(frames, total_frames, config.render_segments)
+    workers = max(1, min(config.render_workers, len(segments)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Segmented render: {len(segments)} segments, {workers} workers, {threads} threads each.")
+
+    seg_dir = os.path.join(os.path.dirname(out_video) or ".", "segments")
+    ensure_dir(seg_dir)
+
+    jobs = []
+    frame_offset = 0
+    for k, seg in enumerate(segments):
+        seg_inputs = [in_videos[i] for i, _ in seg]
+        seg_filters = [input_filters[i] for i, _ in seg]
+        seg_durations = [durations[i] for i, _ in seg] if durations else None
+        seg_frames = sum(f for _, f in seg)
+        filter_complex, final_v = build_video_graph(
+            len(seg_inputs), config, seg_filters,
+            t_offset=frame_offset / config.fps, frame_offset=frame_offset, ass_path=ass_path
+        )
+        seg_out = os.path.join(seg_dir, f"seg_{k:03d}.mp4")
+        jobs.append((seg_inputs, filter_complex, final_v, seg_out, ["-frames:v", str(seg_frames)], seg_durations))
+        frame_offset += seg_frames
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(encode_video, i, fc, fv, o, config, lim, threads, d) for (i, fc, fv, o, lim, d) in jobs]
+        for fut in futures:
+            fut.result()
+
+    concat_copy([j[3] for j in jobs], out_video, config)
+    for j in jobs:
+        try: os.remove(j[3])
+        except OSError: pass
+
+def expand_clip_list(videos: List[str], limit: int = 20) -> List[str]:
     # Ensure we have enough clips for duration
     # Simple heuristic: repeat the list 5 times
     long_list = videos * 5
     # Limit to reasonable number to avoid huge command line (e.g. max 20 clips)
-    if len(long_list) > 20:
-        long_list = long_list[:20]
-        
-    make_clip(long_list, out_video, config)
+    # limit=None: concat demuxer 模式每段单独编码，不需要上限
+    if limit and len(long_list) > limit:
+        long_list = long_list[:limit]
+    return long_list
 
 
-def mux_with_voice_bgm_and_subtitles(vertical_video: str, voice_wav: str, ass_path: str, out_mp4: str, config: Config) -> None:
+def select_clips(videos: List[str], target_sec: float, config: Config) -> Tuple[List[str], List[float]]:
+    """
+    【按配音时长选片】
+    按 (已打乱的) 顺序循环取素材，累计时长刚好覆盖 target_sec，最后一段截断。
+    以帧为单位计算，避免浮点误差累积；返回 (素材列表, 每段使用秒数)。
+    """
+    frame_len = {}
+    for v in videos:
+        if v not in frame_len:
+            frame_len[v] = int(ffprobe_duration(v, config) * config.fps)
+    usable = [v for v in videos if frame_len[v] > 0]
+    if not usable:
+        print("Warning: Could not probe any source duration, fallback to fixed clip list.")
+        return expand_clip_list(videos, clip_limit(config)), None
+
+    remaining = int(round(target_sec * config.fps))
+    picked, used = [], []
+    i = 0
+    while remaining > 0:
+        v = usable[i % len(usable)]
+        take = min(frame_len[v], remaining)
+        picked.append(v)
+        used.append(take / config.fps)
+        remaining -= take
+        i += 1
+    print(f"Clip budget: {target_sec:.2f}s -> {len(picked)} segments.")
+    return picked, used
+
+
+def clip_limit(config: Config) -> int:
+    """固定素材列表的上限：只有单个 filter graph 时才需要"""
+    return None if config.clip_mode == "demuxer" else config.graph_max_inputs
+
+
+def plan_clips(videos: List[str], config: Config, target_sec: float = None) -> Tuple[List[str], List[float]]:
+    if config.budget_by_voice and target_sec:
+        return select_clips(videos, min(target_sec, config.duration_sec), config)
+    return expand_clip_list(videos, clip_limit(config)), None
+
+
+def output_limit(config: Config, durations: List[float] = None) -> str:
+    """输出 -t：有选片预算时就是预算总长，否则沿用 duration_sec"""
+    if durations:
+        return f"{sum(durations):.6f}"
+    return str(config.duration_sec)
+
+
+def make_clip_wrapper(videos: List[str], out_video: str, config: Config, ass_path: str = None, target_sec: float = None):
+    clips, durations = plan_clips(videos, config, target_sec)
+    make_clip(clips, out_video, config, ass_path, durations)
+
+
+def audio_mix_filter(voice_idx: int, bgm_idx: int) -> str:
     """
     【声音优化】
     1. 侧链压缩 (Ducking): Voice 出现时压低 BGM
     2. 响度标准化 (Loudnorm): 目标 -14 LUFS (适合短视频)
     3. 确保 Voice 响度足够
     """
-    
-    # 转义路径供 filter 使用
-    ass_path_esc = ass_path.replace("\\", "/").replace(":", "\\:")
-
     # 滤镜链设计：
-    # [1:a] (Voice) -> pre-amp -> [voice_clean] -> split -> [voice_ctrl][voice_out]
-    # [2:a] (BGM) -> volume down -> [bgm_in]
+    # [voice:a] -> pre-amp -> [voice_clean] -> split -> [voice_ctrl][voice_out]
+    # [bgm:a] -> volume down -> [bgm_in]
     # [bgm_in][voice_ctrl] sidechaincompress -> [bgm_ducked]
     # [bgm_ducked][voice_out] amix -> [mix_raw]
     # [mix_raw] loudnorm -> [aout]
-    
-    af = (
+    return (
         # 1. Voice 处理：稍微放大确保清晰，转 48k
-        "[1:a]volume=1.5,aresample=48000,asplit[voice_ctrl][voice_out];"
+        f"[{voice_idx}:a]volume=1.5,aresample=48000,asplit[voice_ctrl][voice_out];"
         
         # 2. BGM 处理：默认 0.2 倍音量，避免抢戏
-        "[2:a]volume=0.2,aresample=48000[bgm_in];"
+        f"[{bgm_idx}:a]volume=0.2,aresample=48000[bgm_in];"
         
         # 3. Ducking: 阈值 0.1, 压缩比 10, 快速触发(5ms) 慢恢复(200ms)
         "[bgm_in][voice_ctrl]sidechaincompress=threshold=0.05:ratio=10:attack=5:release=200[bgm_ducked];"
@@ -504,7 +1481,15 @@ def mux_with_voice_bgm_and_subtitles(vertical_video: str, voice_wav: str, ass_pa
         "[mix_raw]loudnorm=I=-14:TP=-1.0:LRA=7[aout]"
     )
 
-    run([
+
+def mux_with_voice_bgm_and_subtitles(vertical_video: str, voice_wav: str, ass_path: str, out_mp4: str, config: Config) -> None:
+    """
+    混音 + 烧录字幕。
+    ass_path 为 None 时说明字幕已经在视频里，视频流直接 copy，不再重编码。
+    """
+    af = audio_mix_filter(1, 2)
+
+    cmd = [
         config.ffmpeg, "-y",
         "-i", vertical_video,
         "-i", voice_wav,
@@ -512,26 +1497,488 @@ def mux_with_voice_bgm_and_subtitles(vertical_video: str, voice_wav: str, ass_pa
         "-filter_complex", af,
         "-map", "0:v:0",
         "-map", "[aout]",
-        # 烧录字幕
-        "-vf", f"ass='{ass_path_esc}'",
+    ]
+    if ass_path:
+        cmd.extend([
+            # 烧录字幕
+            "-vf", ass_filter(ass_path),
+            
+            "-c:v", "libx264",
+            "-preset", "veryfast",
+            "-crf", "20",
+        ])
+    else:
+        cmd.extend(["-c:v", "copy"])
+    cmd.extend([
+        "-c:a", "aac",
+        "-b:a", "256k", # 提高音频码率
+        
+        "-shortest",
+        out_mp4
+    ])
+    run(cmd, config, "mux", wav_duration(voice_wav) or None)
+    
+    # 【自检】
+    check_audio_streams(out_mp4, config)
+
+
+def render_fused(videos: List[str], voice_wav: str, ass_path: str, out_mp4: str, config: Config, target_sec: float = None) -> None:
+    """
+    【融合渲染】只编码一次：
+    scale/crop/concat/zoompan/drawtext/ass + 人声/BGM 混音 放在同一个 filter graph 里，
+    省掉 clip.mp4 中间文件和一整遍 x264 编码/解码。
+    分段渲染 / concat demuxer 模式下，各段直接烧录字幕，最后只 copy 视频流 + 编码音频。
+    """
+    long_list, durations = plan_clips(videos, config, target_sec)
+    if config.render_segments > 1 or use_demuxer(config, len(long_list)):
+        out_clip = os.path.join(config.work_dir, "clip.mp4")
+        make_clip(long_list, out_clip, config, ass_path, durations)
+        mux_with_voice_bgm_and_subtitles(out_clip, voice_wav, None, out_mp4, config)
+        return
+
+    labels = long_list
+    if config.use_proxy_cache:
+        long_list = resolve_proxies(long_list, config)
+
+    plan = plan_clip(long_list, config, durations, ass_path)
+    print(format_plan(plan, config, labels))
+    n = len(long_list)
+    input_filters = graph_input_filters(long_list, *plan_starts(plan, n), config)
+    vf, final_v = build_video_graph(n, config, input_filters, ass_path=ass_path)
+    af = audio_mix_filter(n, n + 1)
+
+    script = out_mp4 + ".graph.txt"
+    cmd = [config.ffmpeg, "-y"]
+    cmd.extend(input_args(long_list, durations))
+    cmd.extend([
+        "-i", voice_wav,
+        "-i", config.bgm_path,
+        "-t", output_limit(config, durations),
+    ])
+    cmd.extend(filter_complex_args(vf + ";" + af, script, config))
+    cmd.extend([
+        "-map", final_v,
+        "-map", "[aout]",
         
         "-c:v", "libx264",
+        "-pix_fmt", "yuv420p",
         "-preset", "veryfast",
-        "-crf", "20",
+        "-crf", "18",
         
         "-c:a", "aac",
-        "-b:a", "256k", # 提高音频码率
+        "-b:a", "256k",
         
         "-shortest",
         out_mp4
     ])
+    run_with_script(cmd, script, config, "render", float(output_limit(config, durations)))
     
     # 【自检】
     check_audio_streams(out_mp4, config)
 
 
-def main():
+def estimate_voice_sec(sentences: List[str], config: Config) -> float:
+    """TTS 返回前的配音时长粗估 (与 fallback 同一口径：每字 0.25s + 句间停顿)，只用于预热素材"""
+    return sum(len(s) * 0.25 + 0.5 + 0.15 for s in sentences) or 1.0
+
+
+def prewarm_proxies(videos: List[str], sentences: List[str], config: Config) -> None:
+    """
+    与 TTS 并行：按预估时长 (+20% 余量) 提前把会用到的素材归一化进 proxy 缓存。
+    真正渲染时按实际配音时长选片，顺序相同，所以选中的素材基本都已命中缓存。
+    """
+    if not config.use_proxy_cache:
+        return
+    long_list, _ = plan_clips(videos, config, estimate_voice_sec(sentences, config) * 1.2)
+    resolve_proxies(long_list, config)
+
+
+def planned_sources(videos: List[str], config: Config) -> list:
+    """
+    画面阶段实际会用到的素材：按选片顺序的 (路径, 大小, mtime_ns, 截取秒数)。
+    按配音选片时预算取 work_dir 里上次的 voice.wav；配音要重跑时画面阶段本来就跟着重跑，这里的值无所谓。
+    """
+    target_sec = None
+    voice_wav = os.path.join(config.work_dir, "voice.wav")
+    if config.budget_by_voice and os.path.exists(voice_wav):
+        target_sec = wav_duration(voice_wav)
+    clips, durations = plan_clips(videos, config, target_sec)
+    trims = durations or [None] * len(clips)
+    return [(file_fingerprint(v), round(t, 6) if t is not None else None) for v, t in zip(clips, trims)]
+
+
+def stage_digests(videos: List[str], sentences: List[str], keywords: List[str], out_final: str, config: Config) -> dict:
+    """各阶段的输入摘要。画面阶段按实际选中的素材、顺序和截取时长计入 (见 planned_sources)。"""
+    ffmpeg_ver = tool_version(config.ffmpeg, config)
+    try:
+        tpl = Path(config.ass_tpl_path).read_text(encoding="utf-8")
+    except OSError:
+        tpl = None
+    sources = planned_sources(videos, config)
+    bgm = file_fingerprint(config.bgm_path)
+    video_cfg = (config.out_w, config.out_h, config.fps, config.enable_zoompan, config.motion_engine, config.hook_text,
+                 config.duration_sec, config.budget_by_voice, config.use_proxy_cache, clip_limit(config))
+
+    d = {}
+    d["voice"] = StageCache.digest(
+        "voice", sentences, config.audio_speed, config.sr, config.use_manbo_tts,
+        config.use_zhipu_tts, config.zhipu_voice_id, ffmpeg_ver,
+    )
+    d["subs"] = StageCache.digest("subs", d["voice"], keywords, tpl, config.out_w, config.out_h)
+    d["clip"] = StageCache.digest(
+        "clip", d["voice"] if config.budget_by_voice else None, sources, video_cfg, ffmpeg_ver,
+    )
+    d["render"] = StageCache.digest("render", d["voice"], d["subs"], sources, bgm, video_cfg, ffmpeg_ver, out_final)
+    d["mux"] = StageCache.digest("mux", d["clip"], d["voice"], d["subs"], bgm, ffmpeg_ver, out_final)
+    return d
+
+
+def stages_to_run(digests: dict, deps: dict, cache: StageCache, config: Config) -> set:
+    """需要重跑的阶段：被强制、摘要变化/产物缺失，或者上游阶段要重跑"""
+    forced = set(config.force_stages)
+    if "all" in forced or not config.incremental:
+        forced |= set(STAGES)
+    if "mix" in forced:
+        forced |= {"render", "mux"}
+
+    rerun = set()
+    for name in deps:  # deps 按拓扑顺序给出
+        if name in forced or not cache.fresh(name, digests[name]) or rerun & set(deps[name]):
+            rerun.add(name)
+    return rerun
+
+
+workspaces = None
+workspaces_lock = threading.Lock()
+
+def get_workspaces(config: Config) -> WorkspaceManager:
+    global workspaces
+    with workspaces_lock:
+        if workspaces is None or workspaces.root != os.path.abspath(config.work_dir):
+            if workspaces is not None:
+                workspaces.stop_sweeper()
+            workspaces = WorkspaceManager(
+                config.work_dir,
+                tmpfs_root=config.work_tmpfs_dir,
+                tmpfs_min_free=config.work_tmpfs_min_free_mb * (1 << 20),
+                quota_bytes=int(config.work_quota_gb * (1 << 30)),
+                max_age_sec=config.work_max_age_hours * 3600,
+            )
+            workspaces.start_sweeper(config.work_sweep_interval_sec)
+        return workspaces
+
+
+def produce_job(videos: List[str], sentences: List[str], keywords: List[str], out_final: str, config: Config, job: str = None) -> dict:
+    """
+    在独立的工作目录里跑 produce_video：并发任务互不覆盖 voice.wav / clip.mp4 / sub.ass。
+    job 名默认取输出文件名，同名任务重跑会复用上次的目录 (增量缓存继续生效)；
+    成功后只删临时文件，stages.json 和各阶段产物 (voice.wav / sub.ass / clip.mp4 ...) 保留。
+    ffmpeg 进度和每次调用的吞吐量追加到 metrics_dir/<job>.jsonl。
+    """
+    ws = get_workspaces(config)
+    name = job or os.path.splitext(os.path.basename(out_final))[0]
+    work = ws.acquire(name)
+    print(f"[Workspace] {work}")
+    metrics = MetricsLog(os.path.join(config.metrics_dir, f"{os.path.basename(work)}.jsonl"), name, config.on_progress)
+    ok = False
+    try:
+        report = produce_video(videos, sentences, keywords, out_final, replace(config, work_dir=work, metrics=metrics))
+        ok = True
+        metrics.write({"type": "job", "ok": True, "total_sec": report["total_sec"],
+                       "critical_path": report["critical_path"], "skipped": report["skipped"]})
+        return report
+    except Exception as e:
+        metrics.write({"type": "job", "ok": False, "error": str(e)})
+        raise
+    finally:
+        ws.release(work, success=ok, keep=None if config.keep_work_on_success else stage_artifacts(work))
+
+
+def stage_artifacts(work: str) -> set:
+    """工作目录里需要跨次保留的文件名：增量缓存状态 + 它记录的、位于目录内的阶段产物"""
+    keep = {STAGE_STATE_FILE}
+    for path in StageCache(os.path.join(work, STAGE_STATE_FILE)).outputs():
+        if os.path.dirname(os.path.abspath(path)) == os.path.abspath(work):
+            keep.add(os.path.basename(path))
+    return keep
+
+
+def produce_video(videos: List[str], sentences: List[str], keywords: List[str], out_final: str, config: Config) -> dict:
+    """
+    main() 与 GUI 共用的生成流程。
+    各步骤交给 StageScheduler 按依赖并发执行：TTS (网络) 与素材预处理 (CPU) 同时进行，
+    依赖满足就立即开始下一步。返回每个阶段的耗时和关键路径。
+    输入摘要没变的阶段直接复用 work_dir 里的产物 (见 stage_digests / Config.force_stages)。
+    """
+    preflight_check(config)
+    ensure_dir(config.work_dir)
+
+    out_clip = os.path.join(config.work_dir, "clip.mp4")
+    out_ass = os.path.join(config.work_dir, "sub.ass")
+    voice_wav = os.path.join(config.work_dir, "voice.wav")
+    timings_json = os.path.join(config.work_dir, "timings.json")
+
+    if config.fused_render:
+        deps = {"voice": [], "subs": ["voice"], "render": ["voice", "subs"]}
+    else:
+        deps = {"voice": [], "subs": ["voice"],
+                "clip": ["voice"] if config.budget_by_voice else [],
+                "mux": ["clip", "voice", "subs"]}
+
+    cache = StageCache(os.path.join(config.work_dir, STAGE_STATE_FILE))
+    digests = stage_digests(videos, sentences, keywords, out_final, config)
+    rerun = stages_to_run(digests, deps, cache, config)
+    for name in deps:
+        if name not in rerun:
+            print(f"--- Stage {name}: up to date, reusing previous output ---")
+
+    # 每个阶段一个子 token (带 stage_timeouts 的超时)；任一阶段失败 / Ctrl+C 时取消本次运行，在途的 ffmpeg 立即停下
+    job_token = config.cancel.child("job") if config.cancel is not None else CancelToken("job")
+    limits = dict(config.stage_timeouts)
+
+    def guarded(name, fn):
+        return lambda r: fn(r, replace(config, cancel=job_token.child(name, limits.get(name))))
+
+    def voice(_, cfg):
+        if "voice" in rerun:
+            print("--- Stage voice: TTS Generation ---")
+            wav, timings, n_fallback = build_voice_and_timings(sentences, cfg.work_dir, cfg)
+            with open(timings_json, "w", encoding="utf-8") as f:
+                json.dump(timings, f, ensure_ascii=False)
+            # 有句子走了 fallback (beep) 时不记录，下次重试会重新请求 TTS
+            if not n_fallback:
+                cache.record("voice", digests["voice"], [wav, timings_json])
+            return wav, timings
+        with open(timings_json, "r", encoding="utf-8") as f:
+            return voice_wav, [tuple(t) for t in json.load(f)]
+
+    def proxies(_, cfg):
+        # 画面阶段不用重跑时也就不需要预热
+        if not rerun & {"clip", "render"}:
+            return
+        print("--- Stage proxies: Prewarm normalized sources ---")
+        prewarm_proxies(videos, sentences, cfg)
+
+    def subs(r, cfg):
+        if "subs" in rerun:
+            print("--- Stage subs: Subtitle Rendering ---")
+            matcher = compile_keywords(keywords)
+            timings = [(st, ed, highlight_keywords(text, matcher)) for st, ed, text in r["voice"][1]]
+            render_ass(timings, cfg.ass_tpl_path, out_ass, cfg)
+            cache.record("subs", digests["subs"], [out_ass])
+        return out_ass
+
+    sched = StageScheduler(max_workers=3, on_error=lambda e: job_token.cancel(f"{type(e).__name__}: {e}"))
+    sched.add("voice", guarded("voice", voice))
+    sched.add("proxies", guarded("proxies", proxies))
+    sched.add("subs", guarded("subs", subs), deps=["voice"])
+
+    if config.fused_render:
+        def render(r, cfg):
+            if "render" not in rerun:
+                return
+            print("--- Stage render: Fused Render (Video + Subtitles + Ducking + Loudnorm, single encode) ---")
+            wav = r["voice"][0]
+            render_fused(videos, wav, r["subs"], out_final, cfg, target_sec=wav_duration(wav))
+            cache.record("render", digests["render"], [out_final])
+
+        sched.add("render", guarded("render", render), deps=["voice", "subs", "proxies"])
+    else:
+        def clip(r, cfg):
+            if "clip" not in rerun:
+                return
+            print("--- Stage clip: Video Processing (Zoompan + 60fps) ---")
+            # 按配音选片时要等 TTS 出结果；不按配音时画面与 TTS 完全并行
+            target_sec = wav_duration(r["voice"][0]) if "voice" in r else None
+            make_clip_wrapper(videos, out_clip, cfg, target_sec=target_sec)
+            cache.record("clip", digests["clip"], [out_clip])
+
+        def mux(r, cfg):
+            if "mux" not in rerun:
+                return
+            print("--- Stage mux: Final Mixing (Ducking + Loudnorm) ---")
+            mux_with_voice_bgm_and_subtitles(out_clip, r["voice"][0], r["subs"], out_final, cfg)
+            cache.record("mux", digests["mux"], [out_final])
+
+        sched.add("clip", guarded("clip", clip), deps=["proxies"] + deps["clip"])
+        sched.add("mux", guarded("mux", mux), deps=deps["mux"])
+
+    sched.run()
+    print(sched.report())
+    path, total = sched.critical_path()
+    return {"timings": dict(sched.timings), "critical_path": path, "total_sec": total,
+            "skipped": [n for n in deps if n not in rerun]}
+
+
+FALLBACK_SCRIPT = "再也不怕出货带不出来了！3×3老板首选。现在特价998，速通！"
+FALLBACK_KEYWORDS = ["3×3", "998", "速通", "出货"]
+# Keywords for the new text
+DEFAULT_KEYWORDS = ["押金", "跑刀", "老板", "筛人机制", "风险"]
+
+
+def list_scripts(script_dir: str) -> List[str]:
+    """文案目录下的 .txt 文案 (关键词文件 keywords.txt / *.keywords.txt 除外)"""
+    if not os.path.isdir(script_dir):
+        return []
+    return sorted(p for p in glob.glob(os.path.join(script_dir, "*.txt")) if not is_keywords_file(p))
+
+
+def load_keywords(script_path: str) -> List[str]:
+    """文案旁边的关键词文件 (keywords.txt + <文案名>.keywords.txt) 合并去重；都没有时用 DEFAULT_KEYWORDS"""
+    words = set()
+    for path in keyword_files(script_path):
+        try:
+            words.update(read_keywords_file(path))
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Error reading keywords file {path}: {e}")
+    if not words:
+        return DEFAULT_KEYWORDS
+    print(f"Loaded {len(words)} keywords for {os.path.basename(script_path)}.")
+    return sorted(words)
+
+
+def load_script(script_path: str) -> List[str]:
+    """文案文件 -> 句子列表 (每行一句，去掉空行)；读不到时返回空列表"""
+    print(f"Loading script from {script_path}...")
+    try:
+        with open(script_path, "r", encoding="utf-8") as f:
+            # Filter empty lines and strip whitespace
+            lines = [line.strip() for line in f if line.strip()]
+        print(f"Loaded {len(lines)} lines of text.")
+        return lines
+    except Exception as e:
+        print(f"Error reading script file: {e}")
+        return []
+
+
+def resolve_script(script_path: str = None, script_text: str = None) -> Tuple[List[str], List[str], str]:
+    """
+    文案文本 (每行一句) 或文案文件 -> (句子, 关键词, hook 文本)。
+    文案文件的关键词取自旁边的关键词文件 (load_keywords)，文案文本用 DEFAULT_KEYWORDS。
+    hook 取文件名，文本或默认文案时为 None (沿用 config.hook_text)；两者都读不到时用默认文案。
+    """
+    if script_text:
+        sentences = [line.strip() for line in script_text.splitlines() if line.strip()]
+        if sentences:
+            return sentences, DEFAULT_KEYWORDS, None
+    if script_path:
+        sentences = load_script(script_path)
+        if sentences:
+            return sentences, load_keywords(script_path), os.path.splitext(os.path.basename(script_path))[0]
+    print("Using default fallback script.")
+    return split_sentences(FALLBACK_SCRIPT), FALLBACK_KEYWORDS, None
+
+
+def render_job(config: Config, out_final: str, script_path: str = None, script_text: str = None,
+               videos: List[str] = None, seed=None, job: str = None, keywords: List[str] = None) -> dict:
+    """
+    main() / GUI 队列 / 服务共用的一次完整生成：
+    videos 为空时取 in_video_dir 下全部素材，按 seed 打乱 (None = 每次随机)；读文案后交给 produce_job。
+    keywords 不为空时代替文案自带的关键词。
+    """
+    if not videos:
+        videos = list_videos(config.in_video_dir, config)
+        if not videos:
+            raise FileNotFoundError(f"No video files found in {config.in_video_dir}")
+        random.Random(seed).shuffle(videos)
+        print(f"Selected {len(videos)} videos.")
+    sentences, script_keywords, hook = resolve_script(script_path, script_text)
+    keywords = keywords or script_keywords
+    if hook:
+        config = replace(config, hook_text=hook)
+        print(f"Set Hook Text from filename: {hook}")
+    return produce_job(videos, sentences, keywords, out_final, config, job=job)
+
+
+def default_batch_jobs(config: Config) -> int:
+    """
+    批量并发数：每个任务的 x264 编码本身就吃多核，按 4 核一个任务估算。
+    用 Manbo TTS 时所有任务共用一个客户端 (get_tts_client)，合计最多 tts_max_in_flight 个请求在途、
+    tts_rps 个请求/秒：任务数再多，TTS 阶段也只是排队等同一份配额，
+    所以再按 “配额下能同时合成的任务数” 封顶 (每个任务一次发出 tts_max_in_flight 句)。
+    """
+    jobs = (os.cpu_count() or 1) // 4
+    if config.use_manbo_tts and config.tts_max_in_flight > 0:
+        jobs = min(jobs, config.tts_max_in_flight)
+    return max(1, jobs)
+
+
+def run_batch(config: Config, variants: int = 1, jobs: int = 0) -> List[dict]:
+    """
+    【批量生成】script_dir 下每个文案生成 variants 个版本 (素材顺序不同)，
+    输出到 batch_out_dir/<文案名>_v<N>.mp4，最多 jobs 个任务并发，每个任务走 render_job。
+    素材索引、proxy 缓存、TTS 缓存/客户端 (含限流器) 都是模块级共享的，任务之间不会重复做，TTS 合计不超配额。
+    每个任务有自己的工作目录 (produce_job)，失败的任务重跑时从中断的阶段继续。
+    """
+    scripts = list_scripts(config.script_dir)
+    if not scripts:
+        print(f"Error: No .txt scripts found in {config.script_dir}")
+        return []
+    if not list_videos(config.in_video_dir, config):
+        print(f"Error: No video files found in {config.in_video_dir}")
+        return []
+
+    jobs = jobs or config.batch_jobs or default_batch_jobs(config)
+    ensure_dir(config.batch_out_dir)
+
+    tasks = []
+    for script_path in scripts:
+        stem = os.path.splitext(os.path.basename(script_path))[0]
+        for k in range(1, variants + 1):
+            tasks.append((script_path, stem, k))
+    print(f"[Batch] {len(scripts)} scripts x {variants} variants = {len(tasks)} jobs, concurrency {jobs}")
+
+    def run_job(task) -> dict:
+        script_path, stem, k = task
+        name = f"{stem}_v{k}"
+        out_final = os.path.join(config.batch_out_dir, name + ".mp4")
+        result = {"job": name, "script": script_path, "variant": k, "output": out_final}
+        t0 = time.time()
+        try:
+            # 按 (文案, 版本号) 固定打乱顺序：同一版本重跑时选片一致，增量缓存能命中
+            report = render_job(config, out_final, script_path=script_path, seed=f"{stem}:{k}", job=name)
+            result.update(status="ok", critical_path=report["critical_path"], skipped=report["skipped"])
+        except Exception as e:
+            print(f"[Batch] {name} FAILED: {e}")
+            result.update(status="failed", error=f"{type(e).__name__}: {e}")
+        result["wall_sec"] = round(time.time() - t0, 2)
+        return result
+
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(run_job, tasks))
+    total = time.time() - t0
+
+    failed = [r for r in results if r["status"] != "ok"]
+    print("\n[Batch] Summary:")
+    for r in results:
+        extra = (r.get("error") or " -> ".join(r.get("critical_path", [])))[:120]
+        print(f"  {r['status']:<6} {r['wall_sec']:8.1f}s  {r['job']:<30} {extra}")
+    print(f"[Batch] {len(results) - len(failed)} ok, {len(failed)} failed, wall {total:.1f}s")
+
+    report_path = os.path.join(config.batch_out_dir, "batch_report.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"wall_sec": round(total, 2), "jobs": jobs, "results": results}, f, ensure_ascii=False, indent=2)
+    print(f"[Batch] Report written to {report_path}")
+    return results
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="JJ 短视频生成")
+    parser.add_argument(
+        "--force-stage", action="append", default=[], choices=FORCE_STAGE_CHOICES, metavar="STAGE",
+        help=f"忽略增量缓存强制重跑某阶段 (可重复): {', '.join(FORCE_STAGE_CHOICES)}",
+    )
+    parser.add_argument("--batch", action="store_true", help="批量模式：文案目录下每个文案各生成一个/多个视频")
+    parser.add_argument("--variants", type=int, default=1, help="批量模式下每个文案生成的版本数")
+    parser.add_argument("--jobs", type=int, default=0, help="批量模式并发任务数 (默认按 CPU 核数估算)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
     cfg = Config()
+    cfg.force_stages = tuple(args.force_stage)
     
     # 检查 Key
     if not cfg.zhipu_api_key and cfg.use_zhipu_tts:
@@ -541,15 +1988,16 @@ def main():
     ensure_dir("output")
     ensure_dir(cfg.work_dir)
 
-    out_clip = os.path.join(cfg.work_dir, "clip.mp4")
-    out_ass = os.path.join(cfg.work_dir, "sub.ass")
+    if args.batch:
+        results = run_batch(cfg, variants=max(1, args.variants), jobs=args.jobs)
+        if not results or any(r["status"] != "ok" for r in results):
+            sys.exit(1)
+        return
+
     out_final = "output/final.mp4"
 
     # Find video files
-    video_exts = ("*.mp4", "*.mov", "*.mkv")
-    all_videos = []
-    for ext in video_exts:
-        all_videos.extend(glob.glob(os.path.join(cfg.in_video_dir, ext)))
+    all_videos = list_videos(cfg.in_video_dir, cfg)
     
     if not all_videos:
         print(f"Error: No video files found in {cfg.in_video_dir}")
@@ -557,59 +2005,15 @@ def main():
 
     # Randomly select multiple videos to form a montage
     random.shuffle(all_videos)
-    # Just use all of them in random order (loop logic handles duration)
-    selected_videos = all_videos 
-    print(f"Selected {len(selected_videos)} videos for montage: {[os.path.basename(v) for v in selected_videos]}")
-
-    # Load script from script_dir (random text file)
-    script_path = None
-    
-    if os.path.isdir(cfg.script_dir):
-        txt_files = glob.glob(os.path.join(cfg.script_dir, "*.txt"))
-        if txt_files:
-            script_path = random.choice(txt_files)
-            print(f"Selected script file: {script_path}")
-            
-            # Use filename (without extension) as hook text
-            filename = os.path.splitext(os.path.basename(script_path))[0]
-            cfg.hook_text = filename
-            print(f"Set Hook Text from filename: {cfg.hook_text}")
-    
-    sentences = []
-    if script_path and os.path.exists(script_path):
-        print(f"Loading script from {script_path}...")
-        try:
-            with open(script_path, "r", encoding="utf-8") as f:
-                # Filter empty lines and strip whitespace
-                lines = [line.strip() for line in f if line.strip()]
-                
-            sentences = lines
-            print(f"Loaded {len(sentences)} lines of text.")
-        except Exception as e:
-            print(f"Error reading script file: {e}")
-            
-    # Fallback if file not found or empty
-    if not sentences:
-        print("Using default fallback script.")
-        script = "再也不怕出货带不出来了！3×3老板首选。现在特价998，速通！"
-        sentences = split_sentences(script)
-        keywords = ["3×3", "998", "速通", "出货"]
-    else:
-        # Keywords for the new text
-        keywords = ["押金", "跑刀", "老板", "筛人机制", "风险"]
-
-    print("--- Step 1: Video Processing (Zoompan + 60fps) ---")
-    make_clip_wrapper(selected_videos, out_clip, cfg)
-
-    print("--- Step 2: TTS Generation (with MP3 fix) ---")
-    # sentences is already prepared above
-    voice_wav, timings = build_voice_and_timings(sentences, keywords, cfg.work_dir, cfg)
+    print(f"Selected {len(all_videos)} videos for montage: {[os.path.basename(v) for v in all_videos]}")
 
-    print("--- Step 3: Subtitle Rendering ---")
-    render_ass(timings, cfg.ass_tpl_path, out_ass, cfg)
+    # Load script from script_dir (random text file); its filename becomes the hook text
+    txt_files = list_scripts(cfg.script_dir)
+    script_path = random.choice(txt_files) if txt_files else None
+    if script_path:
+        print(f"Selected script file: {script_path}")
 
-    print("--- Step 4: Final Mixing (Ducking + Loudnorm) ---")
-    mux_with_voice_bgm_and_subtitles(out_clip, voice_wav, out_ass, out_final, cfg)
+    render_job(cfg, out_final, script_path=script_path, videos=all_videos)
 
     print("\nALL DONE:", out_final)
 
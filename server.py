@@ -0,0 +1,296 @@
+"""
+无界面渲染服务：本地 HTTP API + 持久化任务队列。
+
+    python server.py --port 8765 --workers 2
+
+    POST /jobs                 提交任务 (JSON，见 build_job)，返回 202 + 任务
+    GET  /jobs[?status=queued] 任务列表
+    GET  /jobs/<id>            状态、进度 (最新 ffmpeg 事件)、耗时、结果或错误
+    GET  /jobs/<id>/output     下载生成的视频 (任务完成后)
+    POST /jobs/<id>/cancel     取消 (排队中直接取消，运行中杀掉它的 ffmpeg)
+    POST /jobs/<id>/priority   {"priority": N} 调整排队中任务的优先级
+    GET  /health               队列统计与并发数
+
+任务存在 SQLite 里，服务重启后继续跑没完成的任务；素材索引、proxy / TTS 缓存在进程内常驻，
+前端和定时任务共用一个已预热的进程。默认只监听 127.0.0.1。
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+from dataclasses import replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from jj import Config, ensure_dir, list_videos, render_job
+from utils.job_queue import JobQueue
+from utils.job_store import JobStore
+
+# 可以通过 "config" 覆盖的 Config 字段：只开放渲染参数 (类型, 取值范围或可选值)。
+# 路径、URL、缓存 / 工作目录、配额和并发等会影响整个进程 (共享的索引、缓存、清理线程) 的字段一律不开放。
+RENDER_PARAMS = {
+    "audio_speed": (float, (0.5, 2.0)),
+    "fps": (int, (1, 120)),
+    "duration_sec": (int, (1, 600)),
+    "hook_text": (str, None),
+    "enable_zoompan": (bool, None),
+    "motion_engine": (str, ("scale_crop", "zoompan")),
+    "budget_by_voice": (bool, None),
+    "fused_render": (bool, None),
+}
+
+ORIENTATIONS = {"vertical": (720, 1280), "horizontal": (1280, 720)}
+
+# 请求体上限 (文案 + 素材列表，1MB 足够)
+MAX_BODY_BYTES = 1 << 20
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def check_overrides(overrides: dict) -> dict:
+    """JSON 里的 Config 覆盖项 -> 校验过的 {字段: 值}；字段不在 RENDER_PARAMS 里、类型或取值不对时抛 BadRequest"""
+    if not isinstance(overrides, dict):
+        raise BadRequest("config must be an object")
+    out = {}
+    for key, value in overrides.items():
+        if key not in RENDER_PARAMS:
+            raise BadRequest(f"config.{key} cannot be overridden (allowed: {', '.join(RENDER_PARAMS)})")
+        typ, allowed = RENDER_PARAMS[key]
+        if typ is float and isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+        if not isinstance(value, typ) or (typ is not bool and isinstance(value, bool)):
+            raise BadRequest(f"config.{key} must be {typ.__name__}")
+        if isinstance(allowed, tuple) and typ in (int, float) and not allowed[0] <= value <= allowed[1]:
+            raise BadRequest(f"config.{key} must be between {allowed[0]} and {allowed[1]}")
+        if isinstance(allowed, tuple) and typ is str and value not in allowed:
+            raise BadRequest(f"config.{key} must be one of {list(allowed)}")
+        out[key] = value
+    return out
+
+
+def is_int(value) -> bool:
+    """JSON 整数 (true / false 在 Python 里也是 int，要排除)"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def job_config(base: Config, payload: dict) -> Config:
+    """任务参数 -> Config：素材选择 (assets) + 渲染参数覆盖 (config，运行时再校验一次，库里的旧任务也不例外)"""
+    return replace(base, **payload["assets"], **check_overrides(payload["config"]))
+
+
+def build_job(body: dict, base: Config) -> dict:
+    """
+    提交的 JSON -> 任务参数 (原样持久化，运行时再转成 Config)：
+        name           任务名 (可选)
+        script_text    文案文本，每行一句；或 script_path 服务端文案文件
+        keywords       高亮关键词列表 (可选，默认取文案旁边的关键词文件 / 内置词表)
+        videos         素材文件列表；或 video_dir 素材目录 (默认 Config.in_video_dir)
+        bgm_path       背景音乐
+        orientation    "vertical" / "horizontal"
+        seed           素材打乱的随机种子 (可选，固定后重跑选片一致)
+        priority       优先级，大的先跑
+        config         渲染参数覆盖 (只限 RENDER_PARAMS)，如 {"audio_speed": 1.1, "fused_render": false}
+    """
+    if not isinstance(body, dict):
+        raise BadRequest("request body must be a JSON object")
+    if not body.get("script_text") and not body.get("script_path"):
+        raise BadRequest("script_text or script_path is required")
+    if body.get("script_path") and not os.path.isfile(body["script_path"]):
+        raise BadRequest(f"script_path not found: {body['script_path']}")
+    videos = body.get("videos") or []
+    if not isinstance(videos, list) or not all(isinstance(v, str) for v in videos):
+        raise BadRequest("videos must be a list of paths")
+    missing = [v for v in videos if not os.path.isfile(v)]
+    if missing:
+        raise BadRequest(f"videos not found: {missing[:5]}")
+    orientation = body.get("orientation", "vertical")
+    if orientation not in ORIENTATIONS:
+        raise BadRequest(f"orientation must be one of {sorted(ORIENTATIONS)}")
+    keywords = body.get("keywords") or []
+    if not isinstance(keywords, list) or not all(isinstance(k, str) for k in keywords):
+        raise BadRequest("keywords must be a list of strings")
+    if not is_int(body.get("priority", 0)):
+        raise BadRequest("priority must be an integer")
+
+    overrides = check_overrides(body.get("config") or {})  # 提交时就校验，不等到排到了才失败
+    assets = {}
+    assets["out_w"], assets["out_h"] = ORIENTATIONS[orientation]
+    for key, field in (("video_dir", "in_video_dir"), ("bgm_path", "bgm_path")):
+        value = body.get(key)
+        if value is None:
+            continue
+        if not isinstance(value, str) or not os.path.exists(value):
+            raise BadRequest(f"{key} not found: {value}")
+        assets[field] = value
+
+    stem = body.get("name") or (os.path.splitext(os.path.basename(body["script_path"]))[0]
+                                if body.get("script_path") else "job")
+    return {
+        "name": re.sub(r"[^\w\-]+", "_", str(stem))[:60] or "job",
+        "priority": body.get("priority", 0),
+        "payload": {
+            "script_text": body.get("script_text"),
+            "script_path": body.get("script_path"),
+            "videos": videos,
+            "keywords": keywords,
+            "seed": body.get("seed"),
+            "assets": assets,
+            "config": overrides,
+        },
+    }
+
+
+class RenderService:
+    def __init__(self, base: Config, db_path: str, out_dir: str, workers: int):
+        self.base = base
+        self.out_dir = out_dir
+        ensure_dir(out_dir)
+        self.store = JobStore(db_path)
+        self.queue = JobQueue(self.run, workers=workers, store=self.store)
+
+    def run(self, job) -> dict:
+        p = job.payload
+        cfg = replace(job_config(self.base, p), cancel=job.cancel, on_progress=lambda ev: setattr(job, "progress", ev))
+        name = f"{job.id:04d}_{job.name}"
+        out_final = os.path.join(self.out_dir, name + ".mp4")
+        print(f"[Service] Job #{job.id} started -> {out_final}")
+        report = render_job(cfg, out_final, script_path=p["script_path"], script_text=p["script_text"],
+                            videos=list(p["videos"]), seed=p["seed"], job=f"s{name}",
+                            keywords=p.get("keywords"))
+        print(f"[Service] Job #{job.id} done")
+        return {"output": out_final, "total_sec": report["total_sec"], "critical_path": report["critical_path"]}
+
+    def warm(self) -> None:
+        """预热：建好默认素材目录的索引，第一个任务不用再等 ffprobe"""
+        videos = list_videos(self.base.in_video_dir, self.base)
+        print(f"[Service] Indexed {len(videos)} videos in {self.base.in_video_dir}")
+
+    def shutdown(self) -> None:
+        self.queue.shutdown()
+
+
+def make_handler(service: RenderService):
+    class Handler(BaseHTTPRequestHandler):
+        server_version = "jj-render/1.0"
+
+        def log_message(self, fmt, *args):
+            print(f"[HTTP] {self.address_string()} {fmt % args}")
+
+        def send_json(self, code: int, data) -> None:
+            body = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def read_json(self):
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                raise BadRequest("invalid Content-Length")
+            if length < 0 or length > MAX_BODY_BYTES:
+                raise BadRequest(f"request body must be at most {MAX_BODY_BYTES} bytes")
+            try:
+                return json.loads(self.rfile.read(length) or b"{}")
+            except ValueError as e:
+                raise BadRequest(f"invalid JSON: {e}")
+
+        def job_or_404(self, job_id: str):
+            job = service.queue.get(int(job_id))
+            if job is None:
+                self.send_json(404, {"error": f"job {job_id} not found"})
+            return job
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/health":
+                return self.send_json(200, {"workers": service.queue.workers, "jobs": service.queue.stats()})
+            if url.path == "/jobs":
+                status = parse_qs(url.query).get("status")
+                jobs = [j.to_dict() for j in service.queue.jobs() if not status or j.status in status]
+                return self.send_json(200, jobs)
+            m = re.fullmatch(r"/jobs/(\d+)(/output)?", url.path)
+            if not m:
+                return self.send_json(404, {"error": "not found"})
+            job = self.job_or_404(m.group(1))
+            if job is None:
+                return
+            if not m.group(2):
+                return self.send_json(200, job.to_dict())
+            path = (job.result or {}).get("output")
+            if job.status != "done" or not path or not os.path.isfile(path):
+                return self.send_json(409, {"error": f"job {job.id} has no output ({job.status})"})
+            self.send_response(200)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Content-Length", str(os.path.getsize(path)))
+            self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(path)}"')
+            self.end_headers()
+            with open(path, "rb") as f:
+                shutil.copyfileobj(f, self.wfile)
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            try:
+                if path == "/jobs":
+                    spec = build_job(self.read_json(), service.base)
+                    job = service.queue.submit(spec["name"], spec["payload"], spec["priority"])
+                    return self.send_json(202, job.to_dict())
+                m = re.fullmatch(r"/jobs/(\d+)/(cancel|priority)", path)
+                if not m:
+                    return self.send_json(404, {"error": "not found"})
+                job = self.job_or_404(m.group(1))
+                if job is None:
+                    return
+                if m.group(2) == "cancel":
+                    ok = service.queue.cancel(job.id)
+                else:
+                    priority = self.read_json().get("priority")
+                    if not is_int(priority):
+                        raise BadRequest("priority must be an integer")
+                    ok = service.queue.set_priority(job.id, priority)
+                if not ok:
+                    return self.send_json(409, {"error": f"job {job.id} is {job.status}"})
+                return self.send_json(200, job.to_dict())
+            except BadRequest as e:
+                return self.send_json(400, {"error": str(e)})
+
+    return Handler
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="JJ 渲染服务 (本地 HTTP API)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="同时渲染的任务数")
+    parser.add_argument("--db", default="output/_service/jobs.sqlite", help="任务队列数据库")
+    parser.add_argument("--out-dir", default="output/service", help="生成视频的目录")
+    parser.add_argument("--no-warm", action="store_true", help="启动时不预先索引默认素材目录")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    service = RenderService(Config(), args.db, args.out_dir, args.workers)
+    if not args.no_warm:
+        service.warm()
+    httpd = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"[Service] Listening on http://{args.host}:{args.port} ({args.workers} workers)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        # 正在跑的任务会被打断并放回队列，下次启动继续
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import threading
+import time
+
+from utils.job_queue import JobQueue
+
+
+def wait_for(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_priority_order_and_results():
+    gate = threading.Event()
+    order = []
+
+    def run(job):
+        if job.name == "first":
+            gate.wait(5)
+        order.append(job.name)
+        return job.payload["n"] * 2
+
+    q = JobQueue(run, workers=1)
+    first = q.submit("first", {"n": 0})
+    wait_for(lambda: first.status == "running")
+    low = q.submit("low", {"n": 1}, priority=0)
+    high = q.submit("high", {"n": 2}, priority=5)
+    late = q.submit("late", {"n": 3}, priority=0)
+    assert q.set_priority(late.id, 1)
+    gate.set()
+    wait_for(lambda: q.stats()["done"] == 4)
+    assert order == ["first", "high", "late", "low"]
+    assert (low.result, high.result) == (2, 4)
+    q.shutdown()
+
+
+def test_cancel_and_failure():
+    started = threading.Event()
+
+    def run(job):
+        if job.name == "boom":
+            raise ValueError("bad input")
+        started.set()
+        while True:
+            job.cancel.check()
+            time.sleep(0.01)
+
+    q = JobQueue(run, workers=1)
+    running = q.submit("loop", {})
+    started.wait(5)
+    queued = q.submit("boom", {})
+    waiting = q.submit("never", {})
+    assert q.cancel(waiting.id)
+    assert waiting.status == "cancelled"
+    assert q.cancel(running.id)
+    wait_for(lambda: queued.status == "failed")
+    assert running.status == "cancelled"
+    assert queued.error == "bad input"
+    assert not q.cancel(running.id)
+    assert q.clear_finished() == 3
+    assert q.jobs() == []
+    q.shutdown()
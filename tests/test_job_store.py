@@ -0,0 +1,38 @@
+import threading
+import time
+
+from utils.job_queue import JobQueue
+from utils.job_store import JobStore
+
+
+def wait_for(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_interrupted_jobs_resume_after_restart(tmp_path):
+    db = str(tmp_path / "jobs.sqlite")
+    started = threading.Event()
+
+    def slow(job):
+        started.set()
+        while True:
+            job.cancel.check()
+            time.sleep(0.01)
+
+    q = JobQueue(slow, workers=1, store=JobStore(db))
+    job = q.submit("render", {"script_text": "一句"}, priority=3)
+    started.wait(5)
+    q.shutdown()
+    assert job.status == "queued"
+
+    done = []
+    q2 = JobQueue(lambda j: done.append(j.payload) or "ok", workers=1, store=JobStore(db))
+    wait_for(lambda: q2.stats()["done"] == 1)
+    restored = q2.get(job.id)
+    assert (restored.name, restored.priority, restored.result) == ("render", 3, "ok")
+    assert done == [{"script_text": "一句"}]
+    q2.shutdown()
+
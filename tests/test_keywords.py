@@ -0,0 +1,55 @@
+import random
+
+from utils.keywords import (KeywordMatcher, compile_keywords, is_keywords_file, keyword_files,
+                            read_keywords_file)
+
+
+def brute_force(text, keywords):
+    """参考实现：每个位置取最长的关键词，匹配后跳过"""
+    spans, i = [], 0
+    while i < len(text):
+        best = max((k for k in keywords if k and text.startswith(k, i)), key=len, default=None)
+        if best:
+            spans.append((i, i + len(best)))
+            i += len(best)
+        else:
+            i += 1
+    return spans
+
+
+def test_leftmost_longest_without_nesting():
+    m = KeywordMatcher(["跑刀", "跑刀老板", "老板"])
+    assert m.find("今天跑刀老板来了") == [(2, 6)]
+    assert m.highlight("跑刀老板和老板", "[", "]") == "[跑刀老板]和[老板]"
+
+
+def test_no_keywords_or_no_match():
+    assert KeywordMatcher([]).find("任何文本") == []
+    assert KeywordMatcher(["", "abc"]).highlight("xyz", "<", ">") == "xyz"
+
+
+def test_matches_brute_force():
+    rng = random.Random(0)
+    for _ in range(300):
+        keywords = ["".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 6))]
+        text = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 30)))
+        assert KeywordMatcher(keywords).find(text) == brute_force(text, keywords), (keywords, text)
+
+
+def test_compile_keywords_is_cached_per_set():
+    a = compile_keywords(["乙", "甲"])
+    assert compile_keywords(["甲", "乙", "甲"]) is a
+    assert compile_keywords(a) is a
+
+
+def test_keyword_files(tmp_path):
+    script = tmp_path / "视频1.txt"
+    script.write_text("第一句\n", encoding="utf-8")
+    assert keyword_files(str(script)) == []
+    (tmp_path / "keywords.txt").write_text("共用\n", encoding="utf-8")
+    (tmp_path / "视频1.keywords.txt").write_text("# 注释\n\n专用\n", encoding="utf-8")
+    files = keyword_files(str(script))
+    assert [f.rsplit("/", 1)[-1] for f in files] == ["keywords.txt", "视频1.keywords.txt"]
+    assert read_keywords_file(files[1]) == ["专用"]
+    assert all(is_keywords_file(f) for f in files)
+    assert not is_keywords_file(str(script))
@@ -0,0 +1,32 @@
+import threading
+import time
+
+from utils.rate_limit import TokenBucket
+
+
+def test_burst_then_rate():
+    bucket = TokenBucket(50.0, burst=2)
+    t0 = time.monotonic()
+    for _ in range(2):
+        assert bucket.acquire() == 0.0
+    assert time.monotonic() - t0 < 0.05
+    for _ in range(10):
+        bucket.acquire()
+    # 突发 2 个之后，剩下 10 个按 50/s 放行
+    assert time.monotonic() - t0 >= 10 / 50 * 0.9
+
+
+def test_shared_between_threads():
+    bucket = TokenBucket(100.0, burst=1)
+    t0 = time.monotonic()
+    threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(5)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert time.monotonic() - t0 >= 19 / 100 * 0.9
+
+
+def test_unlimited():
+    bucket = TokenBucket(0)
+    assert all(bucket.acquire() == 0.0 for _ in range(1000))
@@ -0,0 +1,20 @@
+import jj
+
+
+def test_trim_timeline_cuts_last_clip_and_drops_rest():
+    assert jj.trim_timeline([30, 30, 30], 50) == [(0, 30), (1, 20)]
+    assert jj.trim_timeline([30, 0, 30], 90) == [(0, 30), (2, 30)]
+    assert jj.trim_timeline([30], 0) == []
+
+
+def test_plan_segments_balances_on_clip_boundaries():
+    segments = jj.plan_segments([10] * 6, 60, 3)
+    assert segments == [[(0, 10), (1, 10)], [(2, 10), (3, 10)], [(4, 10), (5, 10)]]
+
+
+def test_plan_segments_never_more_segments_than_clips():
+    segments = jj.plan_segments([40, 5], 100, 4)
+    assert segments == [[(0, 40)], [(1, 5)]]
+    # 截断后的时间线被完整覆盖，顺序不变
+    segments = jj.plan_segments([25, 25, 25, 25], 80, 2)
+    assert [x for seg in segments for x in seg] == jj.trim_timeline([25, 25, 25, 25], 80)
@@ -0,0 +1,23 @@
+import pytest
+
+import jj
+
+
+@pytest.fixture
+def durations(monkeypatch):
+    table = {}
+    monkeypatch.setattr(jj, "ffprobe_duration", lambda v, config: table.get(v, 0.0))
+    return table
+
+
+def test_select_clips_loops_sources_and_trims_last(durations):
+    durations.update({"a.mp4": 1.0, "b.mp4": 0.5, "broken.mp4": 0.0})
+    picked, used = jj.select_clips(["a.mp4", "broken.mp4", "b.mp4"], 2.2, jj.Config(fps=10))
+    assert picked == ["a.mp4", "b.mp4", "a.mp4"]
+    assert used == pytest.approx([1.0, 0.5, 0.7])
+
+
+def test_select_clips_falls_back_when_nothing_probes(durations):
+    picked, used = jj.select_clips(["a.mp4", "b.mp4"], 5.0, jj.Config(fps=10))
+    assert used is None
+    assert picked == ["a.mp4", "b.mp4"] * 5
@@ -0,0 +1,42 @@
+import shutil
+
+from utils.stage_cache import StageCache
+
+
+def test_fresh_after_record(tmp_path):
+    out = tmp_path / "voice.wav"
+    out.write_bytes(b"x")
+    cache = StageCache(str(tmp_path / "stages.json"))
+    d = StageCache.digest("voice", ["第一句"], 1.2)
+    assert not cache.fresh("voice", d)
+    cache.record("voice", d, [str(out)])
+    assert cache.fresh("voice", d)
+    assert not cache.fresh("voice", StageCache.digest("voice", ["第一句"], 1.0))
+
+
+def test_missing_output_is_not_fresh(tmp_path):
+    out = tmp_path / "clip.mp4"
+    out.write_bytes(b"x")
+    cache = StageCache(str(tmp_path / "stages.json"))
+    cache.record("clip", "d1", [str(out)])
+    out.unlink()
+    assert not cache.fresh("clip", "d1")
+
+
+def test_state_survives_reload_and_moving_the_directory(tmp_path):
+    work = tmp_path / "job"
+    work.mkdir()
+    (work / "sub.ass").write_text("x", encoding="utf-8")
+    StageCache(str(work / "stages.json")).record("subs", "d1", [str(work / "sub.ass")])
+
+    moved = tmp_path / "moved"
+    shutil.move(str(work), str(moved))
+    cache = StageCache(str(moved / "stages.json"))
+    assert cache.fresh("subs", "d1")
+    assert cache.outputs() == [str(moved / "sub.ass")]
+
+
+def test_corrupt_state_file_starts_empty(tmp_path):
+    path = tmp_path / "stages.json"
+    path.write_text("{not json", encoding="utf-8")
+    assert StageCache(str(path)).outputs() == []
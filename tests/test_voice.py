@@ -0,0 +1,44 @@
+import os
+import shutil
+import wave
+
+import pytest
+
+import jj
+from utils.tts_stub import start_stub, stub_url
+
+FFMPEG = os.environ.get("FFMPEG", "ffmpeg")
+
+pytestmark = pytest.mark.skipif(shutil.which(FFMPEG) is None, reason="ffmpeg not found")
+
+
+@pytest.fixture
+def stub():
+    # 每 3 个请求有一个 503 (Retry-After: 0)，客户端要重试成功
+    server = start_stub(fail_every=3)
+    yield server
+    server.shutdown()
+
+
+def test_voice_stage_retries_through_stub(stub, tmp_path):
+    config = jj.Config(ffmpeg=FFMPEG, manbo_api_url=stub_url(stub), audio_speed=1.0, sr=24000,
+                       tts_cache_dir=str(tmp_path / "tts"), tts_rps=0, tts_backoff_sec=0.01)
+    sentences = ["第一句", "第二句话", "第三句", "第四句话长一点", "第五句"]
+    mark = jj.get_tts_client(config).mark()
+
+    wav, timings, fallback = jj.build_voice_and_timings(sentences, str(tmp_path / "work"), config)
+
+    assert fallback == 0
+    assert jj.get_tts_client(config).stats(since=mark)["retries"] > 0
+    assert [t for _, _, t in timings] == sentences
+    assert all(st < ed for st, ed, _ in timings)
+    assert all(a[1] <= b[0] for a, b in zip(timings, timings[1:]))
+    with wave.open(wav) as w:
+        assert w.getframerate() == 24000 and w.getnchannels() == 2
+        assert w.getnframes() / 24000 == pytest.approx(timings[-1][1] + 0.15, abs=0.01)
+
+    # 第二次全部命中 TTS 缓存，不再请求桩服务
+    mark = jj.get_tts_client(config).mark()
+    _, timings2, _ = jj.build_voice_and_timings(sentences, str(tmp_path / "work2"), config)
+    assert timings2 == timings
+    assert "api" not in jj.get_tts_client(config).stats(since=mark)
@@ -0,0 +1,133 @@
+import json
+import os
+import platform
+import threading
+import time
+
+from utils.procman import ProcessManager
+
+# ffmpeg -progress 的输出：每隔 stats_period 一块 key=value，以 progress=continue / progress=end 结尾
+PROGRESS_ARGS = ["-progress", "pipe:1", "-nostats"]
+
+
+def _num(value, suffix: str = ""):
+    """"1.23x" / "2345.6kbits/s" / "N/A" -> float 或 None"""
+    if value is None:
+        return None
+    value = value.strip()
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse_block(kv: dict, total_sec: float = None, elapsed: float = 0.0) -> dict:
+    """
+    一块 -progress 输出 -> 事件：frame, fps, speed (相对实时的倍数), out_time_sec, bitrate_kbps,
+    以及知道输出总时长时的 percent / eta_sec。
+    """
+    frame = _num(kv.get("frame"))
+    out_us = _num(kv.get("out_time_us")) or _num(kv.get("out_time_ms"))  # 老版本 out_time_ms 其实也是微秒
+    out_sec = out_us / 1e6 if out_us is not None and out_us >= 0 else None
+    speed = _num(kv.get("speed"), "x")
+    ev = {
+        "frame": int(frame) if frame is not None else None,
+        "fps": _num(kv.get("fps")),
+        "speed": speed,
+        "out_time_sec": out_sec,
+        "bitrate_kbps": _num(kv.get("bitrate"), "kbits/s"),
+        "total_size": int(_num(kv.get("total_size")) or 0),
+        "elapsed_sec": elapsed,
+        "done": kv.get("progress") == "end",
+        "percent": None,
+        "eta_sec": None,
+    }
+    if total_sec and out_sec is not None:
+        ev["percent"] = min(100.0, 100.0 * out_sec / total_sec)
+        left = max(0.0, total_sec - out_sec)
+        if speed:
+            ev["eta_sec"] = left / speed
+        elif out_sec > 0:
+            ev["eta_sec"] = elapsed * left / out_sec
+    if ev["done"]:
+        ev["percent"], ev["eta_sec"] = 100.0, 0.0
+    return ev
+
+
+def run_with_progress(cmd, on_event=None, label: str = "", total_sec: float = None,
+                      procs: ProcessManager = None, token=None, timeout: float = None) -> dict:
+    """
+    带 -progress pipe:1 运行 ffmpeg (cmd[0] 之后插入参数)，每块进度解析成事件交给 on_event。
+    进程由 procs (ProcessManager) 启动，支持 token 取消和 timeout；stderr 照常输出。
+    返回汇总 (label, wall_sec, frames, avg_fps, speed, out_time_sec, rc + rusage)；
+    退出码非 0 时抛 CalledProcessError。
+    """
+    full = [cmd[0]] + PROGRESS_ARGS + list(cmd[1:])
+    t0 = time.monotonic()
+    state = {"last": {}, "kv": {}}
+
+    def on_line(line: str) -> None:
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            return
+        kv = state["kv"]
+        kv[key] = value
+        if key != "progress":
+            return
+        ev = parse_block(kv, total_sec, time.monotonic() - t0)
+        ev["label"] = label
+        state["last"], state["kv"] = ev, {}
+        if on_event is not None:
+            try:
+                on_event(ev)
+            except Exception as e:  # 回调出错不能拖垮编码
+                print(f"[Progress] callback failed: {e}")
+
+    res = (procs or ProcessManager()).run(full, token=token, timeout=timeout, on_line=on_line)
+    last = state["last"]
+    frames = last.get("frame") or 0
+    summary = {
+        "label": label,
+        "frames": frames,
+        "avg_fps": frames / res.wall_sec if res.wall_sec > 0 else None,
+        "speed": last.get("speed"),
+        "out_time_sec": last.get("out_time_sec"),
+        "rc": res.returncode,
+    }
+    summary.update(res.usage())
+    return summary
+
+
+class MetricsLog:
+    """
+    每个任务一个 JSON Lines 指标文件 (追加写，多次运行可以对比)：
+    - {"type": "run", host, cpus, ...}        任务开始
+    - {"type": "progress", label, frame, fps, speed, ...}   ffmpeg 进度事件
+    - {"type": "summary", label, wall_sec, avg_fps, ...}     每次 ffmpeg 调用结束
+    可以直接作为 on_event 回调；forward 为 GUI 等上层的回调。
+    """
+
+    def __init__(self, path: str, job: str = "", forward=None):
+        self.path = path
+        self.job = job
+        self.forward = forward
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.write({"type": "run", "host": platform.node(), "cpus": os.cpu_count()})
+
+    def write(self, record: dict) -> None:
+        record = dict(record, job=self.job, ts=time.time())
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def __call__(self, event: dict) -> None:
+        self.write(dict(event, type="progress"))
+        if self.forward is not None:
+            self.forward(dict(event, job=self.job))
+
+    def summary(self, summary: dict) -> None:
+        self.write(dict(summary, type="summary", host=platform.node()))
@@ -0,0 +1,192 @@
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+
+from utils.procman import Cancelled, CancelToken
+
+# 状态: queued -> running -> done / failed / cancelled
+FINISHED = ("done", "failed", "cancelled")
+
+
+@dataclass
+class Job:
+    id: int
+    name: str
+    payload: dict
+    priority: int = 0
+    status: str = "queued"
+    created: float = field(default_factory=time.time)
+    started: float = None
+    finished: float = None
+    error: str = None
+    result: object = None
+    progress: dict = None  # 最新的 ffmpeg 进度事件
+    cancel: CancelToken = None
+
+    def elapsed(self) -> float:
+        """运行耗时 (还在跑时算到现在)；排队中为 0"""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "name": self.name, "priority": self.priority, "status": self.status,
+                "created": self.created, "started": self.started, "finished": self.finished,
+                "elapsed_sec": round(self.elapsed(), 2), "error": self.error, "result": self.result,
+                "progress": self.progress, "payload": self.payload}
+
+
+class JobQueue:
+    """
+    优先级任务队列 + 可调大小的工作线程池：
+    - submit(): 入队，priority 大的先跑，同优先级先来先跑
+    - cancel(): 排队中的直接标记取消；运行中的通过 CancelToken 杀掉它的 ffmpeg
+    - set_priority(): 调整排队中任务的顺序
+    - set_workers(): 随时调整并发数 (调小时正在跑的任务跑完为止)
+    run_fn(job) 在工作线程里执行，返回值记在 job.result；on_change(job) 在状态变化时调用 (工作线程里)。
+    store: 可选的持久化 (utils/job_store.JobStore)，启动时恢复任务，状态变化时写入；
+    shutdown() 打断的任务记为 queued，重启后接着跑。
+    """
+
+    def __init__(self, run_fn, workers: int = 1, on_change=None, store=None):
+        self.run_fn = run_fn
+        self.on_change = on_change
+        self.store = store
+        self.workers = max(1, workers)
+        self._jobs = {}
+        if store is not None:
+            for job in store.load():
+                job.cancel = CancelToken(job.name)
+                self._jobs[job.id] = job
+            if self._jobs:
+                queued = sum(j.status == "queued" for j in self._jobs.values())
+                print(f"[JobQueue] Restored {len(self._jobs)} jobs ({queued} queued)")
+        self._ids = itertools.count(max(self._jobs, default=0) + 1)
+        self._running = 0
+        self._threads = []
+        self._stop = False
+        self._cond = threading.Condition()
+        self.set_workers(self.workers)
+
+    # ---- 控制 ----
+    def submit(self, name: str, payload: dict, priority: int = 0) -> Job:
+        with self._cond:
+            job = Job(next(self._ids), name, payload, priority, cancel=CancelToken(name))
+            self._jobs[job.id] = job
+            self._cond.notify_all()
+        self._changed(job)
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return False
+            if job.status == "queued":
+                job.status, job.finished = "cancelled", time.time()
+        job.cancel.cancel("cancelled by user")
+        self._changed(job)
+        return True
+
+    def set_priority(self, job_id: int, priority: int) -> bool:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != "queued":
+                return False
+            job.priority = priority
+        self._changed(job)
+        return True
+
+    def set_workers(self, n: int) -> None:
+        with self._cond:
+            self.workers = max(1, n)
+            while len(self._threads) < self.workers:
+                t = threading.Thread(target=self._loop, name=f"job-worker-{len(self._threads)}", daemon=True)
+                self._threads.append(t)
+                t.start()
+            self._cond.notify_all()
+
+    def clear_finished(self) -> int:
+        """从列表里移除已结束的任务，返回移除的个数"""
+        with self._cond:
+            done = [i for i, j in self._jobs.items() if j.status in FINISHED]
+            for i in done:
+                del self._jobs[i]
+        if self.store is not None:
+            self.store.delete(done)
+        return len(done)
+
+    def shutdown(self, cancel_running: bool = True, timeout: float = 5.0) -> None:
+        """停止取新任务；cancel_running 时打断正在跑的任务，最多等 timeout 秒让它们记下状态"""
+        with self._cond:
+            self._stop = True
+            running = [j for j in self._jobs.values() if j.status == "running"]
+            self._cond.notify_all()
+        if cancel_running:
+            for j in running:
+                j.cancel.cancel("shutdown")
+            for t in self._threads:
+                t.join(timeout)
+
+    # ---- 查询 ----
+    def jobs(self) -> list:
+        """按 id 排序的任务列表 (对象本身，只读使用)"""
+        with self._cond:
+            return sorted(self._jobs.values(), key=lambda j: j.id)
+
+    def get(self, job_id: int) -> Job:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        with self._cond:
+            out = dict.fromkeys(("queued", "running") + FINISHED, 0)
+            for j in self._jobs.values():
+                out[j.status] += 1
+            return out
+
+    # ---- 内部 ----
+    def _changed(self, job: Job) -> None:
+        if self.store is not None:
+            try:
+                self.store.save(job)
+            except Exception as e:
+                print(f"[JobQueue] Could not persist job #{job.id}: {e}")
+        if self.on_change is not None:
+            try:
+                self.on_change(job)
+            except Exception as e:
+                print(f"[JobQueue] on_change failed: {e}")
+
+    def _next_locked(self):
+        queued = [j for j in self._jobs.values() if j.status == "queued"]
+        return max(queued, key=lambda j: (j.priority, -j.id)) if queued else None
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stop and (self._running >= self.workers or self._next_locked() is None):
+                    self._cond.wait()
+                if self._stop:
+                    return
+                job = self._next_locked()
+                job.status, job.started = "running", time.time()
+                self._running += 1
+            self._changed(job)
+            try:
+                job.result = self.run_fn(job)
+                status = "done"
+            except Cancelled as e:
+                status, job.error = "cancelled", str(e)
+            except Exception as e:
+                status, job.error = "failed", str(e)
+            with self._cond:
+                if status == "cancelled" and self._stop:
+                    # 退出时被打断，不算用户取消：放回队列
+                    job.status, job.started, job.error = "queued", None, None
+                else:
+                    job.status, job.finished = status, time.time()
+                self._running -= 1
+                self._cond.notify_all()
+            self._changed(job)
@@ -0,0 +1,78 @@
+import json
+import os
+import sqlite3
+import threading
+
+from utils.job_queue import Job
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created REAL,
+    started REAL,
+    finished REAL,
+    error TEXT,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status);
+"""
+
+COLUMNS = ("id", "name", "priority", "status", "payload", "created", "started", "finished", "error", "result")
+
+
+class JobStore:
+    """
+    JobQueue 的 SQLite 持久化 (JobQueue(store=...))：
+    - 每次任务状态 / 优先级变化写一行 (进度事件只在内存里，不落盘)
+    - load(): 进程重启后恢复任务列表；上次没跑完的 running 任务重新排队
+    单进程独占一个库文件。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def save(self, job: Job) -> None:
+        row = (job.id, job.name, job.priority, job.status,
+               json.dumps(job.payload, ensure_ascii=False), job.created, job.started, job.finished, job.error,
+               json.dumps(job.result, ensure_ascii=False, default=str) if job.result is not None else None)
+        with self._lock:
+            self._db.execute(f"INSERT OR REPLACE INTO jobs ({', '.join(COLUMNS)}) "
+                             f"VALUES ({', '.join('?' * len(COLUMNS))})", row)
+            self._db.commit()
+
+    def delete(self, ids) -> None:
+        with self._lock:
+            self._db.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in ids])
+            self._db.commit()
+
+    def load(self) -> list:
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM jobs ORDER BY id").fetchall()
+            # 上次进程退出时还在跑的任务：重新排队 (同名工作目录还在，增量缓存从中断的阶段继续)
+            self._db.execute("UPDATE jobs SET status = 'queued', started = NULL WHERE status = 'running'")
+            self._db.commit()
+        jobs = []
+        for r in rows:
+            job = Job(r["id"], r["name"], json.loads(r["payload"]), r["priority"], r["status"], r["created"],
+                      r["started"], r["finished"], r["error"],
+                      json.loads(r["result"]) if r["result"] is not None else None)
+            if job.status == "running":
+                job.status, job.started = "queued", None
+            jobs.append(job)
+        return jobs
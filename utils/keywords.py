@@ -0,0 +1,117 @@
+import functools
+import os
+from collections import deque
+
+# 文案目录里的关键词文件：同目录共用的 keywords.txt，以及单个文案专用的 <文案名>.keywords.txt
+SHARED_KEYWORDS_FILE = "keywords.txt"
+KEYWORDS_SUFFIX = ".keywords.txt"
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick 多模式匹配：关键词集合编译一次，每行只扫一遍。
+    匹配规则是最左最长、不重叠 (“跑刀” 和 “跑刀老板” 同时存在时只标 “跑刀老板”，不会嵌套标签)。
+    """
+
+    def __init__(self, keywords):
+        self.keywords = sorted({k for k in keywords if k})
+        self._goto = [{}]   # 节点 -> {字符: 子节点}
+        self._fail = [0]
+        self._depth = [0]   # 节点对应的前缀长度
+        self._word = [False]  # 节点本身是否为一个关键词
+        self._dict = [0]    # fail 链上最近的关键词节点 (0 = 没有)
+        for kw in self.keywords:
+            node = 0
+            for ch in kw:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._depth.append(self._depth[node] + 1)
+                    self._word.append(False)
+                    self._dict.append(0)
+                node = nxt
+            self._word[node] = True
+        # BFS 建 fail 链
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                f = self._goto[f].get(ch, 0)
+                self._fail[child] = f
+                self._dict[child] = f if self._word[f] else self._dict[f]
+                queue.append(child)
+
+    def find(self, text: str) -> list:
+        """最左最长、不重叠的匹配 -> [(start, end), ...]"""
+        if not self.keywords:
+            return []
+        goto, fail, depth, word, dict_link = self._goto, self._fail, self._depth, self._word, self._dict
+        longest = {}  # start -> 从该位置开始的最长匹配的 end
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            m = node if word[node] else dict_link[node]
+            while m:
+                start = i + 1 - depth[m]
+                if longest.get(start, -1) < i + 1:
+                    longest[start] = i + 1
+                m = dict_link[m]
+        spans = []
+        pos = 0
+        for start in sorted(longest):
+            if start >= pos:
+                spans.append((start, longest[start]))
+                pos = longest[start]
+        return spans
+
+    def highlight(self, text: str, before: str, after: str) -> str:
+        spans = self.find(text)
+        if not spans:
+            return text
+        parts = []
+        pos = 0
+        for start, end in spans:
+            parts.append(text[pos:start])
+            parts.append(before + text[start:end] + after)
+            pos = end
+        parts.append(text[pos:])
+        return "".join(parts)
+
+
+@functools.lru_cache(maxsize=32)
+def _compile(keywords: tuple) -> KeywordMatcher:
+    return KeywordMatcher(keywords)
+
+
+def compile_keywords(keywords) -> KeywordMatcher:
+    """关键词集合 -> 编译好的匹配器 (按集合缓存，同一份词表在多个任务间只编译一次)"""
+    if isinstance(keywords, KeywordMatcher):
+        return keywords
+    return _compile(tuple(sorted({k for k in keywords if k})))
+
+
+def is_keywords_file(path: str) -> bool:
+    name = os.path.basename(path)
+    return name == SHARED_KEYWORDS_FILE or name.endswith(KEYWORDS_SUFFIX)
+
+
+def read_keywords_file(path: str) -> list:
+    """每行一个关键词，空行和 # 开头的行忽略"""
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return [s for s in (line.strip() for line in f) if s and not s.startswith("#")]
+
+
+def keyword_files(script_path: str) -> list:
+    """文案旁边存在的关键词文件：共用的 keywords.txt + 该文案专用的 <文案名>.keywords.txt"""
+    folder = os.path.dirname(script_path)
+    stem = os.path.splitext(os.path.basename(script_path))[0]
+    candidates = [os.path.join(folder, SHARED_KEYWORDS_FILE), os.path.join(folder, stem + KEYWORDS_SUFFIX)]
+    return [p for p in candidates if os.path.isfile(p)]
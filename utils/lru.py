@@ -0,0 +1,33 @@
+import os
+
+
+def evict_lru(cache_dir: str, max_bytes: int, suffix: str, keep: str = None) -> int:
+    """
+    目录级 LRU 淘汰：以文件 mtime 作为最近使用时间 (命中时 os.utime 刷新)，
+    总大小超过 max_bytes 时从最旧的开始删除。以 "." 开头的临时文件不参与。
+    返回删除的文件数。
+    """
+    entries = []
+    total = 0
+    for e in os.scandir(cache_dir):
+        if not e.is_file() or not e.name.endswith(suffix) or e.name.startswith("."):
+            continue
+        st = e.stat()
+        entries.append((st.st_mtime, st.st_size, e.path))
+        total += st.st_size
+    if total <= max_bytes:
+        return 0
+    removed = 0
+    entries.sort()  # oldest (least recently used) first
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        if keep and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        try:
+            os.remove(path)
+            total -= size
+            removed += 1
+        except OSError:
+            pass
+    return removed
@@ -1,10 +1,131 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
 
 import requests
-import time
+from requests.adapters import HTTPAdapter
+
+DEFAULT_API_URL = "https://api.milorapart.top/apis/mbAIsc"
+
+# 这些状态码视为暂时性错误，按退避策略重试
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# 请求指标只保留最近这么多条 (客户端在服务 / GUI 里常驻，不能无限增长)
+METRICS_WINDOW = 4096
 
 class ManboTTS:
-    def __init__(self):
-        self.api_url = "https://api.milorapart.top/apis/mbAIsc"
+    def __init__(self, api_url: str = None, rate_limiter=None, max_retries: int = 3, backoff: float = 0.5, pool_size: int = 8,
+                 max_in_flight: int = 0):
+        # api_url 可指向本地桩服务 (utils/tts_stub.py) 做离线测试
+        self.api_url = api_url or os.getenv("MANBO_TTS_URL", DEFAULT_API_URL)
+        # 可选的 TokenBucket，替代固定的 sleep；多线程共享同一个限流器
+        self.rate_limiter = rate_limiter
+        # 同时在途的 API 请求上限 (0 = 不限)；客户端被多个任务共用时，这是所有任务合计的上限
+        self._in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight > 0 else nullcontext()
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # 单次重试等待的上限：指数退避的最后一档，服务端的 Retry-After 也不超过它
+        self.max_delay = backoff * (2 ** max_retries)
+
+        # 共享 Session：连接池 + keep-alive，避免每句话都重新握手 TCP/TLS
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_size))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # 请求指标: (序号, kind, latency_sec, ok)，kind = "api" / "audio"；只保留最近 METRICS_WINDOW 条
+        self._metrics = deque(maxlen=METRICS_WINDOW)
+        self._seq = 0
+        self._retries = 0
+        self._metrics_lock = threading.Lock()
+
+    # ---- metrics ----
+    def _record(self, kind: str, latency: float, ok: bool) -> None:
+        with self._metrics_lock:
+            self._metrics.append((self._seq, kind, latency, ok))
+            self._seq += 1
+
+    def mark(self) -> tuple:
+        """当前指标位置，配合 stats(since=...) 统计某个任务期间的请求"""
+        with self._metrics_lock:
+            return self._seq, self._retries
+
+    def stats(self, since: tuple = (0, 0)) -> dict:
+        """since 之后的请求统计；更早的记录已被挤出窗口时，只统计还保留着的最近 METRICS_WINDOW 条"""
+        with self._metrics_lock:
+            records = [(k, l, ok) for seq, k, l, ok in self._metrics if seq >= since[0]]
+            retries = self._retries - since[1]
+        out = {"retries": retries}
+        for kind in ("api", "audio"):
+            lat = sorted(l for k, l, _ in records if k == kind)
+            fails = sum(1 for k, _, ok in records if k == kind and not ok)
+            if not lat:
+                continue
+            out[kind] = {
+                "count": len(lat),
+                "failed": fails,
+                "p50_ms": lat[len(lat) // 2] * 1000,
+                "p95_ms": lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000,
+                "max_ms": lat[-1] * 1000,
+            }
+        return out
+
+    def format_stats(self, since: tuple = (0, 0)) -> str:
+        st = self.stats(since)
+        parts = []
+        for kind in ("api", "audio"):
+            if kind in st:
+                m = st[kind]
+                parts.append(
+                    f"{kind}: n={m['count']} fail={m['failed']} "
+                    f"p50={m['p50_ms']:.0f}ms p95={m['p95_ms']:.0f}ms max={m['max_ms']:.0f}ms"
+                )
+        parts.append(f"retries={st['retries']}")
+        return "[ManboTTS] " + " | ".join(parts)
+
+    # ---- transport ----
+    def _retry_delay(self, attempt: int, resp) -> float:
+        """指数退避 + 抖动；服务端给了 Retry-After 就按它来，但不超过 max_delay"""
+        if resp is not None:
+            ra = resp.headers.get("Retry-After")
+            if ra:
+                try:
+                    return min(max(0.0, float(ra)), self.max_delay)
+                except ValueError:
+                    pass
+        base = self.backoff * (2 ** attempt)
+        return base / 2 + random.uniform(0, base / 2)
+
+    def _get(self, kind: str, url: str, limited: bool, **kwargs) -> requests.Response:
+        for attempt in range(self.max_retries + 1):
+            resp, err = None, None
+            with self._in_flight if limited else nullcontext():
+                if limited and self.rate_limiter is not None:
+                    # 限流 (并发合成时由 token bucket 控制 requests/s)，重试同样占用配额
+                    self.rate_limiter.acquire()
+                t0 = time.monotonic()
+                try:
+                    resp = self.session.get(url, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    err = e
+            ok = resp is not None and resp.status_code not in RETRY_STATUS
+            self._record(kind, time.monotonic() - t0, ok and resp.ok)
+            if ok:
+                resp.raise_for_status()
+                return resp
+            if attempt == self.max_retries:
+                if resp is not None:
+                    resp.raise_for_status()
+                raise err
+            delay = self._retry_delay(attempt, resp)
+            reason = f"HTTP {resp.status_code}" if resp is not None else type(err).__name__
+            print(f"[ManboTTS] {kind} {reason}, retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+            with self._metrics_lock:
+                self._retries += 1
+            time.sleep(delay)
 
     def generate_speech(self, text: str) -> bytes:
         """
@@ -16,31 +137,26 @@ class ManboTTS:
             # 1. Get the audio URL
             params = {"text": text}
             print(f"[ManboTTS] Requesting TTS for: {text[:10]}...")
-            
-            # Add a small delay to avoid rate limiting if calling in a loop
-            time.sleep(0.5) 
-            
-            resp = requests.get(self.api_url, params=params, timeout=10)
-            resp.raise_for_status()
-            
+
+            resp = self._get("api", self.api_url, limited=True, params=params, timeout=10)
+
             data = resp.json()
             if data.get("code") != 200:
                 print(f"[ManboTTS] API Error: {data}")
                 return None
-                
+
             audio_url = data.get("url")
             if not audio_url:
                 print("[ManboTTS] No audio URL in response.")
                 return None
-                
+
             print(f"[ManboTTS] Downloading audio from: {audio_url}")
-            
+
             # 2. Download the audio file
-            audio_resp = requests.get(audio_url, timeout=30)
-            audio_resp.raise_for_status()
-            
+            audio_resp = self._get("audio", audio_url, limited=False, timeout=30)
+
             return audio_resp.content
-            
+
         except Exception as e:
             print(f"[ManboTTS] Error: {e}")
             return None
@@ -52,3 +168,4 @@ if __name__ == "__main__":
         with open("test_manbo.mp3", "wb") as f:
             f.write(audio)
         print("Saved test_manbo.mp3")
+    print(tts.format_stats())
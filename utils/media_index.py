@@ -0,0 +1,221 @@
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    duration REAL,
+    width INTEGER,
+    height INTEGER,
+    fps REAL,
+    nb_frames INTEGER,
+    codec TEXT,
+    pix_fmt TEXT,
+    rotation INTEGER,
+    has_audio INTEGER,
+    keyframe_interval REAL,
+    profile TEXT,
+    level INTEGER,
+    time_base TEXT,
+    sar TEXT,
+    extradata TEXT,
+    error TEXT,
+    probed_at REAL
+);
+CREATE INDEX IF NOT EXISTS media_dir ON media(dir);
+"""
+
+# parse_probe 产出的字段
+PROBE_FIELDS = ("duration", "width", "height", "fps", "nb_frames", "codec", "pix_fmt", "rotation", "has_audio",
+                "keyframe_interval", "profile", "level", "time_base", "sar", "extradata")
+# error 不为空表示 probe 失败 (超时、ffprobe 报错)：这种行只占位，refresh / get 时会重新 probe
+COLUMNS = ("path", "dir", "size", "mtime_ns") + PROBE_FIELDS + ("error", "probed_at")
+
+
+def _rate(r: str) -> float:
+    try:
+        num, den = r.split("/")
+        return float(num) / float(den) if float(den) else 0.0
+    except Exception:
+        return 0.0
+
+
+def parse_probe(data: dict) -> dict:
+    """ffprobe JSON (format + streams + 前几秒的 packets) -> 一行索引数据"""
+    streams = data.get("streams", [])
+    v = next((s for s in streams if s.get("codec_type") == "video"), None)
+    has_audio = any(s.get("codec_type") == "audio" for s in streams)
+    fmt = data.get("format", {})
+
+    info = dict.fromkeys(PROBE_FIELDS)
+    info.update({
+        "duration": float(fmt.get("duration") or (v or {}).get("duration") or 0.0),
+        "rotation": 0,
+        "has_audio": int(has_audio),
+    })
+    if v is None:
+        return info
+
+    info["width"] = v.get("width")
+    info["height"] = v.get("height")
+    info["fps"] = _rate(v.get("avg_frame_rate", "0/0")) or _rate(v.get("r_frame_rate", "0/0"))
+    info["nb_frames"] = int(v["nb_frames"]) if str(v.get("nb_frames", "")).isdigit() else None
+    info["codec"] = v.get("codec_name")
+    info["pix_fmt"] = v.get("pix_fmt")
+    # 能否和我们自己编码的片段 -c copy 拼接，还要看这几项 (见 jj.stream_copy_ok)
+    info["profile"] = v.get("profile")
+    info["level"] = v.get("level")
+    info["time_base"] = v.get("time_base")
+    info["sar"] = v.get("sample_aspect_ratio")
+    info["extradata"] = v.get("extradata_hash")  # avcC (SPS/PPS) 的 CRC32
+
+    rotation = v.get("tags", {}).get("rotate")
+    for sd in v.get("side_data_list", []):
+        if "rotation" in sd:
+            rotation = sd["rotation"]
+    try:
+        info["rotation"] = int(float(rotation or 0)) % 360
+    except ValueError:
+        pass
+
+    # 关键帧间隔：只看前几秒 packets 里带 K 标记的时间差
+    key_ts = []
+    for p in data.get("packets", []):
+        if p.get("stream_index") == v.get("index") and "K" in p.get("flags", "") and p.get("pts_time") not in (None, "N/A"):
+            key_ts.append(float(p["pts_time"]))
+    if len(key_ts) >= 2:
+        key_ts.sort()
+        info["keyframe_interval"] = (key_ts[-1] - key_ts[0]) / (len(key_ts) - 1)
+    return info
+
+
+class MediaIndex:
+    """
+    素材库索引 (SQLite)：时长/分辨率/帧率/编码 (profile/level/time_base/SAR/extradata)/旋转/是否有音轨/关键帧间隔。
+    - refresh(): 扫目录，按 size+mtime 增量更新，新文件/变化的文件用线程池并发 ffprobe
+    - get(): 单文件查询，stat 一次确认没变就直接返回缓存，不再起 ffprobe
+    probe 失败的结果带 error 字段 (duration 为 0)，不当作有效缓存：下次 refresh / get 会重新 probe。
+    """
+
+    def __init__(self, db_path: str, ffprobe: str = "ffprobe", workers: int = 8, runner=None):
+        self.db_path = db_path
+        self.ffprobe = ffprobe
+        self.workers = workers
+        # runner(cmd) -> stdout bytes；默认直接 check_output，jj.py 传入带超时的进程管理
+        self.runner = runner or (lambda cmd: subprocess.check_output(cmd, stdin=subprocess.DEVNULL))
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            have = {r["name"] for r in self._db.execute("PRAGMA table_info(media)")}
+            if have and not set(COLUMNS) <= have:
+                # 旧版本的索引缺字段：整表重建，素材下次用到时重新 probe
+                self._db.execute("DROP TABLE media")
+            self._db.executescript(SCHEMA)
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    # ---- probing ----
+    def probe_file(self, path: str) -> dict:
+        cmd = [
+            self.ffprobe, "-v", "error",
+            "-show_format", "-show_streams", "-show_data_hash", "CRC32",
+            "-show_entries", "packet=stream_index,pts_time,flags",
+            "-read_intervals", "%+10",
+            "-of", "json",
+            path
+        ]
+        out = self.runner(cmd)
+        return parse_probe(json.loads(out.decode("utf-8", "replace") or "{}"))
+
+    def _probe_row(self, path: str, st: os.stat_result) -> dict:
+        try:
+            info = self.probe_file(path)
+            info["error"] = None
+        except Exception as e:
+            print(f"[MediaIndex] Probe failed for {path}: {e}")
+            info = dict.fromkeys(PROBE_FIELDS)
+            info["duration"] = 0.0
+            info["error"] = f"{type(e).__name__}: {e}"
+        info.update({
+            "path": path,
+            "dir": os.path.dirname(path),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "probed_at": time.time(),
+        })
+        return info
+
+    def _store(self, rows) -> None:
+        if not rows:
+            return
+        sql = f"INSERT OR REPLACE INTO media ({','.join(COLUMNS)}) VALUES ({','.join('?' * len(COLUMNS))})"
+        with self._lock:
+            self._db.executemany(sql, [tuple(r[c] for c in COLUMNS) for r in rows])
+            self._db.commit()
+
+    # ---- queries ----
+    def refresh(self, root: str, exts) -> list:
+        """
+        增量刷新 root 目录 (不递归)，返回该目录下符合扩展名的文件列表 (已排序)。
+        只有新增或 size/mtime 变化的文件会被重新 probe；已删除的文件从索引移除。
+        """
+        root = os.path.abspath(root)
+        exts = tuple(e.lower().lstrip("*") for e in exts)
+        on_disk = {}
+        try:
+            for e in os.scandir(root):
+                if e.is_file() and e.name.lower().endswith(exts):
+                    on_disk[e.path] = e.stat()
+        except FileNotFoundError:
+            return []
+
+        with self._lock:
+            known = {r["path"]: (r["size"], r["mtime_ns"], r["error"] is None)
+                     for r in self._db.execute("SELECT path, size, mtime_ns, error FROM media WHERE dir = ?", (root,))}
+
+        stale = [p for p, st in on_disk.items() if known.get(p) != (st.st_size, st.st_mtime_ns, True)]
+        gone = [p for p in known if p not in on_disk]
+
+        if stale:
+            t0 = time.time()
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                rows = list(pool.map(lambda p: self._probe_row(p, on_disk[p]), stale))
+            self._store(rows)
+            print(f"[MediaIndex] Probed {len(stale)} files in {time.time() - t0:.1f}s ({root})")
+        if gone:
+            with self._lock:
+                self._db.executemany("DELETE FROM media WHERE path = ?", [(p,) for p in gone])
+                self._db.commit()
+
+        return sorted(on_disk)
+
+    def get(self, path: str, store: bool = True) -> dict:
+        """单文件元数据；文件不存在返回 None。store=False 用于一次性的输出文件，不写入索引。"""
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            r = self._db.execute("SELECT * FROM media WHERE path = ?", (path,)).fetchone()
+        if r is not None and r["error"] is None and (r["size"], r["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+            return dict(r)
+        row = self._probe_row(path, st)
+        if store:
+            self._store([row])
+        return row
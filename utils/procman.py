@@ -0,0 +1,294 @@
+import os
+import signal
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+
+IS_WINDOWS = os.name == "nt"
+
+
+class Cancelled(Exception):
+    """任务被取消 (CancelToken.cancel)"""
+
+
+class StageTimeout(Cancelled, TimeoutError):
+    """阶段超时，已杀掉其中的子进程"""
+
+
+class CancelToken:
+    """
+    协作式取消 + 截止时间：
+    - cancel(): 置位并杀掉登记在本 token (及子 token) 上的进程组
+    - child(timeout): 派生子 token (如某个阶段)，父 token 取消时子 token 一起取消；
+      子 token 到期只影响自己
+    - check(): 在 Python 代码的循环里调用，已取消/超时就抛 Cancelled / StageTimeout
+    """
+
+    def __init__(self, name: str = "job", timeout: float = None, parent: "CancelToken" = None):
+        self.name = name
+        self.parent = parent
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._procs = set()
+        self._children = []
+        if parent is not None:
+            with parent._lock:
+                parent._children.append(self)
+            if parent.cancelled:
+                self.cancel(parent.reason)
+
+    def child(self, name: str, timeout: float = None) -> "CancelToken":
+        return CancelToken(name, timeout, parent=self)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def expired(self) -> bool:
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return True
+        return self.parent is not None and self.parent.expired()
+
+    def remaining(self):
+        """距离最近的截止时间还有多少秒，没有截止时间时为 None"""
+        own = self.deadline - time.monotonic() if self.deadline is not None else None
+        up = self.parent.remaining() if self.parent is not None else None
+        if own is None or up is None:
+            return own if up is None else up
+        return min(own, up)
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        with self._lock:
+            if self.reason is None:
+                self.reason = reason
+            self._event.set()
+            procs, children = list(self._procs), list(self._children)
+        for p in procs:
+            kill_tree(p)
+        for c in children:
+            c.cancel(reason)
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise Cancelled(f"{self.name}: {self.reason or (self.parent and self.parent.reason) or 'cancelled'}")
+        if self.expired():
+            raise StageTimeout(f"{self.name}: timed out")
+
+    def register(self, proc) -> None:
+        with self._lock:
+            self._procs.add(proc)
+
+    def unregister(self, proc) -> None:
+        with self._lock:
+            self._procs.discard(proc)
+
+
+def kill_tree(proc, grace: float = 2.0) -> None:
+    """
+    POSIX: 向整个进程组发 SIGTERM，grace 秒后还没退出就 SIGKILL；Windows: 直接 kill。
+    只看 returncode 判断是否已退出，不调 poll()/wait()：回收统一由 reap() 做，否则会抢走它的 rusage。
+    """
+    if proc.returncode is not None:
+        return
+    if IS_WINDOWS:
+        proc.kill()
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        return
+
+    def escalate():
+        deadline = time.monotonic() + grace
+        while proc.returncode is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if proc.returncode is None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+    threading.Thread(target=escalate, daemon=True).start()
+
+
+def reap(proc):
+    """
+    等子进程退出并回收，返回它自己的 rusage：直接 os.wait4(pid)，不经过 Popen.wait
+    (RUSAGE_CHILDREN 在多线程下分不清是谁的)。没有 wait4 的平台 (Windows) 用 Popen.wait，返回 None。
+    """
+    if not hasattr(os, "wait4"):
+        proc.wait()
+        return None
+    try:
+        _, status, ru = os.wait4(proc.pid, 0)
+    except ChildProcessError:
+        # 已经被别处回收，拿不到退出码和 rusage
+        if proc.returncode is None:
+            proc.returncode = -1
+        return None
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return ru
+
+
+def drain(proc, input: bytes = None):
+    """
+    communicate() 的替代：写 stdin、读完 stdout/stderr，但不 wait (communicate 会顺手回收子进程)。
+    返回 (stdout, stderr)，没有管道的为 None。
+    """
+    out = {}
+
+    def read(name, f):
+        try:
+            out[name] = f.read()
+        finally:
+            f.close()
+
+    readers = [threading.Thread(target=read, args=(name, f), daemon=True)
+               for name, f in (("stdout", proc.stdout), ("stderr", proc.stderr)) if f is not None]
+    for t in readers:
+        t.start()
+    if proc.stdin is not None:
+        try:
+            if input:
+                proc.stdin.write(input)
+        except BrokenPipeError:
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+    for t in readers:
+        t.join()
+    return out.get("stdout"), out.get("stderr")
+
+
+@dataclass
+class ProcResult:
+    args: list
+    returncode: int
+    stdout: bytes = None
+    stderr: bytes = None
+    wall_sec: float = 0.0
+    cpu_user_sec: float = None
+    cpu_sys_sec: float = None
+    max_rss_mb: float = None
+    timed_out: bool = False
+    cancelled: bool = False
+
+    def usage(self) -> dict:
+        return {"wall_sec": self.wall_sec, "cpu_user_sec": self.cpu_user_sec,
+                "cpu_sys_sec": self.cpu_sys_sec, "max_rss_mb": self.max_rss_mb}
+
+
+class ProcessManager:
+    """
+    所有外部命令 (ffmpeg / ffprobe) 统一从这里起：
+    - 每个子进程单独一个进程组 (Windows 上是 CREATE_NEW_PROCESS_GROUP)，取消/超时时整组杀掉
+    - token: CancelToken，取消或到期时杀进程；timeout 与 token 的截止时间取较早的
+    - nice / affinity: 降低优先级、绑定 CPU，多个任务共用一台机器时互不抢占
+    - 子进程结束后记录 rusage (CPU 时间、峰值内存)
+    """
+
+    def __init__(self, nice: int = 0, affinity=None):
+        self.nice = nice
+        self.affinity = sorted(set(affinity)) if affinity else None
+
+    def _limit(self, proc) -> None:
+        # 进程刚起来就设置 (它的线程在这之后创建，会继承这些设置)；不用 preexec_fn，多线程下不安全
+        if IS_WINDOWS:
+            return
+        try:
+            if self.nice:
+                os.setpriority(os.PRIO_PROCESS, proc.pid, os.getpriority(os.PRIO_PROCESS, 0) + self.nice)
+            if self.affinity and hasattr(os, "sched_setaffinity"):
+                os.sched_setaffinity(proc.pid, self.affinity)
+        except (OSError, ValueError) as e:
+            print(f"[Proc] Could not apply limits to pid {proc.pid}: {e}")
+
+    def run(self, cmd, token: CancelToken = None, timeout: float = None, input: bytes = None,
+            capture: bool = False, on_line=None, check: bool = True) -> ProcResult:
+        """
+        capture=True: 收集 stdout/stderr (bytes)；input: 写入 stdin 的数据
+        on_line: 逐行读取 stdout (文本) 交给回调，stderr 照常输出 (用于 ffmpeg -progress)
+        check: 退出码非 0 时抛 CalledProcessError；取消/超时总是抛 Cancelled / StageTimeout
+        """
+        if token is not None:
+            token.check()
+            left = token.remaining()
+            if left is not None:
+                timeout = min(timeout, left) if timeout else left
+        kwargs = {"stdin": subprocess.PIPE if input is not None else subprocess.DEVNULL}
+        if on_line is not None:
+            kwargs.update(stdout=subprocess.PIPE, text=True, encoding="utf-8", errors="replace")
+        elif capture:
+            kwargs.update(stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if IS_WINDOWS:
+            flags = subprocess.CREATE_NEW_PROCESS_GROUP
+            if self.nice > 0:
+                flags |= subprocess.BELOW_NORMAL_PRIORITY_CLASS
+            kwargs["creationflags"] = flags
+        else:
+            kwargs["start_new_session"] = True
+
+        t0 = time.monotonic()
+        proc = subprocess.Popen(cmd, **kwargs)
+        self._limit(proc)
+        if token is not None:
+            token.register(proc)
+
+        state = {"timed_out": False, "killed": False}
+        done = threading.Event()
+
+        def watchdog():
+            deadline = t0 + timeout if timeout else None
+            while not done.wait(0.1):
+                if token is not None and token.cancelled:
+                    state["killed"] = True
+                    kill_tree(proc)
+                    return
+                if deadline is not None and time.monotonic() >= deadline:
+                    state["timed_out"] = True
+                    kill_tree(proc)
+                    return
+
+        if token is not None or timeout:
+            threading.Thread(target=watchdog, name="proc-watchdog", daemon=True).start()
+
+        out = err = None
+        try:
+            if on_line is not None:
+                for line in proc.stdout:
+                    on_line(line)
+                proc.stdout.close()
+            else:
+                out, err = drain(proc, input)
+            ru = reap(proc)
+        except BaseException:
+            kill_tree(proc)
+            reap(proc)
+            raise
+        finally:
+            done.set()
+            if token is not None:
+                token.unregister(proc)
+
+        # 已经正常跑完 (退出码 0) 的进程不算被取消：token 可能是在它结束之后才取消的，结果照常返回
+        res = ProcResult(list(cmd), proc.returncode, out, err, time.monotonic() - t0,
+                         timed_out=state["timed_out"],
+                         cancelled=token is not None and token.cancelled and (state["killed"] or proc.returncode != 0))
+        if ru is not None:
+            res.cpu_user_sec, res.cpu_sys_sec = ru.ru_utime, ru.ru_stime
+            # Linux 上 ru_maxrss 单位是 KB，macOS 上是字节
+            res.max_rss_mb = ru.ru_maxrss / (1 << 20 if os.uname().sysname == "Darwin" else 1 << 10)
+
+        if res.cancelled:
+            raise Cancelled(f"{token.name}: {token.reason or 'cancelled'}")
+        if res.timed_out:
+            raise StageTimeout(f"{os.path.basename(cmd[0])} timed out after {res.wall_sec:.1f}s")
+        if check and res.returncode != 0:
+            raise subprocess.CalledProcessError(res.returncode, cmd, out, err)
+        return res
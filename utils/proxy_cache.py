@@ -0,0 +1,92 @@
+import hashlib
+import os
+import threading
+import uuid
+
+from utils.lru import evict_lru
+
+
+class ProxyCache:
+    """
+    Persistent cache of normalized source clips (already scaled/cropped to the
+    target resolution and fps).
+
+    - Key: sampled content hash + size + mtime of the source, plus the target
+      out_w x out_h, fps, orientation and the caller's normalization version
+      (bumped whenever the filter chain / encoder settings change, so stale
+      proxies are never reused).
+    - Entries are plain files named <key>.mp4; their mtime doubles as the LRU
+      stamp (bumped on every hit), so no separate index is needed.
+    - Size bounded: after every insert the least recently used proxies are
+      evicted until the cache fits in max_bytes.
+    """
+
+    SAMPLE_BYTES = 1 << 20  # hash first/last 1 MiB, full hashing of footage is too slow
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks = {}  # 同一 key 同时只构建一次 (批量任务并发时)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _fingerprint(self, src: str) -> str:
+        st = os.stat(src)
+        h = hashlib.sha1()
+        with open(src, "rb") as f:
+            h.update(f.read(self.SAMPLE_BYTES))
+            if st.st_size > 2 * self.SAMPLE_BYTES:
+                f.seek(-self.SAMPLE_BYTES, os.SEEK_END)
+                h.update(f.read(self.SAMPLE_BYTES))
+        return f"{h.hexdigest()}:{st.st_size}:{st.st_mtime_ns}"
+
+    def key(self, src: str, out_w: int, out_h: int, fps: int, version: int = 1) -> str:
+        orientation = "v" if out_h > out_w else "h"
+        raw = f"{self._fingerprint(src)}|{out_w}x{out_h}|{fps}|{orientation}|v{version}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".mp4")
+
+    def lookup(self, key: str):
+        p = self.path_for(key)
+        try:
+            os.utime(p)  # LRU bump
+            return p
+        except FileNotFoundError:
+            return None
+
+    def get_or_build(self, src: str, out_w: int, out_h: int, fps: int, build, version: int = 1) -> str:
+        """
+        Return the proxy path for src, calling build(src, tmp_out) on a miss.
+        The proxy is written to a temp name and renamed into place so concurrent
+        jobs never see a half-written file; concurrent requests for the same key
+        wait for the first build instead of encoding it again.
+        """
+        key = self.key(src, out_w, out_h, fps, version)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            hit = self.lookup(key)
+            if hit:
+                print(f"[ProxyCache] HIT  {os.path.basename(src)}")
+                return hit
+
+            print(f"[ProxyCache] MISS {os.path.basename(src)} -> normalizing...")
+            final = self.path_for(key)
+            tmp = os.path.join(self.cache_dir, f".{key}.{uuid.uuid4().hex[:8]}.tmp.mp4")
+            try:
+                build(src, tmp)
+                os.replace(tmp, final)
+            finally:
+                if os.path.exists(tmp):
+                    try: os.remove(tmp)
+                    except OSError: pass
+        self.evict(keep=final)
+        return final
+
+    def evict(self, keep: str = None) -> None:
+        with self._lock:
+            removed = evict_lru(self.cache_dir, self.max_bytes, ".mp4", keep)
+        if removed:
+            print(f"[ProxyCache] Evicted {removed} proxies")
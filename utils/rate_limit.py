@@ -0,0 +1,34 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶限流器。
+    rate: 每秒补充的令牌数 (即平均 requests/s)，burst: 桶容量 (允许的瞬时并发请求数)。
+    rate <= 0 表示不限流。
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """阻塞直到拿到一个令牌，返回等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
@@ -0,0 +1,104 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class StageScheduler:
+    """
+    小型 DAG 调度器：
+    - add(name, fn, deps): fn(results) 接收依赖阶段的结果字典，返回值作为本阶段结果
+    - run(): 依赖满足的阶段立即并发执行 (CPU 型的 ffmpeg 与网络型的 TTS 可以重叠)
+    - 记录每个阶段的起止时间，并算出关键路径
+    任一阶段失败时不再启动新阶段，等在途阶段结束后抛出第一个异常。
+    on_error(exc): 第一个失败 (或等待时收到 KeyboardInterrupt) 时调用，用来取消在途阶段 (如杀掉 ffmpeg)，
+    不然要等它们自己跑完。
+    """
+
+    def __init__(self, max_workers: int = 4, on_error=None):
+        self.max_workers = max_workers
+        self.on_error = on_error
+        self._stages = {}
+        self._order = []
+        self.results = {}
+        self.timings = {}  # name -> (start, end)，相对 run() 开始的秒数
+        self._t0 = None
+        self._lock = threading.Lock()
+
+    def add(self, name: str, fn, deps=()) -> None:
+        for d in deps:
+            if d not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{d}'")
+        self._stages[name] = (fn, tuple(deps))
+        self._order.append(name)
+
+    def _run_stage(self, name: str):
+        fn, deps = self._stages[name]
+        start = time.monotonic() - self._t0
+        try:
+            return fn({d: self.results[d] for d in deps})
+        finally:
+            with self._lock:
+                self.timings[name] = (start, time.monotonic() - self._t0)
+
+    def run(self) -> dict:
+        self._t0 = time.monotonic()
+        pending = list(self._order)
+        running = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                if error is None:
+                    for name in list(pending):
+                        if all(d in self.results for d in self._stages[name][1]):
+                            pending.remove(name)
+                            running[pool.submit(self._run_stage, name)] = name
+                if not running:
+                    break
+                try:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                except BaseException as e:
+                    self._abort(e)
+                    raise
+                for fut in done:
+                    name = running.pop(fut)
+                    try:
+                        self.results[name] = fut.result()
+                    except BaseException as e:
+                        if error is None:
+                            error = e
+                            self._abort(e)
+        if error is not None:
+            raise error
+        return self.results
+
+    def _abort(self, exc: BaseException) -> None:
+        if self.on_error is not None:
+            try:
+                self.on_error(exc)
+            except Exception as e:
+                print(f"[Scheduler] on_error failed: {e}")
+
+    def critical_path(self):
+        """从最后结束的阶段沿“最晚完成的依赖”回溯，返回 (阶段列表, 总耗时)"""
+        if not self.timings:
+            return [], 0.0
+        name = max(self.timings, key=lambda n: self.timings[n][1])
+        total = self.timings[name][1]
+        path = [name]
+        while True:
+            deps = [d for d in self._stages[name][1] if d in self.timings]
+            if not deps:
+                break
+            name = max(deps, key=lambda d: self.timings[d][1])
+            path.append(name)
+        return list(reversed(path)), total
+
+    def report(self) -> str:
+        lines = ["[Scheduler] Stage timings:"]
+        for name in self._order:
+            if name in self.timings:
+                st, ed = self.timings[name]
+                lines.append(f"  {name:<10} {st:7.2f}s -> {ed:7.2f}s  ({ed - st:.2f}s)")
+        path, total = self.critical_path()
+        lines.append(f"  critical path: {' -> '.join(path)} = {total:.2f}s")
+        return "\n".join(lines)
@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+
+class StageCache:
+    """
+    增量重建：每个阶段记录输入摘要 + 产物路径 (JSON 文件，放在任务的 work_dir 里)。
+    - digest(*parts): 输入 (配置字段、素材指纹、文案、模板内容、工具版本...) 的 sha256
+    - fresh(): 摘要一致且产物都还在 -> 可以跳过该阶段，直接复用产物
+    - record(): 阶段成功后写入；写文件走临时文件 + os.replace，崩溃不会留下半个状态
+    状态文件所在目录里的产物按相对路径记录，整个目录搬走 (如从 tmpfs 移回磁盘) 后仍然有效。
+    """
+
+    def __init__(self, state_path: str):
+        self.state_path = state_path
+        self.base = os.path.dirname(os.path.abspath(state_path))
+        self._lock = threading.Lock()
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                self._state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._state = {}
+
+    @staticmethod
+    def digest(*parts) -> str:
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def fresh(self, stage: str, digest: str) -> bool:
+        with self._lock:
+            entry = self._state.get(stage)
+        if not entry or entry.get("digest") != digest:
+            return False
+        return all(os.path.exists(self._resolve(p)) for p in entry.get("outputs", []))
+
+    def _resolve(self, path: str) -> str:
+        return path if os.path.isabs(path) else os.path.join(self.base, path)
+
+    def _relative(self, path: str) -> str:
+        path = os.path.abspath(path)
+        try:
+            inside = os.path.commonpath([path, self.base]) == self.base
+        except ValueError:  # Windows 上不同盘符
+            inside = False
+        return os.path.relpath(path, self.base) if inside else path
+
+    def outputs(self) -> list:
+        """所有阶段记录的产物 (绝对路径)"""
+        with self._lock:
+            return [self._resolve(p) for entry in self._state.values() for p in entry.get("outputs", [])]
+
+    def record(self, stage: str, digest: str, outputs) -> None:
+        with self._lock:
+            self._state[stage] = {"digest": digest, "outputs": [self._relative(p) for p in outputs]}
+            os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+            tmp = f"{self.state_path}.{uuid.uuid4().hex[:8]}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self._state, f, ensure_ascii=False, indent=2)
+                os.replace(tmp, self.state_path)
+            finally:
+                if os.path.exists(tmp):
+                    try: os.remove(tmp)
+                    except OSError: pass
@@ -0,0 +1,99 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import uuid
+
+# `ffmpeg -filters`:  " TSC aap   AA->A   ..."；`ffmpeg -encoders`:  " V....D libx264   ..."
+FILTER_LINE = re.compile(r"^ [T.][S.][C.] (\S+)\s+\S*->\S*")
+ENCODER_LINE = re.compile(r"^ [VASD.][F.][S.][X.][B.][D.] (\S+)")
+
+
+def parse_names(text: str, pattern) -> list:
+    return sorted({m.group(1) for m in map(pattern.match, text.splitlines()) if m and m.group(1) != "="})
+
+
+class ToolCaps:
+    """
+    ffmpeg / ffprobe 的版本与能力 (滤镜、编码器)，每个可执行文件只探测一次：
+    - 内存和磁盘 (JSON) 都按 真实路径 + 大小 + mtime 缓存，换了 ffmpeg 自动重新探测
+    - get(binary): {"version", "major", "filters", "encoders"}；找不到或探测失败时 version 为 "unknown"
+    runner(cmd) -> stdout bytes；默认直接 check_output，jj.py 传入带超时的进程管理。
+    """
+
+    def __init__(self, cache_path: str, runner=None):
+        self.cache_path = cache_path
+        self.runner = runner or (lambda cmd: subprocess.check_output(cmd, stdin=subprocess.DEVNULL, timeout=30))
+        self._lock = threading.Lock()
+        self._mem = {}
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                self._disk = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._disk = {}
+
+    @staticmethod
+    def fingerprint(binary: str):
+        """可执行文件 -> "真实路径|大小|mtime_ns"，找不到时为 None"""
+        path = shutil.which(binary)
+        if path is None:
+            return None
+        path = os.path.realpath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return f"{path}|{st.st_size}|{st.st_mtime_ns}"
+
+    def probe(self, binary: str) -> dict:
+        caps = {"version": "unknown", "major": 0, "filters": [], "encoders": []}
+        try:
+            caps["version"] = self.runner([binary, "-version"]).decode("utf-8", "replace").splitlines()[0]
+        except Exception as e:
+            print(f"[ToolCaps] Could not run {binary}: {e}")
+            return caps
+        m = re.search(r"version n?(\d+)\.", caps["version"])
+        caps["major"] = int(m.group(1)) if m else 0  # git 构建等解析不出时为 0
+        if os.path.basename(binary).lower().startswith("ffmpeg"):
+            for key, flag, pattern in (("filters", "-filters", FILTER_LINE), ("encoders", "-encoders", ENCODER_LINE)):
+                try:
+                    out = self.runner([binary, "-hide_banner", flag]).decode("utf-8", "replace")
+                    caps[key] = parse_names(out, pattern)
+                except Exception as e:
+                    print(f"[ToolCaps] {binary} {flag} failed: {e}")
+        return caps
+
+    def get(self, binary: str) -> dict:
+        """
+        内存和磁盘缓存都按 fingerprint 查：装了 / 升级了 ffmpeg 后不用重启就能拿到新结果。
+        探测失败 (找不到、跑不起来) 的结果不缓存，下次再试。
+        """
+        key = self.fingerprint(binary)
+        with self._lock:
+            if key in self._mem:
+                return self._mem[key]
+            caps = self._disk.get(key) if key else None
+            if caps is None:
+                caps = self.probe(binary)
+                if key is None or caps["version"] == "unknown":
+                    return caps
+                self._disk[key] = caps
+                self._save()
+            self._mem[key] = caps
+            return caps
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        tmp = f"{self.cache_path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._disk, f, ensure_ascii=False)
+            os.replace(tmp, self.cache_path)
+        except OSError as e:
+            print(f"[ToolCaps] Could not write {self.cache_path}: {e}")
+        finally:
+            if os.path.exists(tmp):
+                try: os.remove(tmp)
+                except OSError: pass
@@ -0,0 +1,60 @@
+import hashlib
+import os
+import threading
+import uuid
+
+from utils.lru import evict_lru
+
+
+class TTSCache:
+    """
+    TTS 音频磁盘缓存。
+    - Key: provider + voice + text + speed + sample rate
+    - 存的是已经归一化好的 PCM (s16le, mono, sr)，命中时直接读进内存，不再请求网络
+    - 写入走临时文件 + os.replace (原子)，并发任务不会读到半个文件
+    - 总大小超过 max_bytes 时按 LRU 淘汰
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(provider: str, voice: str, text: str, speed: float, sr: int) -> str:
+        raw = "\x1f".join([provider, voice or "", text, f"{speed:.3f}", str(sr)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".pcm")
+
+    def get_bytes(self, key: str):
+        """命中返回缓存的 PCM 字节 (并刷新 LRU)，未命中返回 None"""
+        p = self.path_for(key)
+        try:
+            with open(p, "rb") as f:
+                data = f.read()
+            os.utime(p)  # LRU bump
+            return data
+        except FileNotFoundError:
+            return None
+
+    def put_bytes(self, key: str, data: bytes) -> None:
+        final = self.path_for(key)
+        tmp = os.path.join(self.cache_dir, f".{key}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, final)
+        finally:
+            if os.path.exists(tmp):
+                try: os.remove(tmp)
+                except OSError: pass
+        self.evict(keep=final)
+
+    def evict(self, keep: str = None) -> None:
+        with self._lock:
+            removed = evict_lru(self.cache_dir, self.max_bytes, ".pcm", keep)
+        if removed:
+            print(f"[TTSCache] Evicted {removed} entries")
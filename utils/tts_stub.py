@@ -0,0 +1,115 @@
+"""
+本地 TTS 桩服务 (离线测试 / 压测用)，接口与 Manbo 相同：
+    GET /apis/mbAIsc?text=...  ->  {"code": 200, "url": "http://host:port/audio/<id>.wav"}
+    GET /audio/<id>.wav        ->  确定性的 WAV (正弦波，时长与文字长度成正比)
+
+用法:
+    python -m utils.tts_stub --port 8765 [--latency 0.2] [--fail-every 5]
+    MANBO_TTS_URL=http://127.0.0.1:8765/apis/mbAIsc python jj.py
+"""
+import argparse
+import hashlib
+import io
+import json
+import math
+import struct
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def synth_wav(text: str, sr: int = 24000) -> bytes:
+    """每个字 0.2s 的正弦波，频率由文本哈希决定，保证同一文本输出完全一致"""
+    digest = hashlib.sha1(text.encode("utf-8")).digest()
+    freq = 220 + digest[0] * 2
+    n = int(sr * (0.2 * max(1, len(text)) + 0.1))
+    frames = b"".join(
+        struct.pack("<h", int(8000 * math.sin(2 * math.pi * freq * i / sr))) for i in range(n)
+    )
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(frames)
+    return buf.getvalue()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    texts = {}
+    latency = 0.0
+    fail_every = 0   # >0: 每 N 个 API 请求返回一次 503，用于验证重试
+    lock = threading.Lock()
+    request_count = 0
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, code: int, body: bytes, ctype: str) -> None:
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        with StubHandler.lock:
+            StubHandler.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(self.path)
+        if url.path.startswith("/audio/"):
+            key = url.path.rsplit("/", 1)[-1].split(".")[0]
+            text = self.texts.get(key)
+            if text is None:
+                self._send(404, b"not found", "text/plain")
+            else:
+                self._send(200, synth_wav(text), "audio/wav")
+            return
+
+        with StubHandler.lock:
+            fail = self.fail_every > 0 and StubHandler.request_count % self.fail_every == 0
+        if fail:
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        text = parse_qs(url.query).get("text", [""])[0]
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+        with StubHandler.lock:
+            self.texts[key] = text
+        host, port = self.server.server_address[:2]
+        body = json.dumps({"code": 200, "url": f"http://{host}:{port}/audio/{key}.wav"}).encode("utf-8")
+        self._send(200, body, "application/json")
+
+
+def start_stub(port: int = 0, latency: float = 0.0, fail_every: int = 0) -> ThreadingHTTPServer:
+    """在后台线程启动桩服务，返回 server (server.server_address 拿端口，shutdown() 停止)"""
+    StubHandler.latency = latency
+    StubHandler.fail_every = fail_every
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stub_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/apis/mbAIsc"
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Local Manbo-compatible TTS stub")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    ap.add_argument("--fail-every", type=int, default=0, help="answer every Nth request with 503")
+    args = ap.parse_args()
+    srv = start_stub(args.port, args.latency, args.fail_every)
+    print(f"TTS stub listening on {stub_url(srv)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        srv.shutdown()
@@ -0,0 +1,224 @@
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+
+def _tree_stats(path: str):
+    """(总字节数, 最新 mtime)；单个文件也适用"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return 0, 0.0
+    if not os.path.isdir(path):
+        return st.st_size, st.st_mtime
+    total, newest = 0, st.st_mtime
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            try:
+                fst = os.stat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            total += fst.st_size
+            newest = max(newest, fst.st_mtime)
+    return total, newest
+
+
+def is_tmpfs(path: str) -> bool:
+    """path 是否为已存在的 tmpfs 挂载点 (只认 Linux 的 /proc/mounts；Windows / 读不到时为 False)"""
+    if os.name == "nt" or not os.path.isdir(path):
+        return False
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as f:
+            mounts = [line.split() for line in f]
+    except OSError:
+        return False
+    path = os.path.realpath(path)
+    return any(len(m) > 2 and m[1] == path and m[2] == "tmpfs" for m in mounts)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class WorkspaceManager:
+    """
+    每个任务独立的工作目录：<root>/<job>/，并发任务互不覆盖中间文件。
+    - acquire(): tmpfs_root 的上级目录是现成的 tmpfs 挂载 (如 /dev/shm) 且剩余空间够时放在内存盘上，
+      否则放在磁盘 root 下；同名任务上次留下的目录会被复用 (增量缓存可以接着用)
+    - release(): 成功的任务只删临时文件，保留 keep 里的阶段产物 (tmpfs 上的搬回磁盘)；失败的整个保留用于重试/排查
+    - sweep(): 只清理本类创建的目录 (带 .jj_workspace 标记)：超过 max_age 的删掉，总大小超过 quota 时
+      从最旧的开始删；正在使用的目录 (本进程登记的，或 .owner 里的进程还活着) 不会被删
+    """
+
+    OWNER_FILE = ".owner"
+    MARKER_FILE = ".jj_workspace"
+    TOMBSTONE_PREFIX = ".deleting-"  # 待删除的目录先改成这个名字，acquire 不会再拿到它
+
+    def __init__(self, root: str, tmpfs_root: str = None, tmpfs_min_free: int = 0,
+                 quota_bytes: int = 0, max_age_sec: float = 0):
+        self.root = os.path.abspath(root)
+        self.tmpfs_root = tmpfs_root
+        self.tmpfs_min_free = tmpfs_min_free
+        self.quota_bytes = quota_bytes
+        self.max_age_sec = max_age_sec
+        self._active = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sweeper = None
+        os.makedirs(self.root, exist_ok=True)
+
+    def roots(self):
+        return [r for r in (self.root, self.tmpfs_root) if r and os.path.isdir(r)]
+
+    def _tmpfs_fits(self) -> bool:
+        # 只用已经挂好的 tmpfs，不自己建挂载点 (Windows 上 "/dev/shm/..." 会变成当前盘下的普通目录)
+        if not self.tmpfs_root or not is_tmpfs(os.path.dirname(os.path.abspath(self.tmpfs_root))):
+            return False
+        try:
+            os.makedirs(self.tmpfs_root, exist_ok=True)
+            return shutil.disk_usage(self.tmpfs_root).free >= self.tmpfs_min_free
+        except OSError:
+            return False
+
+    def _on_tmpfs(self, path: str) -> bool:
+        return bool(self.tmpfs_root) and os.path.dirname(path) == os.path.abspath(self.tmpfs_root)
+
+    def acquire(self, job: str) -> str:
+        name = re.sub(r"[^\w.-]+", "_", job) or "job"
+        with self._lock:
+            existing = [os.path.join(r, name) for r in self.roots() if os.path.isdir(os.path.join(r, name))]
+            if existing:
+                path = existing[0]
+            elif self._tmpfs_fits():
+                path = os.path.join(os.path.abspath(self.tmpfs_root), name)
+            else:
+                path = os.path.join(self.root, name)
+            if path in self._active:
+                raise RuntimeError(f"Workspace {path} is already in use by another job")
+            self._active.add(path)
+        os.makedirs(path, exist_ok=True)
+        open(os.path.join(path, self.MARKER_FILE), "a").close()
+        with open(os.path.join(path, self.OWNER_FILE), "w") as f:
+            f.write(str(os.getpid()))
+        return path
+
+    def release(self, path: str, success: bool, keep=None) -> str:
+        """
+        keep: 成功时要保留的文件名 (目录下第一层)，None 表示整个目录原样保留。
+        返回目录现在的位置 (tmpfs 上成功的任务会搬到磁盘 root 下)。
+        """
+        acquired = path
+        try:
+            if success and keep is not None:
+                keep = set(keep) | {self.MARKER_FILE}
+                for e in os.scandir(path):
+                    if e.name in keep:
+                        continue
+                    if e.is_dir(follow_symlinks=False):
+                        shutil.rmtree(e.path, ignore_errors=True)
+                    else:
+                        try: os.remove(e.path)
+                        except OSError: pass
+                if self._on_tmpfs(path):
+                    dest = os.path.join(self.root, os.path.basename(path))
+                    shutil.rmtree(dest, ignore_errors=True)
+                    shutil.move(path, dest)
+                    path = dest
+            else:
+                try: os.remove(os.path.join(path, self.OWNER_FILE))
+                except OSError: pass
+        finally:
+            with self._lock:
+                self._active.discard(acquired)
+        return path
+
+    def _in_use(self, path: str) -> bool:
+        if path in self._active:
+            return True
+        try:
+            with open(os.path.join(path, self.OWNER_FILE)) as f:
+                pid = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return False
+        return pid != os.getpid() and _pid_alive(pid)
+
+    def _tombstone(self, path: str):
+        """
+        在锁内再确认一次没人在用，并改名成墓碑目录，返回新路径；已被占用 / 已不存在时返回 None。
+        扫描和统计大小都在锁外，这期间同名任务可能刚 acquire 了这个目录，所以删除前必须再查。
+        """
+        tomb = os.path.join(os.path.dirname(path), f"{self.TOMBSTONE_PREFIX}{os.path.basename(path)}-{uuid.uuid4().hex[:8]}")
+        with self._lock:
+            if self._in_use(path):
+                return None
+            try:
+                os.rename(path, tomb)
+            except OSError:
+                return None
+        return tomb
+
+    def sweep(self) -> int:
+        """返回删除的条目数"""
+        now = time.time()
+        entries = []
+        for root in self.roots():
+            for e in os.scandir(root):
+                if e.name.startswith(self.TOMBSTONE_PREFIX) and e.is_dir(follow_symlinks=False):
+                    # 上次删到一半 (进程退出) 留下的墓碑
+                    shutil.rmtree(e.path, ignore_errors=True)
+                    continue
+                # 用户自己放在 work_dir 里的文件 / 目录不归这里管
+                if not e.is_dir(follow_symlinks=False) or not os.path.exists(os.path.join(e.path, self.MARKER_FILE)):
+                    continue
+                with self._lock:
+                    busy = self._in_use(e.path)
+                if busy:
+                    continue
+                size, mtime = _tree_stats(e.path)
+                entries.append((mtime, size, e.path))
+
+        entries.sort()  # 最旧的在前
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            expired = self.max_age_sec and now - mtime > self.max_age_sec
+            over = self.quota_bytes and total > self.quota_bytes
+            if not (expired or over):
+                continue
+            tomb = self._tombstone(path)
+            if tomb is None:
+                continue
+            shutil.rmtree(tomb, ignore_errors=True)
+            total -= size
+            removed += 1
+        if removed:
+            print(f"[Workspace] Swept {removed} stale entries")
+        return removed
+
+    def start_sweeper(self, interval_sec: float) -> None:
+        if self._sweeper is not None or interval_sec <= 0:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"[Workspace] Sweep failed: {e}")
+                if self._stop.wait(interval_sec):
+                    break
+
+        self._sweeper = threading.Thread(target=loop, name="workspace-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self) -> None:
+        self._stop.set()
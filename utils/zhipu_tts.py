@@ -1,13 +1,13 @@
 
-from zhipuai import ZhipuAI
 import os
 import json
 import time
-import httpx
-from zhipuai.core._jwt_token import generate_token
+
+# zhipuai / httpx 较重且是可选依赖，创建客户端、上传复刻音频时再导入
 
 class ZhipuTTS:
     def __init__(self, api_key: str):
+        from zhipuai import ZhipuAI
         self.api_key = api_key
         self.client = ZhipuAI(api_key=api_key)
 
@@ -44,6 +44,8 @@ class ZhipuTTS:
         """
         if not os.path.exists(ref_audio_path):
             raise FileNotFoundError(f"Reference audio not found: {ref_audio_path}")
+        import httpx
+        from zhipuai.core._jwt_token import generate_token
             
         try:
             # 1. Upload File